@@ -97,13 +97,8 @@ class User(AbstractUser):
 
     def get_school(self):
         """Get user's associated school"""
-        if hasattr(self, 'guardian') and self.guardian:
-            return self.guardian.school
-        elif hasattr(self, 'teacher_profile') and self.teacher_profile:
-            return self.teacher_profile.school
-        elif hasattr(self, 'employee_profile') and self.employee_profile:
-            return self.employee_profile.school
-        return None
+        from core.tenancy import get_school_context
+        return get_school_context(self).school
 
     def get_role_display(self):
         """Get user's role in Arabic"""
@@ -1,6 +1,11 @@
 # api/pagination.py - Professional pagination configuration
-from rest_framework.pagination import PageNumberPagination
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class StandardResultsSetPagination(PageNumberPagination):
@@ -26,3 +31,117 @@ class StandardResultsSetPagination(PageNumberPagination):
             'results': data
         })
 
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination: no COUNT query and stable pages while rows are added.
+
+    Rows are ordered by the view's `cursor_ordering` (default: newest first), always
+    ending with the primary key as tie-breaker; the next page is fetched with
+    "rows after the last one" instead of an OFFSET. Cursors are signed and opaque.
+    ?ordering= filters don't apply in this mode.
+    """
+    page_size = 30
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    ordering = ('-created_at', '-id')
+    invalid_cursor_message = 'مؤشر الصفحة غير صالح.'
+    signing_salt = 'api.pagination.cursor'
+
+    def get_ordering(self, view):
+        ordering = list(getattr(view, 'cursor_ordering', self.ordering))
+        if ordering[-1].lstrip('-') not in ('id', 'pk'):
+            ordering.append('-id' if ordering[-1].startswith('-') else 'id')
+        return ordering
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(size, self.max_page_size) if size > 0 else self.page_size
+
+    def encode_cursor(self, ordering, row):
+        model = type(row)
+        values = [model._meta.get_field(name.lstrip('-')).value_to_string(row) for name in ordering]
+        return signing.dumps({'o': ordering, 'v': values}, salt=self.signing_salt)
+
+    def decode_cursor(self, ordering, model):
+        cursor = self.request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            data = signing.loads(cursor, salt=self.signing_salt)
+            if data['o'] != ordering:
+                raise ValueError
+            return [
+                model._meta.get_field(name.lstrip('-')).to_python(value)
+                for name, value in zip(ordering, data['v'])
+            ]
+        except (signing.BadSignature, ValueError, KeyError, TypeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def after(ordering, values):
+        """Rows after `values` in `ordering`: a row-value comparison spelled out field by field"""
+        condition, equal = Q(), Q()
+        for name, value in zip(ordering, values):
+            field = name.lstrip('-')
+            lookup = 'lt' if name.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{field}__{lookup}': value})
+            equal &= Q(**{field: value})
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size_value = self.get_page_size(request)
+        ordering = self.get_ordering(view)
+        queryset = queryset.order_by(*ordering)
+
+        values = self.decode_cursor(ordering, queryset.model)
+        if values is not None:
+            queryset = queryset.filter(self.after(ordering, values))
+
+        rows = list(queryset[:self.page_size_value + 1])
+        self.has_next = len(rows) > self.page_size_value
+        rows = rows[:self.page_size_value]
+        self.next_cursor = self.encode_cursor(ordering, rows[-1]) if self.has_next else None
+        return rows
+
+    def get_next_link(self):
+        if not self.next_cursor:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'page_size': self.page_size_value,
+            'results': data
+        })
+
+
+class SelectablePagination(BasePagination):
+    """
+    Page-number or keyset pagination, chosen per request with ?pagination=page|cursor.
+    Endpoints pick their default with `pagination_mode` (page-number unless set),
+    so existing clients keep the count/total_pages responses.
+    """
+    mode_query_param = 'pagination'
+    classes = {
+        'page': StandardResultsSetPagination,
+        'cursor': KeysetPagination,
+    }
+
+    def paginate_queryset(self, queryset, request, view=None):
+        mode = request.query_params.get(self.mode_query_param) or getattr(view, 'pagination_mode', 'page')
+        if mode not in self.classes:
+            mode = 'page'
+        self.paginator = self.classes[mode]()
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
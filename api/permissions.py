@@ -1,5 +1,6 @@
 from rest_framework.permissions import BasePermission
 from core.models import GuardianStudent
+from core.tenancy import ROLE_GUARDIAN, ROLE_TEACHER, get_school_context
 
 
 class IsGuardianUser(BasePermission):
@@ -38,13 +39,10 @@ class IsSchoolMember(BasePermission):
         if not user or not user.is_authenticated:
             return False
 
-        # Check if user has guardian with school
-        if hasattr(user, "guardian") and user.guardian:
-            return bool(user.guardian.school_id)
-
-        # Check if user has teacher profile with school
-        if hasattr(user, "teacher_profile") and user.teacher_profile:
-            return bool(user.teacher_profile.school_id)
+        # Guardians and teachers must be attached to a school
+        context = get_school_context(user)
+        if context.role in (ROLE_GUARDIAN, ROLE_TEACHER):
+            return bool(context.school_id)
 
         # Check if user is staff (can access all schools)
         return user.is_staff
@@ -125,26 +123,25 @@ class IsInSameSchool(BasePermission):
 
     def has_object_permission(self, request, view, obj):
         user = request.user
-        user_school = None
+        user_school_id = None
 
         # Get user's school
-        if hasattr(user, "guardian") and user.guardian:
-            user_school = user.guardian.school
-        elif hasattr(user, "teacher_profile") and user.teacher_profile:
-            user_school = user.teacher_profile.school
+        context = get_school_context(user)
+        if context.role in (ROLE_GUARDIAN, ROLE_TEACHER):
+            user_school_id = context.school_id
         elif user.is_staff:
             return True  # Staff can access all schools
 
-        if not user_school:
+        if not user_school_id:
             return False
 
-        # Check object's school
-        if hasattr(obj, 'school'):
-            return obj.school == user_school
-        elif hasattr(obj, 'student') and hasattr(obj.student, 'school'):
-            return obj.student.school == user_school
-        elif hasattr(obj, 'guardian') and hasattr(obj.guardian, 'school'):
-            return obj.guardian.school == user_school
+        # Check object's school (compare ids to avoid loading the related school)
+        if hasattr(obj, 'school_id'):
+            return obj.school_id == user_school_id
+        elif hasattr(obj, 'student') and hasattr(obj.student, 'school_id'):
+            return obj.student.school_id == user_school_id
+        elif hasattr(obj, 'guardian') and hasattr(obj.guardian, 'school_id'):
+            return obj.guardian.school_id == user_school_id
 
         return False
 
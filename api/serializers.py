@@ -5,12 +5,15 @@ from django.utils import timezone
 from collections.abc import Mapping
 
 from survey.models import Template, TemplateField, Response as SurveyResponse, AdditionalField, SurveyPeriod, SurveyDistribution
+from survey.analytics import record_answers
+from survey.storage import read_answers
+from survey.validation import get_validator
 from core.models import (
     School, AcademicYear, Grade, SchoolClass,
     Student, Guardian, GuardianStudent,
     StudentTimeline, StudentTimelineAttachment
 )
-from .utils import is_available_now, next_available_at
+from .utils import is_available_now, next_available_at, requested_fields
 
 User = get_user_model()
 
@@ -25,6 +28,17 @@ class TimestampMixin(serializers.Serializer):
     updated_at = serializers.DateTimeField(read_only=True, format='%Y-%m-%d %H:%M:%S')
 
 
+class SparseFieldsMixin:
+    """Keeps only the fields listed in ?fields=a,b when the client sends it"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = requested_fields(self.context.get('request'))
+        if fields:
+            for name in set(self.fields) - fields:
+                self.fields.pop(name)
+
+
 class SchoolContextMixin:
     """Mixin to filter querysets by school context"""
 
@@ -448,8 +462,8 @@ class ProfileSerializer(serializers.Serializer):
         return None
 
 
-class StudentListSerializerForEmployee(serializers.ModelSerializer):
-    """Student list serializer for employee endpoint"""
+class StudentListSerializerForEmployee(SparseFieldsMixin, serializers.ModelSerializer):
+    """Student list serializer for employee endpoint (supports ?fields=)"""
 
     current_class_name = serializers.CharField(source='current_class.full_name', read_only=True)
     current_grade = serializers.SerializerMethodField()
@@ -490,12 +504,14 @@ class StudentListSerializerForEmployee(serializers.ModelSerializer):
         return None
 
     def get_guardians_count(self, obj):
-        """Count guardians"""
-        return obj.guardians.count()
+        """Count guardians (annotated by EmployeeStudentsViewSet)"""
+        count = getattr(obj, 'guardians_count', None)
+        return obj.guardians.count() if count is None else count
 
     def get_timeline_count(self, obj):
-        """Count timeline entries"""
-        return obj.timeline.count()
+        """Count timeline entries (annotated by EmployeeStudentsViewSet)"""
+        count = getattr(obj, 'timeline_count', None)
+        return obj.timeline.count() if count is None else count
 
 
 # ==========================================
@@ -904,9 +920,8 @@ class ResponseDetailSerializer(serializers.ModelSerializer, TimestampMixin):
         ]
 
     def get_response_fields(self, obj):  # Renamed from get_fields to get_response_fields
-        """Get response fields"""
-        qs = obj.fields.select_related("field").order_by("row", "id")
-        return AdditionalFieldSerializer(qs, many=True).data
+        """Get response fields (document or AdditionalField rows)"""
+        return read_answers(obj)
 
     def get_guardian_info(self, obj):
         """Get guardian basic info"""
@@ -925,11 +940,6 @@ class ResponseCreateSerializer(serializers.Serializer):
     template = serializers.PrimaryKeyRelatedField(queryset=Template.objects.all(), required=True)
     fields = serializers.JSONField(required=True)
 
-    def validate_fields(self, value):
-        """Validate fields data"""
-        print(f"DEBUG validate_fields: {value} (type: {type(value)})")
-        return value
-
     def validate_template(self, value):
         """Validate that the template is accessible to the guardian's school"""
         request = self.context.get("request")
@@ -982,13 +992,11 @@ class ResponseCreateSerializer(serializers.Serializer):
         template = validated_data["template"]
         data = validated_data["fields"]
 
-        print(f"DEBUG: RECEIVED DATA TYPE: {type(data)}")
-        print(f"DEBUG: RECEIVED DATA: {data}")
-        for key, value in data.items():
-            print(f"DEBUG: Field {key} = {value} (type: {type(value)})")
-
-        # Get public fields
-        public_fields = template.fields.filter(is_public=True).order_by("order", "id")
+        # Validate public fields with the compiled validator (same errors as the Django form)
+        validator = get_validator(template, public_only=True, is_public=True)
+        cleaned_data, errors = validator.validate(data)
+        if errors:
+            raise serializers.ValidationError(errors)
 
         with transaction.atomic():
             # Create response
@@ -998,23 +1006,8 @@ class ResponseCreateSerializer(serializers.Serializer):
                 student=student
             )
 
-            # Build and validate form
-            form = template.build_django_form(
-                ticket=response,
-                data=data,
-                user=request.user,
-                is_public=True,
-                fields=public_fields
-            )
-
-            print(f"DEBUG: FORM ERRORS: {form.errors}")
-            print(f"DEBUG: FORM IS VALID: {form.is_valid()}")
-
-            if not form.is_valid():
-                raise serializers.ValidationError(form.errors)
-
             # Save form data
-            form.save(commit=True, parent=None)
+            validator.save(response, cleaned_data, user=request.user)
 
         return response
 
@@ -1120,8 +1113,11 @@ class DistributionResponseCreateSerializer(serializers.Serializer):
         survey = distribution.survey
         data = validated_data['fields']
 
-        # Get public fields
-        public_fields = survey.fields.filter(is_public=True).order_by("order", "id")
+        # Validate public fields with the compiled validator (same errors as the Django form)
+        validator = get_validator(survey, public_only=True, is_public=True)
+        cleaned_data, errors = validator.validate(data)
+        if errors:
+            raise serializers.ValidationError(errors)
 
         with transaction.atomic():
             # Create response
@@ -1131,26 +1127,23 @@ class DistributionResponseCreateSerializer(serializers.Serializer):
                 student=distribution.student
             )
 
-            # Build and validate form
-            form = survey.build_django_form(
-                ticket=response,
-                data=data,
-                user=request.user,
-                is_public=True,
-                fields=public_fields
-            )
-
-            if not form.is_valid():
-                raise serializers.ValidationError(form.errors)
-
             # Save form data
-            form.save(commit=True, parent=None)
+            validator.save(response, cleaned_data, user=request.user)
 
-            # Update distribution
+            # Update distribution (only if still pending, so a concurrent submission is counted once)
             distribution.response = response
             distribution.is_completed = True
             distribution.completed_at = timezone.now()
-            distribution.save(update_fields=['response', 'is_completed', 'completed_at'])
+            updated = SurveyDistribution.objects.filter(pk=distribution.pk, is_completed=False).update(
+                response=response, is_completed=True, completed_at=distribution.completed_at,
+                updated_at=distribution.completed_at,
+            )
+            if not updated:
+                raise serializers.ValidationError({"distribution_id": ["تم الإجابة على هذا الاستطلاع مسبقاً."]})
+            SurveyPeriod.increment(distribution.period_id, completed_count=1)
+
+            # Pre-aggregated results of the period (see survey.analytics)
+            record_answers(distribution.period_id, validator.fields, cleaned_data)
 
         return response
 
@@ -1,3 +1,281 @@
-from django.test import TestCase
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ValidationError
+
+from accounts.models import EmployeeProfile
+from api.serializers import DistributionResponseCreateSerializer
+from core.models import School, Student, Guardian, GuardianStudent, StudentTimeline
+from core.queries import query_budget
+from survey.models import Template, TemplateField, SurveyDistribution
+from survey.services import create_survey_distribution
+
+User = get_user_model()
+
+
+def create_school_data(students=5, posts=2):
+    """A school with an employee and students, each with a guardian account and timeline posts"""
+    school = School.objects.create(name='مدرسة الاختبار')
+    employee = User.objects.create_user(username='employee', password='x', user_type=User.EMPLOYEE)
+    EmployeeProfile.objects.create(user=employee, school=school, employee_id='E1', position='admin')
+
+    guardians = []
+    for index in range(students):
+        student = Student.objects.create(
+            school=school, first_name=f'طالب{index}', last_name='علي', sex='male'
+        )
+        user = User.objects.create_user(username=f'guardian{index}', password='x', user_type=User.GUARDIAN)
+        guardian = Guardian.objects.create(
+            school=school, first_name='ولي', last_name=str(index), user=user, selected_student=student
+        )
+        GuardianStudent.objects.create(guardian=guardian, student=student, relationship='father', is_primary=True)
+        for number in range(posts):
+            StudentTimeline.objects.create(student=student, title=f'منشور {number}', note='...', created_by=employee)
+        guardians.append(guardian)
+    return school, employee, guardians
+
+
+def create_survey(school, sent_by):
+    """A guardian survey with one required choice question, sent to the school"""
+    template = Template.objects.create(
+        name='استطلاع', type=Template.FOOD, school=school, target_audience=Template.TARGET_GUARDIANS,
+    )
+    field = TemplateField.objects.create(
+        template=template, name='التقييم', type=TemplateField.SELECT, value=['جيد', 'ضعيف'], is_required=True,
+    )
+    period, _ = create_survey_distribution(template, school, sent_by, notify=False)
+    return template, field, period
+
+
+def token_header(user):
+    token, _ = Token.objects.get_or_create(user=user)
+    return {'HTTP_AUTHORIZATION': f'Token {token.key}'}
+
+
+class KeysetPaginationTests(TestCase):
+    """?pagination=cursor walks the same rows as page-number pagination, without gaps or repeats"""
+
+    def setUp(self):
+        _, self.employee, guardians = create_school_data(students=1, posts=0)
+        self.student = guardians[0].selected_student
+        self.headers = token_header(guardians[0].user)
+        for number in range(11):
+            StudentTimeline.objects.create(
+                student=self.student, title=f'منشور {number}', note='...', is_pinned=number in (3, 8),
+            )
+        # Ties on created_at must be broken by id
+        StudentTimeline.objects.filter(student=self.student).update(created_at=timezone.now())
+
+    def test_round_trip(self):
+        expected = [row['id'] for row in self.client.get('/api/timeline/?page_size=100', **self.headers).json()['results']]
+        self.assertEqual(len(expected), 11)
+
+        seen = []
+        url = '/api/timeline/?pagination=cursor&page_size=4'
+        while url:
+            response = self.client.get(url, **self.headers)
+            self.assertEqual(response.status_code, 200)
+            body = response.json()
+            self.assertLessEqual(len(body['results']), 4)
+            seen.extend(row['id'] for row in body['results'])
+            url = body['next']
+        # Same rows, pinned first; ties on created_at may order differently between the two modes
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(sorted(seen), sorted(expected))
+        pinned = set(StudentTimeline.objects.filter(is_pinned=True).values_list('id', flat=True))
+        self.assertEqual(set(seen[:2]), pinned)
+
+    def test_rows_added_between_pages_are_not_repeated(self):
+        first = self.client.get('/api/timeline/?pagination=cursor&page_size=5', **self.headers).json()
+        StudentTimeline.objects.create(student=self.student, title='جديد', note='...')
+        second = self.client.get(first['next'], **self.headers).json()
+        ids = [row['id'] for row in first['results'] + second['results']]
+        self.assertEqual(len(ids), len(set(ids)))
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/timeline/?pagination=cursor&cursor=tampered', **self.headers)
+        self.assertEqual(response.status_code, 404)
+
+
+@mock.patch('api.conditional.VALIDATOR_CACHE_SECONDS', 0)
+class ConditionalGetTests(TestCase):
+    """ETag/Last-Modified on the polled guardian endpoints"""
+
+    def setUp(self):
+        _, self.employee, guardians = create_school_data(students=1, posts=2)
+        self.student = guardians[0].selected_student
+        self.headers = token_header(guardians[0].user)
+
+    def test_not_modified_until_data_changes(self):
+        for url in ('/api/timeline/', '/api/students/', '/api/profile/'):
+            response = self.client.get(url, **self.headers)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertIn('ETag', response)
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'], **self.headers)
+            self.assertEqual(response.status_code, 304, url)
+
+        etag = self.client.get('/api/timeline/', **self.headers)['ETag']
+        StudentTimeline.objects.create(student=self.student, title='جديد', note='...')
+        response = self.client.get('/api/timeline/', HTTP_IF_NONE_MATCH=etag, **self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_if_modified_since_is_not_trusted(self):
+        response = self.client.get('/api/timeline/', **self.headers)
+        # Deleting the oldest post leaves the latest date unchanged
+        StudentTimeline.objects.filter(student=self.student).order_by('updated_at').first().delete()
+        response = self.client.get('/api/timeline/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'], **self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 1)
+
+    def test_cached_validators(self):
+        cache.clear()
+        with mock.patch('api.conditional.VALIDATOR_CACHE_SECONDS', 5):
+            etag = self.client.get('/api/timeline/', **self.headers)['ETag']
+            StudentTimeline.objects.create(student=self.student, title='جديد', note='...')
+            response = self.client.get('/api/timeline/', HTTP_IF_NONE_MATCH=etag, **self.headers)
+            self.assertEqual(response.status_code, 304)
+
+            cache.clear()
+            response = self.client.get('/api/timeline/', HTTP_IF_NONE_MATCH=etag, **self.headers)
+            self.assertEqual(response.status_code, 200)
+
+    def test_validators_are_per_user(self):
+        etag = self.client.get('/api/timeline/', **self.headers)['ETag']
+        other = User.objects.create_user(username='other', password='x', user_type=User.GUARDIAN)
+        Guardian.objects.create(
+            school=self.student.school, first_name='ولي', last_name='آخر', user=other, selected_student=self.student,
+        )
+        response = self.client.get('/api/timeline/', HTTP_IF_NONE_MATCH=etag, **token_header(other))
+        self.assertEqual(response.status_code, 200)
+
+    def test_since(self):
+        since = timezone.now()
+        StudentTimeline.objects.create(student=self.student, title='جديد', note='...')
+        response = self.client.get('/api/timeline/', {'since': since.isoformat()}, **self.headers)
+        self.assertEqual([row['title'] for row in response.json()['results']], ['جديد'])
+
+        response = self.client.get('/api/timeline/?since=yesterday', **self.headers)
+        self.assertEqual(response.status_code, 400)
+
+
+class PeriodCounterTests(TestCase):
+    """SurveyPeriod.total_count/completed_count follow distributions and submissions"""
+
+    def setUp(self):
+        self.school, self.employee, self.guardians = create_school_data(students=3, posts=0)
+        self.template, self.field, self.period = create_survey(self.school, self.employee)
+        self.user = self.guardians[0].user
+        self.distribution = SurveyDistribution.objects.get(period=self.period, user=self.user)
+
+    def respond(self):
+        return self.client.post(
+            '/api/distributions/respond/',
+            {'distribution_id': self.distribution.pk, 'fields': {self.field.key: 'جيد'}},
+            content_type='application/json',
+            **token_header(self.user),
+        )
+
+    def test_counters(self):
+        self.period.refresh_from_db()
+        self.assertEqual(self.period.total_count, 3)
+        self.assertEqual(self.period.completed_count, 0)
+
+        self.assertEqual(self.respond().status_code, 201)
+        self.period.refresh_from_db()
+        self.assertEqual(self.period.completed_count, 1)
+        self.assertEqual(self.period.pending_count, 2)
+
+    def test_double_submit(self):
+        self.assertEqual(self.respond().status_code, 201)
+        self.assertEqual(self.respond().status_code, 400)
+        self.period.refresh_from_db()
+        self.assertEqual(self.period.completed_count, 1)
+
+    def test_concurrent_submit_is_counted_once(self):
+        request = SimpleNamespace(user=self.user)
+        data = {'distribution_id': self.distribution.pk, 'fields': {self.field.key: 'جيد'}}
+        first = DistributionResponseCreateSerializer(data=data, context={'request': request})
+        second = DistributionResponseCreateSerializer(data=data, context={'request': request})
+        # Both pass validation before either is saved
+        self.assertTrue(first.is_valid())
+        self.assertTrue(second.is_valid())
+
+        first.save()
+        with self.assertRaises(ValidationError):
+            second.save()
+        self.period.refresh_from_db()
+        self.assertEqual(self.period.completed_count, 1)
+
+
+@override_settings(QUERY_BUDGET_ENFORCE=True)
+class EmployeeStudentsQueryBudgetTests(TestCase):
+    """The employee student list runs a fixed number of queries, whatever the page size"""
+
+    BUDGET = 8
+
+    def test_list_within_budget(self):
+        school, employee, _ = create_school_data(students=3)
+        headers = token_header(employee)
+        with query_budget(self.BUDGET) as small:
+            response = self.client.get('/api/employee/students/', **headers)
+        self.assertEqual(response.status_code, 200)
+
+        for index in range(12):
+            Student.objects.create(school=school, first_name=f'إضافي{index}', last_name='سالم', sex='female')
+        with query_budget(self.BUDGET) as large:
+            response = self.client.get('/api/employee/students/', **headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 15)
+        self.assertEqual(small.count, large.count)
+
+    def test_sparse_fields(self):
+        _, employee, _ = create_school_data(students=2)
+        response = self.client.get('/api/employee/students/?fields=id,full_name', **token_header(employee))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'full_name'})
+
+
+@override_settings(QUERY_BUDGET_ENFORCE=True)
+@mock.patch('api.conditional.VALIDATOR_CACHE_SECONDS', 0)
+class GuardianQueryBudgetTests(TestCase):
+    """The polled guardian endpoints run a fixed number of queries, whatever the data size"""
+
+    BUDGETS = {
+        '/api/timeline/': 8,
+        '/api/distributions/pending/': 5,
+        '/api/surveys/': 6,
+    }
+
+    def setUp(self):
+        cache.clear()
+
+    def test_endpoints_within_budget(self):
+        school, employee, guardians = create_school_data(students=2, posts=2)
+        create_survey(school, employee)
+        headers = token_header(guardians[0].user)
+
+        counts = {}
+        for url, budget in self.BUDGETS.items():
+            with query_budget(budget) as recorder:
+                response = self.client.get(url, **headers)
+            self.assertEqual(response.status_code, 200, url)
+            counts[url] = recorder.count
+
+        student = guardians[0].selected_student
+        for number in range(20):
+            StudentTimeline.objects.create(student=student, title=f'إضافي {number}', note='...', created_by=employee)
+        # The new template invalidates the cached template list on commit
+        with self.captureOnCommitCallbacks(execute=True):
+            create_survey(school, employee)
+
+        for url, budget in self.BUDGETS.items():
+            with query_budget(budget) as recorder:
+                response = self.client.get(url, **headers)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertEqual(recorder.count, counts[url], url)
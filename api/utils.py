@@ -1,4 +1,6 @@
 from datetime import timedelta
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from core.models import Guardian, GuardianStudent
 
@@ -17,6 +19,28 @@ def next_available_at(last_dt, freq: str):
 def is_available_now(last_dt, freq: str) -> bool:
     return not last_dt or timezone.now() >= next_available_at(last_dt, freq)
 
+def count_subquery(model, field):
+    """
+    Number of model rows whose <field> points at the outer row, as an annotation.
+    A correlated subquery: no GROUP BY/joins on the outer query, evaluated only for the fetched page.
+    """
+    counts = (
+        model.objects
+        .filter(**{field: OuterRef("pk")})
+        .order_by()
+        .values(field)
+        .annotate(count=Count("pk"))
+        .values("count")
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+def requested_fields(request):
+    """Field names asked for with ?fields=a,b (sparse fieldsets), or None when not given"""
+    value = request.query_params.get("fields") if request is not None else None
+    if not value:
+        return None
+    return {name.strip() for name in value.split(",") if name.strip()}
+
 def get_or_select_student_fast(guardian: Guardian):
     """
     Fast path:
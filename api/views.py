@@ -1,5 +1,5 @@
 # api/views.py - Enhanced API views with school structure
-from django.db.models import Max, Q, Count, Prefetch
+from django.db.models import Q, Count, Max, Prefetch
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
@@ -15,11 +15,13 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from survey.models import Template, Response as SurveyResponse, SurveyDistribution
+from survey.services import school_templates
 from core.models import (
     School, AcademicYear, Grade, SchoolClass,
     Guardian, Student, GuardianStudent,
-    StudentTimeline, StudentTimelineAttachment
+    StudentTimeline, StudentTimelineAttachment, SchoolStats
 )
+from .conditional import conditional, scope_state, since_filter
 from .filters import StudentTimelineFilter, StudentFilter
 from .permissions import IsGuardianUser, HasSelectedStudent, IsSchoolMember, IsEmployeeUser
 from .serializers import (
@@ -51,8 +53,8 @@ from .serializers import (
     # Employee and Profile serializers
     ProfileSerializer, EmployeeProfileSerializer, StudentListSerializerForEmployee,
 )
-from .utils import is_available_now, get_or_select_student_fast
-from .pagination import StandardResultsSetPagination
+from .utils import is_available_now, get_or_select_student_fast, count_subquery, requested_fields
+from .pagination import StandardResultsSetPagination, SelectablePagination
 
 
 # ==========================================
@@ -179,25 +181,21 @@ class TemplateViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets
         student = guardian.selected_student
         school = guardian.school
 
-        # Get templates with last response dates (filtered by school)
-        qs = (Template.objects
-        .filter(Q(school=school) | Q(school__isnull=True))
-        .annotate(
-            last_response_at=Max(
-                "responses__created_at",
-                filter=Q(
-                    responses__guardian=guardian,
-                    responses__student=student
-                )
-            )
-        ))
-
-        # Create last response map
-        last_map = {t.id: t.last_response_at for t in qs}
+        # Templates come from the per-school cache; last response dates from one
+        # grouped query on the (guardian, student, template, -created_at) index
+        templates = school_templates(school.pk)
+        last_map = dict(
+            SurveyResponse.objects
+            .filter(guardian=guardian, student=student, template_id__in=[t.id for t in templates])
+            .order_by()
+            .values('template')
+            .annotate(last_response_at=Max('created_at'))
+            .values_list('template', 'last_response_at')
+        )
 
         # Filter available templates
         available = [
-            t for t in qs
+            t for t in templates
             if is_available_now(last_map.get(t.id), t.send_frequency)
         ]
 
@@ -227,7 +225,8 @@ class ResponseViewSet(mixins.CreateModelMixin, mixins.ListModelMixin,
     """Survey responses for guardians"""
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated, IsGuardianUser, HasSelectedStudent]
-    pagination_class = StandardResultsSetPagination
+    pagination_class = SelectablePagination
+    cursor_ordering = ['-created_at', '-id']
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['template', 'created_at']
     ordering_fields = ['created_at']
@@ -272,7 +271,7 @@ class ResponseViewSet(mixins.CreateModelMixin, mixins.ListModelMixin,
     def list(self, request, *args, **kwargs):
         queryset = self.filter_queryset(self.get_queryset())
         page = self.paginate_queryset(queryset)
-        serializer = ResponseListSerializer(page or queryset, many=True)
+        serializer = ResponseListSerializer(page if page is not None else queryset, many=True)
 
         if page is not None:
             return self.get_paginated_response(serializer.data)
@@ -310,7 +309,8 @@ class SurveyDistributionViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin
     """
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
-    pagination_class = StandardResultsSetPagination
+    pagination_class = SelectablePagination
+    cursor_ordering = ['-sent_at', '-id']
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['is_completed', 'survey']
     ordering_fields = ['sent_at', 'deadline', 'completed_at']
@@ -347,7 +347,7 @@ class SurveyDistributionViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin
     def list(self, request, *args, **kwargs):
         queryset = self.filter_queryset(self.get_queryset())
         page = self.paginate_queryset(queryset)
-        serializer = self.get_serializer(page or queryset, many=True)
+        serializer = self.get_serializer(page if page is not None else queryset, many=True)
 
         if page is not None:
             return self.get_paginated_response(serializer.data)
@@ -366,6 +366,13 @@ class SurveyDistributionViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin
         serializer = self.get_serializer(distribution)
         return Response(serializer.data)
 
+    def _pending_queryset(self):
+        return self.get_queryset().filter(
+            is_completed=False
+        ).exclude(
+            period__end_date__lt=timezone.now().date()
+        )
+
     @swagger_auto_schema(
         method='get',
         operation_summary="الاستطلاعات المعلقة",
@@ -373,16 +380,16 @@ class SurveyDistributionViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin
         responses={200: SurveyDistributionListSerializer(many=True)}
     )
     @action(detail=False, methods=['get'])
+    @conditional(lambda view, request: [
+        timezone.now().date(),
+        scope_state(since_filter(request, view._pending_queryset()), 'updated_at', 'period__updated_at', 'survey__updated_at'),
+    ])
     def pending(self, request):
         """Get pending (not completed, not expired) distributions"""
-        queryset = self.get_queryset().filter(
-            is_completed=False
-        ).exclude(
-            period__end_date__lt=timezone.now().date()
-        )
+        queryset = since_filter(request, self._pending_queryset())
 
         page = self.paginate_queryset(queryset)
-        serializer = SurveyDistributionListSerializer(page or queryset, many=True)
+        serializer = SurveyDistributionListSerializer(page if page is not None else queryset, many=True)
 
         if page is not None:
             return self.get_paginated_response(serializer.data)
@@ -400,7 +407,7 @@ class SurveyDistributionViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin
         queryset = self.get_queryset().filter(is_completed=True)
 
         page = self.paginate_queryset(queryset)
-        serializer = SurveyDistributionListSerializer(page or queryset, many=True)
+        serializer = SurveyDistributionListSerializer(page if page is not None else queryset, many=True)
 
         if page is not None:
             return self.get_paginated_response(serializer.data)
@@ -442,15 +449,22 @@ class StudentsListView(APIView):
     permission_classes = [IsAuthenticated, IsGuardianUser]
     pagination_class = StandardResultsSetPagination
 
+    def _students(self, request):
+        return request.user.guardian.students.filter(is_active=True).select_related(
+            'current_class', 'current_class__grade', 'school'
+        ).order_by("last_name", "first_name")
+
     @swagger_auto_schema(
         operation_summary="قائمة أطفال ولي الأمر",
         responses={200: StudentOptionSerializer(many=True)}
     )
+    @conditional(lambda view, request: [
+        request.user.guardian.selected_student_id,
+        scope_state(view._students(request), 'updated_at', 'current_class__updated_at', 'school__updated_at'),
+    ])
     def get(self, request):
         guardian = request.user.guardian
-        students = guardian.students.filter(is_active=True).select_related(
-            'current_class', 'current_class__grade'
-        ).order_by("last_name", "first_name")
+        students = since_filter(request, self._students(request))
 
         # Apply pagination
         paginator = self.pagination_class()
@@ -534,7 +548,8 @@ class MyTimelineViewSet(viewsets.ReadOnlyModelViewSet):
     """Student timeline view for guardians (read-only)"""
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated, IsGuardianUser]
-    pagination_class = StandardResultsSetPagination
+    pagination_class = SelectablePagination
+    cursor_ordering = ["-is_pinned", "-created_at", "-id"]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_class = StudentTimelineFilter
     ordering_fields = ["created_at", "is_pinned", "id"]
@@ -583,18 +598,32 @@ class MyTimelineViewSet(viewsets.ReadOnlyModelViewSet):
         if not student:
             return StudentTimeline.objects.none()
 
-        return (
+        queryset = (
             StudentTimeline.objects
             .filter(student=student, is_visible_to_guardian=True)
             .select_related("student", "created_by")
             .prefetch_related("attachments")
             .order_by("-is_pinned", "-created_at")
         )
+        if self.action == 'list':
+            queryset = since_filter(self.request, queryset)
+        return queryset
+
+    def _list_states(self, request):
+        """Validator of the timeline list: posts and their attachments"""
+        queryset = self.filter_queryset(self.get_queryset())
+        attachments = StudentTimelineAttachment.objects.filter(timeline__in=queryset.values('pk'))
+        student_id = getattr(request.user.guardian, 'selected_student_id', None)
+        return [student_id, scope_state(queryset), scope_state(attachments, 'created_at')]
 
     @swagger_auto_schema(
         operation_summary="قائمة منشورات الطالب (ولي الأمر - قراءة فقط)",
+        manual_parameters=[
+            openapi.Parameter('since', openapi.IN_QUERY, description="المنشورات المعدلة بعد هذا التاريخ فقط (ISO 8601)", type=openapi.TYPE_STRING),
+        ],
         responses={200: StudentTimelineDetailSerializer(many=True)}
     )
+    @conditional(lambda view, request: view._list_states(request))
     def list(self, request, *args, **kwargs):
         """Get timeline entries with content_type choices and pagination"""
         response = super().list(request, *args, **kwargs)
@@ -958,24 +987,17 @@ class SchoolStatsView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Get statistics
+        # Get statistics (one materialized row, see SchoolStats)
+        school_stats = SchoolStats.for_school(school)
         stats = {
-            'total_students': school.students.filter(is_active=True).count(),
-            'total_guardians': school.guardians.count(),
-            'total_classes': school.classes.filter(is_active=True).count(),
-            'total_grades': school.grades.filter(is_active=True).count(),
-            'school_info': SchoolBasicSerializer(school).data
+            'total_students': school_stats.students,
+            'total_guardians': school_stats.guardians,
+            'total_classes': school_stats.classes,
+            'total_grades': school_stats.grades,
+            'school_info': SchoolBasicSerializer(school).data,
+            'grade_breakdown': school_stats.grade_breakdown,
         }
 
-        # Add grade breakdown
-        grade_stats = (
-            school.grades.filter(is_active=True)
-            .annotate(student_count=Count('classes__students', filter=Q(classes__students__is_active=True)))
-            .values('name', 'grade_type', 'student_count')
-            .order_by('grade_type', 'level')
-        )
-        stats['grade_breakdown'] = list(grade_stats)
-
         return Response(stats)
 
 
@@ -988,6 +1010,23 @@ class ProfileView(APIView):
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated]
 
+    def _states(self, request):
+        """Validator of the profile: the user, their profile and (guardians) their children"""
+        user = request.user
+        states = [user.updated_at]
+        for name in ('employee_profile', 'teacher_profile'):
+            profile = getattr(user, name, None)
+            if profile:
+                states += [profile.updated_at, profile.school.updated_at]
+        guardian = getattr(user, 'guardian', None)
+        if guardian:
+            states += [
+                guardian.updated_at,
+                guardian.selected_student_id,
+                scope_state(guardian.students.all(), 'updated_at', 'school__updated_at'),
+            ]
+        return states
+
     @swagger_auto_schema(
         operation_summary="الملف الشخصي للمستخدم",
         operation_description="الحصول على معلومات الملف الشخصي لجميع أنواع المستخدمين (موظف/معلم/ولي أمر)",
@@ -996,6 +1035,7 @@ class ProfileView(APIView):
             403: "User has no profile"
         }
     )
+    @conditional(lambda view, request: view._states(request))
     def get(self, request):
         from api.auth_views import build_user_profile_data
 
@@ -1041,16 +1081,26 @@ class EmployeeStudentsViewSet(viewsets.ReadOnlyModelViewSet):
 
         school = employee.school
 
-        return (
+        queryset = (
             Student.objects
             .filter(school=school, is_active=True)
             .select_related('current_class', 'current_class__grade', 'school')
-            .prefetch_related('guardians')
             .order_by('full_name')
         )
+        if self.action == 'list':
+            # Counts as subqueries instead of two COUNT queries per student; skipped when not requested
+            fields = requested_fields(self.request)
+            if fields is None or 'guardians_count' in fields:
+                queryset = queryset.annotate(guardians_count=count_subquery(GuardianStudent, 'student'))
+            if fields is None or 'timeline_count' in fields:
+                queryset = queryset.annotate(timeline_count=count_subquery(StudentTimeline, 'student'))
+        return queryset
 
     @swagger_auto_schema(
         operation_summary="قائمة الطلاب للموظف",
+        manual_parameters=[
+            openapi.Parameter('fields', openapi.IN_QUERY, description="الحقول المطلوبة مفصولة بفواصل (مثال: id,full_name)", type=openapi.TYPE_STRING),
+        ],
         responses={200: StudentListSerializerForEmployee(many=True)}
     )
     def list(self, request, *args, **kwargs):
@@ -1071,7 +1121,8 @@ class EmployeeTimelineViewSet(viewsets.ModelViewSet):
     """Timeline management for Employee users"""
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated, IsEmployeeUser]
-    pagination_class = StandardResultsSetPagination
+    pagination_class = SelectablePagination
+    cursor_ordering = ["-is_pinned", "-created_at", "-id"]
     parser_classes = [JSONParser, MultiPartParser, FormParser]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_class = StudentTimelineFilter
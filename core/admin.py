@@ -8,7 +8,7 @@ from django.utils.safestring import mark_safe
 from .models import (
     School, AcademicYear, Grade, SchoolClass,
     Guardian, Student, GuardianStudent,
-    StudentTimeline, StudentTimelineAttachment
+    StudentTimeline, StudentTimelineAttachment, SchoolStats, ImportJob
 )
 
 
@@ -45,13 +45,22 @@ class SchoolAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('stats')
+
+    def _stats(self, obj):
+        try:
+            return obj.stats
+        except SchoolStats.DoesNotExist:
+            return SchoolStats.rebuild(obj)
+
     def students_count(self, obj):
-        return obj.students.filter(is_active=True).count()
+        return self._stats(obj).students
 
     students_count.short_description = 'عدد الطلاب'
 
     def guardians_count(self, obj):
-        return obj.guardians.count()
+        return self._stats(obj).guardians
 
     guardians_count.short_description = 'عدد الأولياء'
 
@@ -493,6 +502,21 @@ class StudentTimelineAttachmentAdmin(admin.ModelAdmin):
     file_size_display.short_description = 'حجم الملف'
 
 
+# ==========================================
+# IMPORT ADMIN
+# ==========================================
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = [
+        'file_name', 'school', 'dry_run', 'status', 'processed_rows',
+        'created_students', 'created_guardians', 'skipped_rows', 'created_at'
+    ]
+    list_filter = ['status', 'dry_run', 'school']
+    readonly_fields = ['report', 'errors', 'last_error', 'created_at', 'updated_at', 'finished_at']
+    raw_id_fields = ['default_grade', 'default_class', 'created_by']
+
+
 # ==========================================
 # ADMIN SITE CUSTOMIZATION
 # ==========================================
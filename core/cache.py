@@ -0,0 +1,226 @@
+# core/cache.py - Shared cache helpers (namespacing, versioning, tags, stampede protection)
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.filebased import FileBasedCache
+
+
+DEFAULT_TIMEOUT = 300
+
+_MISSING = object()
+
+
+def _version_key(namespace):
+    return f"version:{namespace}"
+
+
+def _get_versions(namespaces):
+    """
+    Current version of each namespace.
+    Missing versions are seeded from the clock so an evicted version never
+    resurrects entries written under an older one.
+    """
+    if not namespaces:
+        return []
+
+    keys = [_version_key(namespace) for namespace in namespaces]
+    found = cache.get_many(keys)
+
+    versions = []
+    for key in keys:
+        version = found.get(key)
+        if version is None:
+            cache.add(key, int(time.time() * 1000), None)
+            version = cache.get(key)
+        versions.append(version)
+    return versions
+
+
+def _bump_versions(namespaces):
+    # incr is a read-modify-write on FileBasedCache: concurrent bumps may
+    # land on the same value, which still differs from the old one
+    for namespace in namespaces:
+        key = _version_key(namespace)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Not seeded yet: nothing was cached under this namespace
+            cache.add(key, int(time.time() * 1000), None)
+
+
+def school_namespace(school_id):
+    return f"school:{school_id}"
+
+
+def make_key(school_id, *parts):
+    """
+    Build a cache key from parts, scoped to a school (school_id None for
+    keys shared by every school).
+    School keys embed the school's version, so invalidate_school() drops all
+    of them at once.
+    """
+    base = ":".join(str(part) for part in parts)
+    if school_id is None:
+        return f"global:{base}"
+
+    namespace = school_namespace(school_id)
+    version, = _get_versions([namespace])
+    return f"{namespace}:v{version}:{base}"
+
+
+def invalidate_school(school_id):
+    """Invalidate every key built with make_key(school_id, ...)"""
+    _bump_versions([school_namespace(school_id)])
+
+
+def invalidate_tags(*tags):
+    """Invalidate every entry cached with any of the given tags"""
+    _bump_versions([f"tag:{tag}" for tag in tags])
+
+
+def _tagged_key(key, tags):
+    if not tags:
+        return key
+    versions = _get_versions([f"tag:{tag}" for tag in tags])
+    return f"{key}:t" + ".".join(str(version) for version in versions)
+
+
+def get(key, default=None, tags=()):
+    return cache.get(_tagged_key(key, tags), default)
+
+
+def set_value(key, value, timeout=DEFAULT_TIMEOUT, tags=()):
+    cache.set(_tagged_key(key, tags), value, timeout)
+
+
+def delete(key):
+    cache.delete(key)
+
+
+@contextmanager
+def _file_lock(directory, key, timeout):
+    """
+    Lock file created with O_EXCL in a directory next to the FileBasedCache
+    one (its add() is a check-then-write, not atomic). A lock left by a
+    crashed process is broken once older than timeout.
+    """
+    lock_dir = directory.rstrip(os.sep) + ".locks"
+    os.makedirs(lock_dir, exist_ok=True)
+    path = os.path.join(lock_dir, hashlib.md5(key.encode()).hexdigest() + ".lock")
+
+    acquired = False
+    for _ in range(2):
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600))
+            acquired = True
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) < timeout:
+                    break
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+
+@contextmanager
+def lock(key, timeout=10):
+    """
+    Non-blocking lock shared by every worker; yields whether it was acquired.
+    add() is atomic on Redis, memcached, locmem and the database cache; the
+    file cache uses a lock file instead.
+    """
+    backend = caches[DEFAULT_CACHE_ALIAS]
+    if isinstance(backend, FileBasedCache):
+        with _file_lock(backend._dir, key, timeout) as acquired:
+            yield acquired
+        return
+
+    lock_key = f"lock:{key}"
+    acquired = cache.add(lock_key, 1, timeout)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            cache.delete(lock_key)
+
+
+def get_or_set(key, default, timeout=DEFAULT_TIMEOUT, tags=(), lock_timeout=10, max_wait=2.0, poll_interval=0.05):
+    """
+    Return the cached value for key, computing it with default() on a miss.
+
+    Only one caller recomputes a missing entry (see lock()); concurrent
+    callers wait up to max_wait seconds for that value before computing it
+    themselves.
+    """
+    full_key = _tagged_key(key, tags)
+    value = cache.get(full_key, _MISSING)
+    if value is not _MISSING:
+        return value
+
+    with lock(full_key, lock_timeout) as locked:
+        if locked:
+            # The previous holder may have filled it between our miss and the lock
+            value = cache.get(full_key, _MISSING)
+        else:
+            deadline = time.monotonic() + max_wait
+            while value is _MISSING and time.monotonic() < deadline:
+                time.sleep(poll_interval)
+                value = cache.get(full_key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        value = default() if callable(default) else default
+        cache.set(full_key, value, timeout)
+    return value
+
+
+class LocalLRUCache:
+    """Small thread-safe LRU cache with per-entry expiry, local to the process"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
@@ -0,0 +1,66 @@
+# core/codes.py - Unique random codes (school codes, guardian registration codes, template field keys)
+"""
+Codes are drawn at random from a space large enough that collisions are
+rare, so they are not checked before use:
+
+- save_with_unique_code() inserts directly and only on an IntegrityError
+  (inside a savepoint) checks whether the code was taken, then retries
+  with a new one.
+- reserve_codes() prepares codes for bulk_create: one query drops the
+  candidates already in use.
+"""
+import secrets
+
+from django.db import IntegrityError, transaction
+
+
+HEX_UPPER = '0123456789ABCDEF'
+HEX_LOWER = '0123456789abcdef'
+
+MAX_ATTEMPTS = 5
+
+
+def random_code(length=8, alphabet=HEX_UPPER, prefix=''):
+    return prefix + ''.join(secrets.choice(alphabet) for _ in range(length))
+
+
+def school_code():
+    return random_code(8)
+
+
+def guardian_code():
+    """Registration code given to guardians (typed in the mobile app)"""
+    return random_code(8)
+
+
+def field_key():
+    return random_code(11, HEX_LOWER, prefix='f')
+
+
+def save_with_unique_code(instance, field, generate, save):
+    """
+    Run save() (the model's own save) and retry with a fresh code if the
+    insert failed because instance.<field> is already used.
+    Other integrity errors are raised unchanged.
+    """
+    model = type(instance)
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                return save()
+        except IntegrityError:
+            value = getattr(instance, field)
+            taken = model._default_manager.filter(**{field: value}).exclude(pk=instance.pk).exists()
+            if not taken or attempt == MAX_ATTEMPTS - 1:
+                raise
+            setattr(instance, field, generate())
+
+
+def reserve_codes(model, field, count, generate):
+    """count distinct codes not used in model.<field>, for objects created with bulk_create"""
+    codes = set()
+    while len(codes) < count:
+        candidates = {generate() for _ in range(count - len(codes))} - codes
+        taken = set(model._default_manager.filter(**{f'{field}__in': candidates}).values_list(field, flat=True))
+        codes |= candidates - taken
+    return list(codes)
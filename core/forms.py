@@ -969,11 +969,20 @@ class BulkStudentUploadForm(forms.Form):
         help_text="الفصل الذي سيتم تعيينه للطلاب (اختياري)",
         widget=forms.Select(attrs={'class': 'form-select'})
     )
+    dry_run = forms.BooleanField(
+        label="معاينة قبل الاستيراد",
+        required=False,
+        initial=True,
+        help_text="عرض تقرير بالطلاب والأولياء الجدد والأخطاء دون حفظ أي بيانات",
+    )
 
     def __init__(self, *args, **kwargs):
         school = kwargs.pop('school', None)
         super().__init__(*args, **kwargs)
 
+        self.helper = FormHelper()
+        self.helper.form_tag = False
+
         if school:
             self.fields['grade'].queryset = Grade.objects.filter(
                 school=school, is_active=True
@@ -0,0 +1,517 @@
+# core/importing.py - Bulk student/guardian import from CSV/XLSX sheets
+"""
+An ImportJob reads its sheet row by row and handles it in batches:
+each batch is validated with a handful of set-based queries (existing
+students, matching guardians, classes) and written with bulk_create in one
+transaction together with the job's progress, so an interrupted job resumes
+after its last committed batch.
+
+A dry run goes through the same validation and fills the job report
+(new/existing students, new/matched guardians, row errors) without writing.
+
+Guardians are matched on phone or national ID within the school; their user
+accounts are created when they register with their code, as for guardians
+added from the dashboard.
+
+Jobs uploaded from the dashboard are queued (queue_import) and run by
+`manage.py run_import_worker`, outside the HTTP request; the job page polls
+until the job is done.
+"""
+import csv
+import io
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.codes import reserve_codes, guardian_code
+from core.models import Guardian, Student, StudentIdSequence, GuardianStudent, SchoolClass, SchoolStats, ImportJob
+
+try:
+    from openpyxl import load_workbook
+except ImportError:  # pragma: no cover - optional dependency
+    load_workbook = None
+
+
+IMPORT_BATCH_SIZE = getattr(settings, 'STUDENT_IMPORT_BATCH_SIZE', 500)
+# A running job not saved for this long lost its worker (each batch saves the job)
+IMPORT_STALE_SECONDS = getattr(settings, 'STUDENT_IMPORT_STALE_SECONDS', 600)
+# Entries kept per report list; counts are always complete
+REPORT_SAMPLE_SIZE = 100
+
+# Accepted headers of each column (Arabic labels of the dashboard forms, or field names)
+COLUMNS = {
+    'student_id': ('رقم القيد', 'student_id'),
+    'first_name': ('الاسم الأول', 'الاسم الأول (الطالب)', 'first_name'),
+    'second_name': ('اسم الأب', 'second_name'),
+    'third_name': ('اسم الجد', 'third_name'),
+    'fourth_name': ('اسم جد الأب', 'fourth_name'),
+    'last_name': ('اللقب', 'اللقب (الطالب)', 'last_name'),
+    'sex': ('الجنس', 'sex'),
+    'date_of_birth': ('تاريخ الميلاد', 'date_of_birth'),
+    'place_of_birth': ('مكان الميلاد', 'place_of_birth'),
+    'phone': ('رقم الهاتف', 'phone'),
+    'email': ('البريد الإلكتروني', 'email'),
+    'nid': ('الرقم الوطني', 'nid'),
+    'address': ('عنوان السكن', 'address'),
+    'grade': ('الصف', 'المرحلة الدراسية', 'grade'),
+    'class': ('الفصل', 'class'),
+    'guardian_first_name': ('الاسم الأول (الولي)', 'اسم الولي', 'guardian_first_name'),
+    'guardian_last_name': ('اللقب (الولي)', 'لقب الولي', 'guardian_last_name'),
+    'guardian_phone': ('هاتف الولي', 'guardian_phone'),
+    'guardian_email': ('بريد الولي', 'guardian_email'),
+    'guardian_nid': ('الرقم الوطني (الولي)', 'guardian_nid'),
+    'relationship': ('العلاقة', 'relationship'),
+}
+HEADERS = {alias.strip().lower(): column for column, aliases in COLUMNS.items() for alias in aliases}
+
+SEXES = {'ذكر': 'male', 'male': 'male', 'm': 'male', 'أنثى': 'female', 'انثى': 'female', 'female': 'female', 'f': 'female'}
+RELATIONSHIPS = {
+    **{key: key for key, _ in GuardianStudent.REL_CHOICES},
+    **{label: key for key, label in GuardianStudent.REL_CHOICES},
+}
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%Y/%m/%d')
+
+
+class ImportFileError(Exception):
+    """The sheet can't be read"""
+
+
+# ==========================================
+# READING
+# ==========================================
+
+def _read_csv(file):
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    sample = text.read(4096)
+    text.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    yield from csv.reader(text, dialect)
+
+
+def _read_xlsx(file):
+    if load_workbook is None:
+        raise ImportFileError('قراءة ملفات Excel تتطلب تثبيت openpyxl، يرجى استخدام ملف CSV.')
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def read_sheet(file, name):
+    """Yield (row number, {column: value}) for the data rows of a sheet; row numbers start at 1"""
+    extension = name.lower().rsplit('.', 1)[-1]
+    if extension == 'csv':
+        rows = _read_csv(file)
+    elif extension == 'xlsx':
+        rows = _read_xlsx(file)
+    else:
+        raise ImportFileError('صيغة xls القديمة غير مدعومة، يرجى حفظ الملف بصيغة xlsx أو CSV.')
+
+    header = next(rows, None)
+    if header is None:
+        raise ImportFileError('الملف فارغ.')
+    columns = [HEADERS.get(str(title or '').strip().lower()) for title in header]
+    if 'first_name' not in columns or 'last_name' not in columns:
+        raise ImportFileError('الملف يجب أن يحتوي على عمودي "الاسم الأول" و"اللقب".')
+
+    number = 0
+    for values in rows:
+        if not any(value not in (None, '') for value in values):
+            continue
+        number += 1
+        yield number, {column: value for column, value in zip(columns, values) if column}
+
+
+def _batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# ==========================================
+# VALIDATION
+# ==========================================
+
+def _text(value, max_length=None):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        # Excel stores phone numbers and IDs as numbers
+        value = int(value)
+    value = str(value).strip()
+    if max_length and len(value) > max_length:
+        raise ValidationError(f'يجب ألا يتجاوز {max_length} حرفاً.')
+    return value
+
+
+def _date(value):
+    if value in (None, ''):
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(str(value).strip(), date_format).date()
+        except ValueError:
+            continue
+    raise ValidationError('تاريخ غير صالح.')
+
+
+def _nid(value):
+    value = _text(value)
+    if value and (len(value) != 11 or not value.isdigit()):
+        raise ValidationError('الرقم الوطني يجب أن يتكون من 11 رقماً.')
+    return value
+
+
+def _email(value):
+    value = _text(value)
+    if value:
+        validate_email(value)
+    return value
+
+
+class _Context:
+    """Per-job lookups shared by the batches"""
+
+    def __init__(self, job):
+        self.job = job
+        self.school = job.school
+        self.classes = {}
+        names = {}
+        for school_class in SchoolClass.objects.filter(school=self.school, is_active=True).select_related('grade'):
+            self.classes[(school_class.grade.name, school_class.name)] = school_class
+            names.setdefault(school_class.name, []).append(school_class)
+        # A class name alone is enough when it is unique in the school
+        self.classes_by_name = {name: classes[0] for name, classes in names.items() if len(classes) == 1}
+        # Guardians/students seen earlier in this run (dry runs write nothing to look them up)
+        self.guardian_keys = {}
+        self.student_ids = set()
+        self.student_nids = set()
+
+    def resolve_class(self, grade_name, class_name):
+        if not class_name:
+            return self.job.default_class
+        grade_name = grade_name or (self.job.default_grade.name if self.job.default_grade else '')
+        if grade_name:
+            school_class = self.classes.get((grade_name, class_name))
+        else:
+            school_class = self.classes_by_name.get(class_name)
+        if school_class is None:
+            raise ValidationError(f'الفصل "{class_name}" غير موجود.')
+        return school_class
+
+
+def clean_row(values, context):
+    """Validate one sheet row. Returns (data, errors)."""
+    data = {}
+    errors = {}
+
+    def clean(column, function, *args):
+        try:
+            data[column] = function(values.get(column), *args)
+        except ValidationError as e:
+            errors[column] = e.messages[0]
+
+    clean('student_id', _text, 20)
+    for column in ('first_name', 'second_name', 'third_name', 'fourth_name', 'last_name'):
+        clean(column, _text, 50)
+    clean('place_of_birth', _text, 255)
+    clean('address', _text, 255)
+    clean('phone', _text, 15)
+    clean('email', _email)
+    clean('nid', _nid)
+    clean('date_of_birth', _date)
+    for column in ('guardian_first_name', 'guardian_last_name'):
+        clean(column, _text, 50)
+    clean('guardian_phone', _text, 15)
+    clean('guardian_email', _email)
+    clean('guardian_nid', _nid)
+
+    for column in ('first_name', 'last_name'):
+        if column not in errors and not data[column]:
+            errors[column] = 'هذا الحقل مطلوب.'
+
+    sex = SEXES.get(_text(values.get('sex')).lower())
+    if sex is None:
+        errors['sex'] = 'الجنس يجب أن يكون "ذكر" أو "أنثى".'
+    data['sex'] = sex
+
+    relationship = _text(values.get('relationship'))
+    data['relationship'] = RELATIONSHIPS.get(relationship, 'father' if not relationship else None)
+    if data['relationship'] is None:
+        errors['relationship'] = f'العلاقة "{relationship}" غير معروفة.'
+
+    has_guardian = any(data.get(column) for column in ('guardian_first_name', 'guardian_last_name', 'guardian_phone', 'guardian_nid'))
+    if has_guardian:
+        for column in ('guardian_first_name', 'guardian_last_name'):
+            if column not in errors and not data[column]:
+                errors[column] = 'هذا الحقل مطلوب لإضافة الولي.'
+    data['has_guardian'] = has_guardian
+
+    try:
+        data['current_class'] = context.resolve_class(_text(values.get('grade')), _text(values.get('class')))
+    except ValidationError as e:
+        errors['class'] = e.messages[0]
+
+    return data, errors
+
+
+# ==========================================
+# IMPORT
+# ==========================================
+
+def _sample(report, key, entry):
+    entries = report.setdefault(key, [])
+    if len(entries) < REPORT_SAMPLE_SIZE:
+        entries.append(entry)
+
+
+def _find_guardian(guardians, data):
+    """Guardian of a row in a {national ID or phone: guardian} mapping"""
+    return guardians.get(data['guardian_nid']) or guardians.get(data['guardian_phone'])
+
+
+def _process_batch(job, batch, context):
+    """Validate a batch and (unless dry run) write it; updates job counters and report in memory"""
+    school = context.school
+    rows = []
+    for number, values in batch:
+        data, errors = clean_row(values, context)
+        if errors:
+            job.skipped_rows += 1
+            if len(job.errors) < REPORT_SAMPLE_SIZE:
+                job.errors.append({'row': number, 'errors': errors})
+            continue
+        rows.append((number, data))
+
+    # Students already in the school (by student ID or national ID) are skipped
+    student_ids = {data['student_id'] for _, data in rows if data['student_id']}
+    nids = {data['nid'] for _, data in rows if data['nid']}
+    existing = Student.objects.filter(school=school).filter(Q(student_id__in=student_ids) | Q(nid__in=nids))
+    existing_ids = set()
+    existing_nids = set()
+    for student_id, nid in existing.values_list('student_id', 'nid'):
+        existing_ids.add(student_id)
+        existing_nids.add(nid)
+
+    # Guardians already in the school, matched on national ID or phone
+    guardian_nids = {data['guardian_nid'] for _, data in rows if data['guardian_nid']}
+    guardian_phones = {data['guardian_phone'] for _, data in rows if data['guardian_phone']}
+    known_guardians = {}
+    if guardian_nids or guardian_phones:
+        for guardian in Guardian.objects.filter(school=school).filter(Q(nid__in=guardian_nids) | Q(phone__in=guardian_phones)):
+            if guardian.phone:
+                known_guardians.setdefault(guardian.phone, guardian)
+            if guardian.nid:
+                known_guardians.setdefault(guardian.nid, guardian)
+
+    new_students = []
+    new_guardians = []
+    # New guardians of this batch by national ID and by phone
+    new_guardian_keys = {}
+    links = []  # (student, guardian key or Guardian, relationship)
+    for number, data in rows:
+        name = ' '.join(filter(None, (data['first_name'], data['last_name'])))
+        if (data['student_id'] and (data['student_id'] in existing_ids or data['student_id'] in context.student_ids)) \
+                or (data['nid'] and (data['nid'] in existing_nids or data['nid'] in context.student_nids)):
+            job.skipped_rows += 1
+            _sample(job.report, 'existing_students', {'row': number, 'name': name, 'student_id': data['student_id']})
+            continue
+        if data['student_id']:
+            context.student_ids.add(data['student_id'])
+        if data['nid']:
+            context.student_nids.add(data['nid'])
+
+        student = Student(
+            school=school,
+            student_id=data['student_id'],
+            first_name=data['first_name'],
+            second_name=data['second_name'] or None,
+            third_name=data['third_name'] or None,
+            fourth_name=data['fourth_name'] or None,
+            last_name=data['last_name'],
+            sex=data['sex'],
+            date_of_birth=data['date_of_birth'],
+            place_of_birth=data['place_of_birth'] or None,
+            phone=data['phone'] or None,
+            email=data['email'] or None,
+            nid=data['nid'] or None,
+            address=data['address'] or None,
+            current_class=data['current_class'],
+        )
+        student.full_name = student.compose_full_name()
+        new_students.append(student)
+        _sample(job.report, 'new_students', {'row': number, 'name': name, 'student_id': data['student_id']})
+
+        if not data['has_guardian']:
+            continue
+        guardian_name = f"{data['guardian_first_name']} {data['guardian_last_name']}"
+        guardian = (
+            _find_guardian(known_guardians, data)
+            or _find_guardian(new_guardian_keys, data)
+            or _find_guardian(context.guardian_keys, data)
+        )
+        if guardian is None:
+            guardian = Guardian(
+                school=school,
+                first_name=data['guardian_first_name'],
+                last_name=data['guardian_last_name'],
+                phone=data['guardian_phone'] or None,
+                email=data['guardian_email'] or None,
+                nid=data['guardian_nid'] or None,
+            )
+            new_guardians.append(guardian)
+            for key in (guardian.nid, guardian.phone):
+                if key:
+                    new_guardian_keys.setdefault(key, guardian)
+            _sample(job.report, 'new_guardians', {'row': number, 'name': guardian_name})
+        else:
+            _sample(job.report, 'matched_guardians', {'row': number, 'name': guardian_name})
+        links.append((student, guardian, data['relationship']))
+
+    job.created_students += len(new_students)
+    job.created_guardians += len(new_guardians)
+    if job.dry_run:
+        for key, guardian in new_guardian_keys.items():
+            context.guardian_keys.setdefault(key, guardian)
+        return
+
+    # Preallocated IDs for students without one
+    StudentIdSequence.advance_past(school, student_ids)
+    missing = [student for student in new_students if not student.student_id]
+    if missing:
+        for student, student_id in zip(missing, Student.reserve_student_ids(school, len(missing))):
+            student.student_id = student_id
+
+    codes = reserve_codes(Guardian, 'code', len(new_guardians), guardian_code)
+    for guardian, code in zip(new_guardians, codes):
+        guardian.code = code
+    Guardian.objects.bulk_create(new_guardians)
+    Student.objects.bulk_create(new_students)
+
+    primary = set()
+    relations = []
+    selected = []
+    for student, guardian, relationship in links:
+        relations.append(GuardianStudent(
+            guardian=guardian,
+            student=student,
+            relationship=relationship,
+            is_primary=student.pk not in primary,
+        ))
+        primary.add(student.pk)
+        if guardian.selected_student_id is None:
+            guardian.selected_student = student
+            selected.append(guardian)
+    GuardianStudent.objects.bulk_create(relations, ignore_conflicts=True)
+    Guardian.objects.bulk_update(selected, ['selected_student'])
+
+    # bulk_create skips the signals that maintain the dashboard counters
+    SchoolStats.increment(school.pk, students=len(new_students), guardians=len(new_guardians))
+
+
+def _reset(job):
+    job.processed_rows = 0
+    job.created_students = 0
+    job.created_guardians = 0
+    job.skipped_rows = 0
+    job.report = {}
+    job.errors = []
+
+
+def run_import(job, batch_size=None):
+    """
+    Run (or resume) an import job. Dry runs always start over.
+    Raises ImportFileError if the sheet can't be read; other errors mark the job failed and propagate.
+    """
+    if job.dry_run:
+        _reset(job)
+    job.status = ImportJob.STATUS_RUNNING
+    job.last_error = ''
+    job.save()
+
+    context = _Context(job)
+    try:
+        with job.file.open('rb') as file:
+            rows = (row for row in read_sheet(file, job.file_name) if row[0] > job.processed_rows)
+            for batch in _batched(rows, batch_size or IMPORT_BATCH_SIZE):
+                with transaction.atomic():
+                    _process_batch(job, batch, context)
+                    job.processed_rows = batch[-1][0]
+                    job.save()
+    except Exception as e:
+        job.status = ImportJob.STATUS_FAILED
+        job.last_error = str(e)
+        job.save(update_fields=['status', 'last_error', 'updated_at'])
+        raise
+
+    if not job.dry_run:
+        SchoolStats.refresh_grade_breakdown(job.school_id)
+    job.status = ImportJob.STATUS_COMPLETED
+    job.finished_at = timezone.now()
+    job.save()
+    return job
+
+
+def confirm_import(job, batch_size=None):
+    """Run a previewed (dry run) job for real"""
+    _reset(job)
+    job.dry_run = False
+    return run_import(job, batch_size=batch_size)
+
+
+# ==========================================
+# QUEUE
+# ==========================================
+
+def queue_import(job, confirm=False):
+    """
+    Queue a job for run_import_worker: a new upload, a failed job to resume
+    or, with confirm, a previewed job to run for real.
+    """
+    if confirm:
+        _reset(job)
+        job.dry_run = False
+    job.status = ImportJob.STATUS_PENDING
+    job.last_error = ''
+    job.save()
+    return job
+
+
+def fail_stale_imports(now=None):
+    """Mark FAILED the running jobs whose worker stopped; they can be resumed. Returns the number of jobs."""
+    now = now or timezone.now()
+    return ImportJob.objects.filter(
+        status=ImportJob.STATUS_RUNNING, updated_at__lt=now - timedelta(seconds=IMPORT_STALE_SECONDS)
+    ).update(status=ImportJob.STATUS_FAILED, last_error='توقف الاستيراد قبل اكتماله، يمكنك استئنافه.', updated_at=now)
+
+
+def claim_import_job():
+    """
+    Take the oldest queued job, or None.
+    The job is taken with a conditional UPDATE, so concurrent workers never run the same job.
+    """
+    fail_stale_imports()
+    for pk in ImportJob.objects.filter(status=ImportJob.STATUS_PENDING).order_by('created_at').values_list('pk', flat=True)[:10]:
+        if ImportJob.objects.filter(pk=pk, status=ImportJob.STATUS_PENDING).update(
+            status=ImportJob.STATUS_RUNNING, updated_at=timezone.now()
+        ):
+            return ImportJob.objects.select_related('school', 'default_grade', 'default_class').get(pk=pk)
+    return None
@@ -0,0 +1,264 @@
+"""
+Management command benchmarking the hot API and dashboard pages
+
+Usage:
+    python manage.py benchmark --save
+    python manage.py benchmark
+    python manage.py benchmark --students 5000 --repeat 50 --threshold 0.3
+    python manage.py benchmark --existing --output results.json
+
+Generates a seeded dataset (generate_fake_data: one school, --students
+students with their guardians, timelines and --periods survey periods)
+inside a transaction that is rolled back at the end, then requests each
+page with the Django test client: a guardian for the mobile endpoints, the
+school's dashboard user for the employee endpoints and dashboard pages.
+
+Per page it records latency percentiles over --repeat runs, the query count
+and the peak memory allocated during one request (tracemalloc, measured on
+a separate run so it doesn't slow the timings).
+
+--save writes the results to the baseline file (--baseline, default
+benchmark_baseline.json next to manage.py). Without it the results are
+compared to the baseline and the command fails when a page got slower or
+bigger than --threshold (p95 and peak memory, relative) or runs more
+queries. Baselines only compare on the same machine and database.
+Timings include QueryInspectionMiddleware when it is enabled
+(QUERY_INSPECTION=1); leave it off for production-like numbers.
+"""
+
+import gc
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+from io import StringIO
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from rest_framework.authtoken.models import Token
+
+from core.models import School, Guardian
+from core.queries import QueryRecorder
+from core.tenancy import invalidate_school_context
+
+
+User = get_user_model()
+
+# (label, url, client): 'guardian' uses the guardian's token, 'employee' the
+# dashboard user's token, 'dashboard' the dashboard user's session
+PAGES = [
+    ('api/timeline', '/api/timeline/', 'guardian'),
+    ('api/distributions/pending', '/api/distributions/pending/', 'guardian'),
+    ('api/surveys', '/api/surveys/', 'guardian'),
+    ('api/employee/students', '/api/employee/students/', 'employee'),
+    ('dashboard', '/dashboard/', 'dashboard'),
+    ('dashboard/students', '/dashboard/students/', 'dashboard'),
+]
+
+# Timings below this are noise: a p95 regression must also exceed it in ms
+NOISE_FLOOR_MS = 1.0
+
+
+class Rollback(Exception):
+    pass
+
+
+def percentile(timings, fraction):
+    """Nearest-rank percentile of sorted timings"""
+    return timings[min(len(timings) - 1, int(len(timings) * fraction))]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the hot API and dashboard pages against a JSON baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=2000, help='Students to generate (default: 2000)')
+        parser.add_argument('--periods', type=int, default=3, help='Survey periods (default: 3)')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed (default: 1)')
+        parser.add_argument('--repeat', type=int, default=30, help='Timed runs per page (default: 30)')
+        parser.add_argument('--warmup', type=int, default=3, help='Untimed runs per page (default: 3)')
+        parser.add_argument(
+            '--baseline', default=str(Path(settings.BASE_DIR) / 'benchmark_baseline.json'),
+            help='Baseline file (default: benchmark_baseline.json)'
+        )
+        parser.add_argument('--save', action='store_true', help='Write the results as the new baseline')
+        parser.add_argument('--output', help='Also write the results to this file')
+        parser.add_argument(
+            '--threshold', type=float, default=0.25,
+            help='Allowed relative increase of p95 and peak memory (default: 0.25)'
+        )
+        parser.add_argument('--existing', action='store_true', help='Use the current data instead of generating')
+
+    def handle(self, *args, **options):
+        if options['existing']:
+            results = self.run(self.existing_sample(), options)
+        else:
+            try:
+                with transaction.atomic():
+                    started = time.perf_counter()
+                    sample = self.generate(options)
+                    self.stdout.write(f'Generated dataset in {time.perf_counter() - started:.1f}s')
+                    results = self.run(sample, options)
+                    raise Rollback
+            except Rollback:
+                # The school context of the rolled back users may be cached
+                invalidate_school_context(sample['guardian'].pk, sample['employee'].pk)
+                self.stdout.write('Dataset rolled back')
+
+        report = {'environment': self.environment(options), 'pages': results}
+        if options['output']:
+            self.write(options['output'], report)
+        if options['save']:
+            self.write(options['baseline'], report)
+            self.stdout.write(self.style.SUCCESS(f'Baseline saved to {options["baseline"]}'))
+            return
+        self.compare(report, options)
+
+    # Dataset
+
+    def generate(self, options):
+        call_command(
+            'generate_fake_data', schools=1, students=options['students'], periods=options['periods'],
+            seed=options['seed'], workers=1, stdout=StringIO(),
+        )
+        school = School.objects.latest('pk')
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        return self.sample(school)
+
+    def existing_sample(self):
+        school = School.objects.filter(employees__isnull=False, guardians__user__isnull=False).first()
+        if school is None:
+            raise CommandError('No school with an employee and a guardian account')
+        return self.sample(school)
+
+    def sample(self, school):
+        guardian = (
+            Guardian.objects.filter(school=school, user__isnull=False, selected_student__isnull=False)
+            .select_related('user').order_by('pk').first()
+        )
+        employee = User.objects.filter(employee_profile__school=school).order_by('pk').first()
+        if guardian is None or employee is None:
+            raise CommandError(f'School {school.code} has no guardian or employee account')
+        return {'school': school, 'guardian': guardian.user, 'employee': employee}
+
+    def clients(self, sample):
+        guardian_token, _ = Token.objects.get_or_create(user=sample['guardian'])
+        employee_token, _ = Token.objects.get_or_create(user=sample['employee'])
+        dashboard = Client()
+        dashboard.force_login(sample['employee'])
+        return {
+            'guardian': Client(HTTP_AUTHORIZATION=f'Token {guardian_token.key}'),
+            'employee': Client(HTTP_AUTHORIZATION=f'Token {employee_token.key}'),
+            'dashboard': dashboard,
+        }
+
+    # Measurements
+
+    def run(self, sample, options):
+        clients = self.clients(sample)
+        results = {}
+        for label, url, client_name in PAGES:
+            client = clients[client_name]
+            for _ in range(options['warmup']):
+                self.get(client, url)
+
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                self.get(client, url)
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+
+            gc.collect()
+            tracemalloc.start()
+            try:
+                with QueryRecorder(with_origin=False) as recorder:
+                    self.get(client, url)
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+
+            results[label] = {
+                'url': url,
+                'p50_ms': round(statistics.median(timings), 2),
+                'p90_ms': round(percentile(timings, 0.90), 2),
+                'p95_ms': round(percentile(timings, 0.95), 2),
+                'p99_ms': round(percentile(timings, 0.99), 2),
+                'max_ms': round(timings[-1], 2),
+                'queries': recorder.count,
+                'peak_kb': round(peak / 1024, 1),
+            }
+            self.stdout.write(
+                f'{label:<28} p50 {results[label]["p50_ms"]:>8.2f} ms  p95 {results[label]["p95_ms"]:>8.2f} ms  '
+                f'{recorder.count:>3} queries  {results[label]["peak_kb"]:>9.1f} KiB'
+            )
+        return results
+
+    def get(self, client, url):
+        response = client.get(url)
+        if response.status_code != 200:
+            raise CommandError(f'GET {url} returned {response.status_code}')
+        return response
+
+    def environment(self, options):
+        return {
+            'students': options['students'],
+            'periods': options['periods'],
+            'seed': options['seed'],
+            'repeat': options['repeat'],
+            'existing': options['existing'],
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'machine': platform.node(),
+        }
+
+    # Baseline
+
+    def write(self, path, report):
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+            f.write('\n')
+
+    def compare(self, report, options):
+        path = options['baseline']
+        if not Path(path).exists():
+            raise CommandError(f'No baseline at {path}, run with --save first')
+        with open(path) as f:
+            baseline = json.load(f)
+
+        changed = [
+            key for key in ('students', 'periods', 'seed', 'database')
+            if baseline['environment'].get(key) != report['environment'][key]
+        ]
+        if changed:
+            self.stdout.write(self.style.WARNING(f'Baseline was recorded with other {", ".join(changed)}'))
+
+        threshold = options['threshold']
+        regressions = []
+        for label, current in report['pages'].items():
+            previous = baseline['pages'].get(label)
+            if previous is None:
+                continue
+            if (current['p95_ms'] > previous['p95_ms'] * (1 + threshold)
+                    and current['p95_ms'] - previous['p95_ms'] > NOISE_FLOOR_MS):
+                regressions.append(f'{label}: p95 {previous["p95_ms"]} -> {current["p95_ms"]} ms')
+            if current['queries'] > previous['queries']:
+                regressions.append(f'{label}: queries {previous["queries"]} -> {current["queries"]}')
+            if current['peak_kb'] > previous['peak_kb'] * (1 + threshold):
+                regressions.append(f'{label}: peak memory {previous["peak_kb"]} -> {current["peak_kb"]} KiB')
+
+        if regressions:
+            for regression in regressions:
+                self.stdout.write(self.style.ERROR(f'  {regression}'))
+            raise CommandError(f'{len(regressions)} regressions over the baseline ({threshold:.0%} threshold)')
+        self.stdout.write(self.style.SUCCESS(f'No regressions over the baseline ({threshold:.0%} threshold)'))
@@ -0,0 +1,180 @@
+"""
+Management command printing the plans and timings of the hot API queries
+
+Usage:
+    python manage.py explain_hot_queries
+    python manage.py explain_hot_queries --students 5000 --repeat 50
+    python manage.py explain_hot_queries --existing
+
+Generates a dataset (one school, students with a guardian each, timeline
+posts, survey periods with distributions and responses) inside a
+transaction that is rolled back at the end, then runs the query shapes of
+the mobile API endpoints and prints EXPLAIN output and median/p95 timings.
+Use --existing to run against the current data instead (the first school
+with students).
+"""
+
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import OuterRef, Q, Subquery
+from django.utils import timezone
+
+from core.codes import school_code
+from core.models import School, Student, Guardian, GuardianStudent, StudentTimeline
+from survey.models import Template, SurveyPeriod, SurveyDistribution, Response
+
+
+User = get_user_model()
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Print EXPLAIN plans and timings of the hot API queries on a generated dataset'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=1000, help='Students to generate (default: 1000)')
+        parser.add_argument('--posts', type=int, default=10, help='Timeline posts per student (default: 10)')
+        parser.add_argument('--periods', type=int, default=10, help='Survey periods (default: 10)')
+        parser.add_argument('--repeat', type=int, default=20, help='Runs per query for the timings (default: 20)')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed (default: 1)')
+        parser.add_argument('--analyze', action='store_true', help='EXPLAIN ANALYZE (PostgreSQL)')
+        parser.add_argument('--existing', action='store_true', help='Use the current data instead of generating')
+
+    def handle(self, *args, **options):
+        if options['existing']:
+            self.run(self.existing_sample(), options)
+            return
+
+        try:
+            with transaction.atomic():
+                started = time.perf_counter()
+                sample = self.generate(options, random.Random(options['seed']))
+                self.stdout.write(f'Generated dataset in {time.perf_counter() - started:.1f}s')
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+                self.run(sample, options)
+                raise Rollback
+        except Rollback:
+            self.stdout.write('Dataset rolled back')
+
+    # Dataset
+
+    def generate(self, options, rng):
+        now = timezone.now()
+        school = School.objects.create(name='benchmark', code=school_code())
+        count = options['students']
+
+        users = User.objects.bulk_create([
+            User(username=f'bench-{school.code}-{index}', password='!') for index in range(count)
+        ], batch_size=1000)
+        guardians = Guardian.objects.bulk_create([
+            Guardian(school=school, first_name='ولي', last_name=str(index), user=user)
+            for index, user in enumerate(users)
+        ], batch_size=1000)
+
+        students = []
+        for index in range(count):
+            student = Student(
+                school=school, student_id=f'B{index:07d}', first_name=f'طالب {index}',
+                last_name=rng.choice(['علي', 'محمد', 'سالم', 'عمر']), sex=rng.choice(['male', 'female']),
+                is_active=rng.random() < 0.9,
+            )
+            student.full_name = student.compose_full_name()
+            students.append(student)
+        students = Student.objects.bulk_create(students, batch_size=1000)
+        GuardianStudent.objects.bulk_create([
+            GuardianStudent(guardian=guardian, student=student, relationship='father', is_primary=True)
+            for guardian, student in zip(guardians, students)
+        ], batch_size=1000)
+
+        posts = [
+            StudentTimeline(
+                student=student, title='منشور', note='...', is_pinned=rng.random() < 0.05,
+                is_visible_to_guardian=rng.random() < 0.8,
+            )
+            for student in students for _ in range(options['posts'])
+        ]
+        StudentTimeline.objects.bulk_create(posts, batch_size=2000)
+
+        template = Template.objects.create(name='benchmark', type=Template.FOOD, school=school)
+        for number in range(options['periods']):
+            start = (now - timedelta(days=30 * (options['periods'] - number))).date()
+            period = SurveyPeriod.objects.create(
+                survey=template, school=school, start_date=start, end_date=start + timedelta(days=30),
+                is_active=number == options['periods'] - 1,
+            )
+            current = number == options['periods'] - 1
+            answered = [rng.random() < (0.4 if current else 0.8) for _ in students]
+            responses = Response.objects.bulk_create([
+                Response(template=template, user=guardian.user, guardian=guardian, student=student)
+                for guardian, student, done in zip(guardians, students, answered) if done
+            ], batch_size=1000)
+            responses = iter(responses)
+            SurveyDistribution.objects.bulk_create([
+                SurveyDistribution(
+                    period=period, survey=template, user=guardian.user, student=student, school=school,
+                    is_completed=done, response=next(responses) if done else None,
+                )
+                for guardian, student, done in zip(guardians, students, answered)
+            ], batch_size=1000)
+
+        guardian = guardians[rng.randrange(count)]
+        return {'school': school, 'guardian': guardian, 'student': guardian.students.first(), 'user': guardian.user}
+
+    def existing_sample(self):
+        link = GuardianStudent.objects.select_related('guardian', 'student').filter(guardian__user__isnull=False).first()
+        if link is None:
+            raise CommandError('No guardian with a user account and a student')
+        guardian = link.guardian
+        return {'school': guardian.school, 'guardian': guardian, 'student': link.student, 'user': guardian.user}
+
+    # Queries (same shapes as the API views)
+
+    def queries(self, sample):
+        school, guardian, student, user = sample['school'], sample['guardian'], sample['student'], sample['user']
+        today = timezone.now().date()
+        return [
+            ('distributions/pending', SurveyDistribution.objects
+                .filter(user=user, is_completed=False)
+                .exclude(period__end_date__lt=today)
+                .order_by('-sent_at')[:30]),
+            ('templates (last response)', Template.objects
+                .filter(Q(school=school) | Q(school__isnull=True))
+                .annotate(last_response_at=Subquery(
+                    Response.objects
+                    .filter(template=OuterRef('pk'), guardian=guardian, student=student)
+                    .order_by('-created_at')
+                    .values('created_at')[:1]
+                ))),
+            ('timeline (guardian feed)', StudentTimeline.objects
+                .filter(student=student, is_visible_to_guardian=True)
+                .order_by('-is_pinned', '-created_at')[:30]),
+            ('employee/students', Student.objects
+                .filter(school=school, is_active=True)
+                .order_by('full_name')[:30]),
+        ]
+
+    def run(self, sample, options):
+        explain = {'analyze': True} if options['analyze'] and connection.vendor == 'postgresql' else {}
+        for label, queryset in self.queries(sample):
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+
+            self.stdout.write(self.style.MIGRATE_HEADING(f'\n{label}'))
+            self.stdout.write(f'  median {statistics.median(timings):.2f} ms, p95 {p95:.2f} ms')
+            for line in queryset.explain(**explain).splitlines():
+                self.stdout.write(f'  {line}')
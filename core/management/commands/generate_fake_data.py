@@ -1,21 +1,111 @@
 # core/management/commands/generate_fake_data.py
+"""
+Generate fake Arabic school data (development and load testing)
+
+Usage:
+    python manage.py generate_fake_data
+    python manage.py generate_fake_data --schools 10 --students 10000 --workers 4 --seed 7
+    python manage.py generate_fake_data --schools 2 --students 500 --periods 6
+
+Rows are written with bulk_create, --batch-size at a time, and every account
+shares one pre-hashed password (Test@123), so 100k students take minutes.
+Each school is generated in its own transaction from its own random
+generator (seed + school number): the same --seed gives the same data
+whatever --workers is (registration codes excepted, they are always random).
+--workers generates schools in parallel threads, on databases that allow
+concurrent writers (not SQLite).
+--periods adds a monthly guardian survey with that many periods, a
+distribution for every guardian/student link and responses for
+--response-rate of them.
+"""
 import random
-import uuid
-from datetime import datetime, date, timedelta
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
 from decimal import Decimal
-from django.core.management.base import BaseCommand, CommandError
+
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
 from django.utils import timezone
-from django.db import transaction
 
+from accounts.models import TeacherProfile, EmployeeProfile
+from core.codes import HEX_UPPER, guardian_code, reserve_codes
 from core.models import (
     School, AcademicYear, Grade, SchoolClass, Guardian, Student,
-    GuardianStudent, StudentTimeline, StudentTimelineAttachment
+    GuardianStudent, StudentTimeline, SchoolStats
 )
-from accounts.models import TeacherProfile, EmployeeProfile
+from survey.analytics import rebuild_period_results
+from survey.models import Template, TemplateField, SurveyPeriod, SurveyDistribution, Response
 
 User = get_user_model()
 
+PASSWORD = 'Test@123'
+
+SCHOOL_NAMES = [
+    'مدرسة النور الأساسية', 'مدرسة الفجر الثانوية', 'مدرسة الأمل الابتدائية', 'مدرسة المستقبل المختلطة',
+    'مدرسة التميز الأساسية', 'مدرسة النجاح الثانوية', 'مدرسة العلم والمعرفة', 'مدرسة الرسالة التربوية',
+]
+PRINCIPAL_NAMES = [
+    'أحمد محمد بن علي', 'فاطمة الزهراء بن صالح', 'محمد الأمين بن يوسف',
+    'نورا حسن بن عبدالله', 'سالم عبدالرحمن بن مبروك', 'مريم خالد بن حسين',
+]
+MALE_NAMES = [
+    'محمد', 'أحمد', 'علي', 'حسن', 'يوسف', 'عمر', 'إبراهيم',
+    'سعيد', 'كريم', 'خالد', 'أمين', 'ياسين', 'طارق', 'منير', 'رضا',
+]
+FEMALE_NAMES = [
+    'فاطمة', 'سارة', 'مريم', 'نور', 'ليلى', 'هند', 'آمال', 'رانيا',
+    'زينب', 'سلمى', 'أميرة', 'خديجة', 'منى', 'نادية', 'سمية', 'عائشة',
+]
+FAMILY_NAMES = [
+    'بن علي', 'بن صالح', 'بن محمد', 'بن يوسف', 'بن حسن', 'بن عمر',
+    'بن إبراهيم', 'بن عبدالله', 'بن مبروك', 'بن حسين', 'بن الطاهر', 'بن عيسى',
+    'بن سعيد', 'بن خليفة', 'بن رشيد', 'بن منصور', 'بن كريم', 'بن حمدي',
+]
+CITIES = ['تونس', 'صفاقس', 'سوسة', 'القيروان', 'بنزرت', 'قابس']
+DISTRICTS = ['المنار', 'الخضراء', 'النصر', 'السعادة']
+SUBJECTS = [
+    'اللغة العربية', 'الرياضيات', 'العلوم', 'التربية الإسلامية',
+    'التاريخ', 'الجغرافيا', 'اللغة الإنجليزية', 'الفيزياء',
+    'الكيمياء', 'الأحياء', 'التربية البدنية', 'الحاسوب',
+]
+QUALIFICATIONS = ['بكالوريوس تربوي', 'ماجستير في التخصص', 'دبلوم عالي', 'بكالوريوس + دبلوم تربوي', 'ماجستير تربوي']
+GRADES = [
+    # Primary (6 grades)
+    ('السنة الأولى ابتدائي', 1, 'primary'),
+    ('السنة الثانية ابتدائي', 2, 'primary'),
+    ('السنة الثالثة ابتدائي', 3, 'primary'),
+    ('السنة الرابعة ابتدائي', 4, 'primary'),
+    ('السنة الخامسة ابتدائي', 5, 'primary'),
+    ('السنة السادسة ابتدائي', 6, 'primary'),
+    # Middle (3 grades)
+    ('السنة السابعة إعدادي', 7, 'middle'),
+    ('السنة الثامنة إعدادي', 8, 'middle'),
+    ('السنة التاسعة إعدادي', 9, 'middle'),
+    # Secondary (3 grades)
+    ('السنة الأولى ثانوي', 10, 'secondary'),
+    ('السنة الثانية ثانوي', 11, 'secondary'),
+    ('السنة الثالثة ثانوي', 12, 'secondary'),
+]
+CLASS_NAMES = ['أ', 'ب', 'ج', 'د']
+EMPLOYEES = [
+    ('admin', 'سليمان', 'بن رشيد'), ('accountant', 'منصف', 'بن عيسى'), ('librarian', 'بدر', 'بن مبروك'),
+    ('nurse', 'هناء', 'بن صالح'), ('security', 'أمل', 'بن القاسم'),
+]
+TIMELINE_CONTENT = [
+    ('تحسن في الدرجات', 'أظهر الطالب تحسناً ملحوظاً في مادة الرياضيات', 'academic'),
+    ('سلوك إيجابي', 'تطوع الطالب لمساعدة زملائه في الفصل', 'behavior'),
+    ('إنجاز رياضي', 'حصل على المركز الأول في مسابقة الجري', 'achievement'),
+    ('ملاحظة صحية', 'يحتاج إلى متابعة طبية لضعف في النظر', 'health'),
+    ('حضور ممتاز', 'حافظ على الحضور المنتظم طوال الشهر', 'attendance'),
+]
+SURVEY_CHOICES = ['ممتاز', 'جيد', 'مقبول', 'ضعيف']
+
+# Guardians per student: a father always, a mother 70% of the time
+MAX_GUARDIANS_PER_STUDENT = 2
+
 
 class Command(BaseCommand):
     help = 'Generate fake Arabic data for testing school management system'
@@ -33,6 +123,26 @@ class Command(BaseCommand):
             '--teachers', type=int, default=15,
             help='Number of teachers per school (default: 15)'
         )
+        parser.add_argument(
+            '--periods', type=int, default=0,
+            help='Survey periods per school, with distributions and responses (default: 0, no survey)'
+        )
+        parser.add_argument(
+            '--response-rate', type=float, default=0.7,
+            help='Share of distributions answered in past periods (default: 0.7)'
+        )
+        parser.add_argument(
+            '--seed', type=int, default=1,
+            help='Random seed (default: 1)'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Schools generated in parallel (default: 1; forced to 1 on SQLite)'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=2000,
+            help='Rows per INSERT (default: 2000)'
+        )
         parser.add_argument(
             '--clear', action='store_true',
             help='Clear existing data before generating new data'
@@ -54,49 +164,90 @@ class Command(BaseCommand):
             self.stdout.write(self.style.SUCCESS('Data cleared successfully'))
 
         self.stdout.write('Generating fake Arabic school data...')
+        started = time.perf_counter()
+
+        # Hashing is deliberately slow: hash once, share the hash
+        password = make_password(PASSWORD)
+        self.create_super_user(password)
+
+        workers = options['workers']
+        if workers > 1 and connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING('SQLite allows one writer at a time, using --workers 1'))
+            workers = 1
+
+        # Registration codes are reserved up front so parallel schools can't draw the same one
+        per_school = options['students'] * MAX_GUARDIANS_PER_STUDENT
+        codes = self.reserve_guardian_codes(options['schools'] * per_school, options['batch_size'])
+        jobs = [
+            (number, codes[(number - 1) * per_school:number * per_school])
+            for number in range(1, options['schools'] + 1)
+        ]
 
-        with transaction.atomic():
-            # Create superuser
-            self.create_super_user()
-
-            # Generate data for each school
-            for i in range(options['schools']):
-                school = self.create_school(i + 1)
-                self.stdout.write(f'Created school: {school.name}')
-
-                # Create academic years
-                academic_years = self.create_academic_years(school)
-                current_year = academic_years[0]  # First one is current
-
-                # Create grades and classes
-                grades = self.create_grades(school)
-                classes = self.create_classes(school, grades, current_year)
-
-                # Create dashboard user for this school
-                dashboard_user = self.create_dashboard_user(school)
-
-                # Create teachers and employees
-                teachers = self.create_teachers(school, options['teachers'])
-                employees = self.create_employees(school)
-
-                # Assign class teachers
-                self.assign_class_teachers(classes, teachers)
-
-                # Create students and guardians
-                self.create_students_and_guardians(school, classes, options['students'])
-
-                self.stdout.write(
-                    self.style.SUCCESS(f'✓ School "{school.name}" setup complete')
-                )
-                self.stdout.write(f'  Dashboard: {dashboard_user.username} / Test@123')
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                summaries = list(executor.map(lambda job: self.generate_school_in_thread(*job, options, password), jobs))
+        else:
+            summaries = [self.generate_school(*job, options, password) for job in jobs]
+
+        for summary in summaries:
+            self.stdout.write(self.style.SUCCESS(f'✓ School "{summary["school"].name}" setup complete'))
+            self.stdout.write(
+                f'  {summary["students"]} students, {summary["guardians"]} guardians, '
+                f'{summary["timeline"]} timeline entries, {summary["distributions"]} distributions '
+                f'in {summary["seconds"]:.1f}s'
+            )
+            self.stdout.write(f'  Dashboard: {summary["dashboard"].username} / {PASSWORD}')
 
         self.stdout.write(
-            self.style.SUCCESS('🎉 Fake data generation completed successfully!')
+            self.style.SUCCESS(f'🎉 Fake data generation completed in {time.perf_counter() - started:.1f}s')
         )
         self.stdout.write('Login credentials:')
-        self.stdout.write('• Super Admin - Username: admin, Password: Test@123')
+        self.stdout.write(f'• Super Admin - Username: admin, Password: {PASSWORD}')
+
+    def reserve_guardian_codes(self, count, batch_size):
+        codes = set()
+        while len(codes) < count:
+            codes.update(reserve_codes(Guardian, 'code', min(batch_size, count - len(codes)), guardian_code))
+        return list(codes)
+
+    def generate_school_in_thread(self, number, codes, options, password):
+        try:
+            return self.generate_school(number, codes, options, password)
+        finally:
+            # Each thread has its own connection
+            connection.close()
+
+    def generate_school(self, number, codes, options, password):
+        started = time.perf_counter()
+        rng = random.Random(f'{options["seed"]}-{number}')
+        batch_size = options['batch_size']
+
+        with transaction.atomic():
+            school = self.create_school(number, rng)
+            current_year = self.create_academic_years(school)[0]
+            grades = self.create_grades(school)
+            classes = self.create_classes(school, grades, current_year, rng)
+
+            dashboard_user = self.create_dashboard_user(school, password, rng)
+            teachers = self.create_teachers(school, options['teachers'], password, rng)
+            self.create_employees(school, password, rng)
+            self.assign_class_teachers(classes, teachers, rng)
+
+            counts, links = self.create_students_and_guardians(
+                school, classes, options['students'], codes, password, rng, batch_size
+            )
+            counts['distributions'] = 0
+            if options['periods']:
+                counts['distributions'] = self.create_survey(
+                    school, links, options['periods'], options['response_rate'], rng, batch_size
+                )
+
+            # bulk_create skips the signals that maintain the dashboard counters
+            SchoolStats.rebuild(school)
 
-    def create_super_user(self):
+        return dict(counts, school=school, dashboard=dashboard_user, seconds=time.perf_counter() - started)
+
+    def create_super_user(self, password):
         """Create super admin user"""
         admin, created = User.objects.get_or_create(
             username='admin',
@@ -109,469 +260,338 @@ class Command(BaseCommand):
                 'user_type': User.ADMIN,
                 'is_active': True,
                 'language': 'ar',
+                'password': password,
             }
         )
         if created:
-            admin.set_password('Test@123')
-            admin.save()
             self.stdout.write('✓ Super admin user created')
 
-    def create_dashboard_user(self, school):
-        """Create dashboard user as employee for specific school"""
-        username = f'dashboard_{school.code.lower()}'
-
-        user, created = User.objects.get_or_create(
-            username=username,
-            defaults={
-                'email': f'dashboard@{school.code.lower()}.edu.tn',
-                'first_name': 'لوحة',
-                'last_name': 'التحكم',
-                'is_staff': True,
-                'is_superuser': False,
-                'user_type': User.EMPLOYEE,
-                'phone': f'71{random.randint(100000, 999999)}',
-                'is_active': True,
-                'language': 'ar',
-            }
-        )
-        if created:
-            user.set_password('Test@123')
-            user.save()
-
-            # Create employee profile for dashboard user
-            EmployeeProfile.objects.create(
-                user=user,
-                school=school,
-                employee_id=f'E{school.code}000',
-                position='admin',
-                department='الإدارة',
-                hire_date=date(2024, 9, 1),
-                salary=Decimal('10000'),
-                can_manage_students=True,
-                can_manage_teachers=True,
-                can_view_reports=True,
-                is_active=True
-            )
-            self.stdout.write(f'✓ Dashboard user created for {school.name}')
-
-        return user
-
-    def create_school(self, index):
-        """Create a school with Arabic name"""
-        arabic_school_names = [
-            'مدرسة النور الأساسية',
-            'مدرسة الفجر الثانوية',
-            'مدرسة الأمل الابتدائية',
-            'مدرسة المستقبل المختلطة',
-            'مدرسة التميز الأساسية',
-            'مدرسة النجاح الثانوية',
-            'مدرسة العلم والمعرفة',
-            'مدرسة الرسالة التربوية',
-        ]
-
-        school = School.objects.create(
-            name=arabic_school_names[(index - 1) % len(arabic_school_names)],
-            address=f'حي السلام، شارع {random.randint(1, 50)}، تونس',
-            phone=f'71{random.randint(100000, 999999)}',
-            email=f'info@school{index}.edu.tn',
-            principal_name=random.choice([
-                'أحمد محمد بن علي', 'فاطمة الزهراء بن صالح', 'محمد الأمين بن يوسف',
-                'نورا حسن بن عبدالله', 'سالم عبدالرحمن بن مبروك', 'مريم خالد بن حسين'
-            ]),
+    def create_school(self, number, rng):
+        """Create a school with Arabic name (code drawn from the seeded generator)"""
+        code = ''.join(rng.choice(HEX_UPPER) for _ in range(8))
+        if School.objects.filter(code=code).exists():
+            code = ''  # Taken by an earlier run: School.save draws a random one
+        return School.objects.create(
+            name=SCHOOL_NAMES[(number - 1) % len(SCHOOL_NAMES)],
+            code=code,
+            address=f'حي السلام، شارع {rng.randint(1, 50)}، تونس',
+            phone=f'71{rng.randint(100000, 999999)}',
+            email=f'info@school{number}.edu.tn',
+            principal_name=rng.choice(PRINCIPAL_NAMES),
             academic_year_start=date(2024, 9, 1),
             academic_year_end=date(2025, 6, 30),
             is_active=True
         )
-        return school
 
     def create_academic_years(self, school):
-        """Create academic years for school"""
-        years = []
-        current_year = AcademicYear.objects.create(
-            school=school,
-            name='2024-2025',
-            start_date=date(2024, 9, 1),
-            end_date=date(2025, 6, 30),
-            is_current=True
-        )
-        years.append(current_year)
-
-        # Previous year
-        prev_year = AcademicYear.objects.create(
-            school=school,
-            name='2023-2024',
-            start_date=date(2023, 9, 1),
-            end_date=date(2024, 6, 30),
-            is_current=False
-        )
-        years.append(prev_year)
-
-        return years
+        """Current and previous academic years (current first)"""
+        return AcademicYear.objects.bulk_create([
+            AcademicYear(school=school, name='2024-2025', start_date=date(2024, 9, 1),
+                         end_date=date(2025, 6, 30), is_current=True),
+            AcademicYear(school=school, name='2023-2024', start_date=date(2023, 9, 1),
+                         end_date=date(2024, 6, 30), is_current=False),
+        ])
 
     def create_grades(self, school):
-        """Create grades for school - 6 primary + 3 middle + 3 secondary"""
-        grades_data = [
-            # Primary (6 grades)
-            ('السنة الأولى ابتدائي', 1, 'primary'),
-            ('السنة الثانية ابتدائي', 2, 'primary'),
-            ('السنة الثالثة ابتدائي', 3, 'primary'),
-            ('السنة الرابعة ابتدائي', 4, 'primary'),
-            ('السنة الخامسة ابتدائي', 5, 'primary'),
-            ('السنة السادسة ابتدائي', 6, 'primary'),
-            # Middle (3 grades)
-            ('السنة السابعة إعدادي', 7, 'middle'),
-            ('السنة الثامنة إعدادي', 8, 'middle'),
-            ('السنة التاسعة إعدادي', 9, 'middle'),
-            # Secondary (3 grades)
-            ('السنة الأولى ثانوي', 10, 'secondary'),
-            ('السنة الثانية ثانوي', 11, 'secondary'),
-            ('السنة الثالثة ثانوي', 12, 'secondary'),
-        ]
-
-        grades = []
-        for name, level, grade_type in grades_data:
-            grade = Grade.objects.create(
+        """6 primary + 3 middle + 3 secondary grades"""
+        return Grade.objects.bulk_create([
+            Grade(school=school, name=name, level=level, grade_type=grade_type, is_active=True)
+            for name, level, grade_type in GRADES
+        ])
+
+    def create_classes(self, school, grades, academic_year, rng):
+        """2-4 classes per grade"""
+        return SchoolClass.objects.bulk_create([
+            SchoolClass(
                 school=school,
-                name=name,
-                level=level,
-                grade_type=grade_type,
+                grade=grade,
+                academic_year=academic_year,
+                name=f"{grade.level} - {CLASS_NAMES[index]}",
+                capacity=rng.randint(25, 35),
                 is_active=True
             )
-            grades.append(grade)
-
-        return grades
-
-    def create_classes(self, school, grades, academic_year):
-        """Create classes for each grade"""
-        classes = []
-        class_names = ['أ', 'ب', 'ج', 'د']
-
-        for grade in grades:
-            # Create 2-3 classes per grade randomly
-            num_classes = random.randint(2, min(4, len(class_names)))
-            for i in range(num_classes):
-                school_class = SchoolClass.objects.create(
-                    school=school,
-                    grade=grade,
-                    academic_year=academic_year,
-                    name=f"{grade.level} - {class_names[i]}",
-                    capacity=random.randint(25, 35),
-                    is_active=True
-                )
-                classes.append(school_class)
-
-        return classes
-
-    def create_teachers(self, school, count):
-        """Create teacher profiles"""
-        arabic_first_names_male = [
-            'محمد', 'أحمد', 'علي', 'حسن', 'عمر', 'يوسف', 'إبراهيم',
-            'خالد', 'سعيد', 'كريم', 'رضا', 'منير', 'طارق', 'أمين', 'ياسين'
-        ]
-        arabic_first_names_female = [
-            'فاطمة', 'عائشة', 'خديجة', 'مريم', 'نور', 'سارة', 'هند', 'أميرة',
-            'رانيا', 'زينب', 'منى', 'سمية', 'ليلى', 'آمال', 'سلمى', 'نورا'
-        ]
-        arabic_last_names = [
-            'بن علي', 'بن صالح', 'بن محمد', 'بن يوسف', 'بن حسن', 'بن عمر',
-            'بن إبراهيم', 'بن عبدالله', 'بن مبروك', 'بن حسين', 'بن الطاهر', 'بن عيسى'
-        ]
-        subjects = [
-            'اللغة العربية', 'الرياضيات', 'العلوم', 'التربية الإسلامية',
-            'التاريخ', 'الجغرافيا', 'اللغة الإنجليزية', 'الفيزياء',
-            'الكيمياء', 'الأحياء', 'التربية البدنية', 'الحاسوب'
-        ]
-
-        teachers = []
-        for i in range(count):
-            is_male = random.choice([True, False])
-            first_names = arabic_first_names_male if is_male else arabic_first_names_female
-
-            first_name = random.choice(first_names)
-            last_name = random.choice(arabic_last_names)
+            for grade in grades
+            for index in range(rng.randint(2, len(CLASS_NAMES)))
+        ])
+
+    def create_dashboard_user(self, school, password, rng):
+        """Dashboard user as employee of the school"""
+        code = school.code.lower()
+        user = User.objects.create(
+            username=f'dashboard_{code}',
+            email=f'dashboard@{code}.edu.tn',
+            first_name='لوحة',
+            last_name='التحكم',
+            is_staff=True,
+            user_type=User.EMPLOYEE,
+            phone=f'71{rng.randint(100000, 999999)}',
+            is_active=True,
+            language='ar',
+            password=password,
+        )
+        EmployeeProfile.objects.create(
+            user=user,
+            school=school,
+            employee_id=f'E{school.code}000',
+            position='admin',
+            department='الإدارة',
+            hire_date=date(2024, 9, 1),
+            salary=Decimal('10000'),
+            can_manage_students=True,
+            can_manage_teachers=True,
+            can_view_reports=True,
+            is_active=True
+        )
+        return user
 
-            # Create user
-            username = f'teacher_{school.code.lower()}_{i + 1}'
-            user = User.objects.create(
+    def create_teachers(self, school, count, password, rng):
+        """Teacher users and profiles"""
+        code = school.code.lower()
+        users = []
+        for index in range(count):
+            first_names = MALE_NAMES if rng.random() < 0.5 else FEMALE_NAMES
+            username = f'teacher_{code}_{index + 1}'
+            users.append(User(
                 username=username,
-                email=f'{username}@{school.code.lower()}.ly',
-                first_name=first_name,
-                last_name=last_name,
+                email=f'{username}@{code}.ly',
+                first_name=rng.choice(first_names),
+                last_name=rng.choice(FAMILY_NAMES),
                 user_type=User.TEACHER,
-                phone=f'05{random.randint(10000000, 99999999)}',
+                phone=f'05{rng.randint(10000000, 99999999)}',
                 is_active=True,
-                language='ar'
-            )
-            user.set_password('Test@123')
-            user.save()
+                language='ar',
+                password=password,
+            ))
+        users = User.objects.bulk_create(users)
 
-            # Create teacher profile
-            teacher = TeacherProfile.objects.create(
+        return TeacherProfile.objects.bulk_create([
+            TeacherProfile(
                 user=user,
                 school=school,
-                employee_id=f'T{school.code}{str(i + 1).zfill(3)}',
-                subject=random.choice(subjects),
-                qualification=random.choice([
-                    'بكالوريوس تربوي', 'ماجستير في التخصص', 'دبلوم عالي',
-                    'بكالوريوس + دبلوم تربوي', 'ماجستير تربوي'
-                ]),
-                experience_years=random.randint(1, 20),
-                hire_date=date(2020, 9, 1) + timedelta(days=random.randint(0, 1400)),
-                salary=Decimal(str(random.randint(8000, 15000))),
+                employee_id=f'T{school.code}{str(index + 1).zfill(3)}',
+                subject=rng.choice(SUBJECTS),
+                qualification=rng.choice(QUALIFICATIONS),
+                experience_years=rng.randint(1, 20),
+                hire_date=date(2020, 9, 1) + timedelta(days=rng.randint(0, 1400)),
+                salary=Decimal(str(rng.randint(8000, 15000))),
                 is_active=True,
-                is_class_teacher=False  # Will be assigned later
+                is_class_teacher=False  # Assigned later
             )
-            teachers.append(teacher)
-
-        return teachers
-
-    def create_employees(self, school):
-        """Create employee profiles"""
-        arabic_names = [
-            ('سليمان', 'بن رشيد'), ('منصف', 'بن عيسى'), ('بدر', 'بن مبروك'),
-            ('هناء', 'بن صالح'), ('أمل', 'بن القاسم'), ('وفاء', 'بن زيد')
-        ]
-
-        employees = []
-        positions = ['admin', 'accountant', 'librarian', 'nurse', 'security']
-
-        for i, position in enumerate(positions):
-            if i < len(arabic_names):
-                first_name, last_name = arabic_names[i]
-            else:
-                first_name, last_name = random.choice(arabic_names)
-
-            # Create user
-            username = f'employee_{school.code.lower()}_{position}'
-            user = User.objects.create(
-                username=username,
-                email=f'{username}@{school.code.lower()}.ly',
+            for index, user in enumerate(users)
+        ])
+
+    def create_employees(self, school, password, rng):
+        """Employee users and profiles, one per position"""
+        code = school.code.lower()
+        users = User.objects.bulk_create([
+            User(
+                username=f'employee_{code}_{position}',
+                email=f'employee_{code}_{position}@{code}.ly',
                 first_name=first_name,
                 last_name=last_name,
                 user_type=User.EMPLOYEE,
-                phone=f'05{random.randint(10000000, 99999999)}',
+                phone=f'05{rng.randint(10000000, 99999999)}',
                 is_active=True,
-                language='ar'
+                language='ar',
+                password=password,
             )
-            user.set_password('Test@123')
-            user.save()
+            for position, first_name, last_name in EMPLOYEES
+        ])
 
-            # Create employee profile
-            employee = EmployeeProfile.objects.create(
+        return EmployeeProfile.objects.bulk_create([
+            EmployeeProfile(
                 user=user,
                 school=school,
-                employee_id=f'E{school.code}{str(i + 1).zfill(3)}',
+                employee_id=f'E{school.code}{str(index + 1).zfill(3)}',
                 position=position,
-                department=random.choice(['الإدارة', 'الشؤون المالية', 'الخدمات']),
-                hire_date=date(2020, 9, 1) + timedelta(days=random.randint(0, 1400)),
-                salary=Decimal(str(random.randint(6000, 12000))),
-                can_manage_students=position in ['admin'],
-                can_manage_teachers=position in ['admin'],
+                department=rng.choice(['الإدارة', 'الشؤون المالية', 'الخدمات']),
+                hire_date=date(2020, 9, 1) + timedelta(days=rng.randint(0, 1400)),
+                salary=Decimal(str(rng.randint(6000, 12000))),
+                can_manage_students=position == 'admin',
+                can_manage_teachers=position == 'admin',
                 can_view_reports=True,
                 is_active=True
             )
-            employees.append(employee)
+            for index, (user, (position, _, _)) in enumerate(zip(users, EMPLOYEES))
+        ])
 
-        return employees
-
-    def assign_class_teachers(self, classes, teachers):
+    def assign_class_teachers(self, classes, teachers, rng):
         """Assign teachers to classes as class teachers"""
-        available_teachers = list(teachers)
-        random.shuffle(available_teachers)
-
-        for i, school_class in enumerate(classes):
-            if i < len(available_teachers):
-                teacher = available_teachers[i]
-                school_class.class_teacher = teacher.user
-                school_class.save()
-
-                teacher.is_class_teacher = True
-                teacher.save()
-
-    def create_students_and_guardians(self, school, classes, student_count):
-        """Create students and their guardians"""
-        arabic_first_names_male = [
-            'محمد', 'أحمد', 'علي', 'حسن', 'يوسف', 'عمر', 'إبراهيم',
-            'سعيد', 'كريم', 'خالد', 'أمين', 'ياسين', 'طارق', 'منير', 'رضا'
-        ]
-        arabic_first_names_female = [
-            'فاطمة', 'سارة', 'مريم', 'نور', 'ليلى', 'هند', 'آمال', 'رانيا',
-            'زينب', 'سلمى', 'أميرة', 'خديجة', 'منى', 'نادية', 'سمية'
-        ]
-        arabic_family_names = [
-            'بن علي', 'بن صالح', 'بن محمد', 'بن يوسف', 'بن حسن', 'بن عمر',
-            'بن إبراهيم', 'بن عبدالله', 'بن مبروك', 'بن حسين', 'بن الطاهر', 'بن عيسى',
-            'بن سعيد', 'بن خليفة', 'بن رشيد', 'بن منصور', 'بن كريم', 'بن حمدي'
-        ]
-
-        for i in range(student_count):
-            # Random student data
-            is_male = random.choice([True, False])
-            first_names = arabic_first_names_male if is_male else arabic_first_names_female
-
-            first_name = random.choice(first_names)
-            father_name = random.choice(arabic_first_names_male)
-            grandfather_name = random.choice(arabic_first_names_male)
-            family_name = random.choice(arabic_family_names)
-
-            # Birth date (6-18 years old)
-            birth_year = random.randint(2006, 2018)
-            birth_date = date(birth_year, random.randint(1, 12), random.randint(1, 28))
-
-            # Assign to random class
-            current_class = random.choice(classes)
-
-            # Create student
-            student = Student.objects.create(
-                school=school,
-                current_class=current_class,
-                first_name=first_name,
-                second_name=father_name,
-                third_name=grandfather_name,
-                fourth_name=random.choice(arabic_first_names_male),
-                last_name=family_name,
-                sex='male' if is_male else 'female',
-                date_of_birth=birth_date,
-                place_of_birth=random.choice([
-                    'تونس', 'صفاقس', 'سوسة', 'القيروان', 'بنزرت', 'قابس'
-                ]),
-                phone=f'2{random.randint(10000000, 99999999)}',
-                address=f'حي {random.choice(["المنار", "الخضراء", "النصر", "السعادة"])}, تونس',
-                enrollment_date=current_class.academic_year.start_date,
-                is_active=True
-            )
-
-            # Create guardians (father and mother)
-            self.create_guardians_for_student(student)
-
-            # Create some timeline entries
-            self.create_timeline_entries(student)
-
-    def create_guardians_for_student(self, student):
-        """Create father and optionally mother guardians for student"""
-        arabic_father_names = [
-            'محمد', 'أحمد', 'علي', 'حسن', 'عمر', 'يوسف', 'إبراهيم',
-            'خالد', 'سعيد', 'كريم', 'رضا', 'منير', 'طارق', 'أمين'
-        ]
-        arabic_mother_names = [
-            'فاطمة', 'عائشة', 'خديجة', 'مريم', 'نور', 'سارة', 'هند',
-            'أميرة', 'رانيا', 'منى', 'سمية', 'ليلى', 'نادية', 'زينب'
-        ]
-
-        # Create father - always
-        father_name = random.choice(arabic_father_names)
-        father_phone = f'2{random.randint(10000000, 99999999)}'
-
-        father = Guardian.objects.create(
-            school=student.school,
-            first_name=father_name,
-            last_name=student.last_name,
-            phone=father_phone,
-            email=f'{father_name.lower()}.{student.student_id.lower()}@gmail.com',
-            nid=f'0{random.randint(1000000, 9999999)}',
-            address=student.address
+        available = list(teachers)
+        rng.shuffle(available)
+        for school_class, teacher in zip(classes, available):
+            school_class.class_teacher_id = teacher.user_id
+            teacher.is_class_teacher = True
+        SchoolClass.objects.bulk_update(classes, ['class_teacher'])
+        TeacherProfile.objects.bulk_update(available, ['is_class_teacher'])
+
+    def build_student(self, school, school_class, student_id, rng):
+        is_male = rng.random() < 0.5
+        student = Student(
+            school=school,
+            current_class=school_class,
+            student_id=student_id,
+            first_name=rng.choice(MALE_NAMES if is_male else FEMALE_NAMES),
+            second_name=rng.choice(MALE_NAMES),
+            third_name=rng.choice(MALE_NAMES),
+            fourth_name=rng.choice(MALE_NAMES),
+            last_name=rng.choice(FAMILY_NAMES),
+            sex='male' if is_male else 'female',
+            # 6-18 years old
+            date_of_birth=date(rng.randint(2006, 2018), rng.randint(1, 12), rng.randint(1, 28)),
+            place_of_birth=rng.choice(CITIES),
+            phone=f'2{rng.randint(10000000, 99999999)}',
+            address=f'حي {rng.choice(DISTRICTS)}, تونس',
+            enrollment_date=date(2024, 9, 1),
+            is_active=True
         )
+        student.full_name = student.compose_full_name()
+        return student
+
+    def create_students_and_guardians(self, school, classes, count, codes, password, rng, batch_size):
+        """
+        Students with a father (and 70% a mother), their user accounts and
+        2-5 timeline entries each, written batch_size students at a time.
+        Returns the counts and the (guardian id, user id, student id) links.
+        """
+        counts = {'students': 0, 'guardians': 0, 'timeline': 0}
+        links = []
+        codes = iter(codes)
+        student_ids = Student.reserve_student_ids(school, count)
+
+        for start in range(0, count, batch_size):
+            students = [
+                self.build_student(school, rng.choice(classes), student_id, rng)
+                for student_id in student_ids[start:start + batch_size]
+            ]
+            Student.objects.bulk_create(students, batch_size=batch_size)
+
+            # (student, relationship, first name, last name)
+            parents = []
+            for student in students:
+                parents.append((student, 'father', student.second_name, student.last_name))
+                if rng.random() < 0.7:
+                    parents.append((student, 'mother', rng.choice(FEMALE_NAMES), rng.choice(FAMILY_NAMES)))
+
+            # Phone numbers double as usernames: unique per school id and guardian number
+            phones = [f'2{school.pk:04d}{counts["guardians"] + index:07d}' for index in range(len(parents))]
+            users = User.objects.bulk_create([
+                User(
+                    username=phone,
+                    email=f'g{phone}@gmail.com',
+                    first_name=first_name,
+                    last_name=last_name,
+                    user_type=User.GUARDIAN,
+                    phone=phone,
+                    is_active=True,
+                    language='ar',
+                    password=password,
+                )
+                for phone, (_, _, first_name, last_name) in zip(phones, parents)
+            ], batch_size=batch_size)
+            guardians = Guardian.objects.bulk_create([
+                Guardian(
+                    school=school,
+                    first_name=first_name,
+                    last_name=last_name,
+                    phone=phone,
+                    email=user.email,
+                    nid=f'0{rng.randint(1000000, 9999999)}' if relationship == 'father' else None,
+                    address=student.address,
+                    user=user,
+                    selected_student=student,
+                    code=next(codes),
+                )
+                for phone, user, (student, relationship, first_name, last_name) in zip(phones, users, parents)
+            ], batch_size=batch_size)
+            GuardianStudent.objects.bulk_create([
+                GuardianStudent(
+                    guardian=guardian,
+                    student=student,
+                    relationship=relationship,
+                    is_primary=relationship == 'father',
+                    is_emergency_contact=True,
+                    can_pickup=True,
+                    can_receive_notifications=True,
+                )
+                for guardian, (student, relationship, _, _) in zip(guardians, parents)
+            ], batch_size=batch_size)
+
+            timeline = [
+                StudentTimeline(
+                    student=student,
+                    title=title,
+                    note=note,
+                    content_type=content_type,
+                    is_visible_to_guardian=rng.random() < 0.7,
+                    is_visible_to_student=rng.random() < 0.5,
+                    created_by_id=student.current_class.class_teacher_id,
+                    is_pinned=rng.random() < 0.25,
+                )
+                for student in students
+                for title, note, content_type in rng.sample(TIMELINE_CONTENT, rng.randint(2, 5))
+            ]
+            StudentTimeline.objects.bulk_create(timeline, batch_size=batch_size)
 
-        # Create user for father - using phone as username
-        user_father = User.objects.create(
-            username=father_phone,
-            email=father.email,
-            first_name=father.first_name,
-            last_name=father.last_name,
-            user_type=User.GUARDIAN,
-            phone=father.phone,
-            is_active=True,
-            language='ar'
+            links.extend(
+                (guardian.pk, guardian.user_id, student.pk) for guardian, (student, _, _, _) in zip(guardians, parents)
+            )
+            counts['students'] += len(students)
+            counts['guardians'] += len(guardians)
+            counts['timeline'] += len(timeline)
+
+        return counts, links
+
+    def create_survey(self, school, links, period_count, response_rate, rng, batch_size):
+        """
+        Monthly guardian survey with one choice question: period_count periods
+        (the last one active), a distribution per link and responses
+        (stored as answer documents). Returns the number of distributions.
+        """
+        template = Template.objects.create(
+            name='استطلاع رضا أولياء الأمور',
+            type=Template.FOOD,
+            school=school,
+            target_audience=Template.TARGET_GUARDIANS,
+            send_frequency=Template.FREQ_MONTHLY,
         )
-        user_father.set_password('Test@123')
-        user_father.save()
-
-        # Link father to user
-        father.user = user_father
-        father.selected_student = student
-        father.save()
-
-        # Create father-student relationship
-        GuardianStudent.objects.create(
-            guardian=father,
-            student=student,
-            relationship='father',
-            is_primary=True,
-            is_emergency_contact=True,
-            can_pickup=True,
-            can_receive_notifications=True,
+        field = TemplateField.objects.create(
+            template=template, name='تقييم الخدمات', type=TemplateField.SELECT,
+            value=SURVEY_CHOICES, is_public=True, is_required=True, order=1,
         )
 
-        # Create mother randomly (70% chance)
-        if random.random() < 0.7:
-            mother_name = random.choice(arabic_mother_names)
-            mother_last_name = random.choice([
-                'بن علي', 'بن صالح', 'بن محمد', 'بن يوسف', 'بن حسن', 'بن عمر'
-            ])
-            mother_phone = f'2{random.randint(10000000, 99999999)}'
-
-            mother = Guardian.objects.create(
-                school=student.school,
-                first_name=mother_name,
-                last_name=mother_last_name,
-                phone=mother_phone,
-                email=f'{mother_name.lower()}.{student.student_id.lower()}m@gmail.com',
-                address=student.address
+        today = timezone.now().date()
+        created = 0
+        for number in range(period_count):
+            start = today - timedelta(days=30 * (period_count - number - 1))
+            current = number == period_count - 1
+            period = SurveyPeriod.objects.create(
+                survey=template, school=school, start_date=start, end_date=start + timedelta(days=30),
+                is_active=current,
             )
-
-            # Create user for mother - using phone as username
-            user_mother = User.objects.create(
-                username=mother_phone,
-                email=mother.email,
-                first_name=mother.first_name,
-                last_name=mother.last_name,
-                user_type=User.GUARDIAN,
-                phone=mother.phone,
-                is_active=True,
-                language='ar'
-            )
-            user_mother.set_password('Test@123')
-            user_mother.save()
-
-            # Link mother to user
-            mother.user = user_mother
-            mother.selected_student = student
-            mother.save()
-
-            # Create mother-student relationship
-            GuardianStudent.objects.create(
-                guardian=mother,
-                student=student,
-                relationship='mother',
-                is_primary=False,
-                is_emergency_contact=True,
-                can_pickup=True,
-                can_receive_notifications=True
-            )
-
-    def create_timeline_entries(self, student):
-        """Create timeline entries for student"""
-        timeline_content = [
-            ('تحسن في الدرجات', 'أظهر الطالب تحسناً ملحوظاً في مادة الرياضيات', 'academic'),
-            ('سلوك إيجابي', 'تطوع الطالب لمساعدة زملائه في الفصل', 'behavior'),
-            ('إنجاز رياضي', 'حصل على المركز الأول في مسابقة الجري', 'achievement'),
-            ('ملاحظة صحية', 'يحتاج إلى متابعة طبية لضعف في النظر', 'health'),
-            ('حضور ممتاز', 'حافظ على الحضور المنتظم طوال الشهر', 'attendance'),
-        ]
-
-        # Create 2-5 random timeline entries per student
-        num_entries = random.randint(2, 5)
-        selected_entries = random.sample(timeline_content, min(num_entries, len(timeline_content)))
-
-        for title, note, content_type in selected_entries:
-            StudentTimeline.objects.create(
-                student=student,
-                title=title,
-                note=note,
-                content_type=content_type,
-                is_visible_to_guardian=random.choice([True, True, False]),  # 70% visible
-                is_visible_to_student=random.choice([True, False]),
-                created_by=student.current_class.class_teacher if student.current_class.class_teacher else None,
-                is_pinned=random.choice([True, False, False, False]),  # 25% pinned
-                created_at=timezone.now() - timedelta(days=random.randint(1, 90))
-            )
\ No newline at end of file
+            rate = response_rate / 2 if current else response_rate
+            completed = 0
+
+            for offset in range(0, len(links), batch_size):
+                batch = links[offset:offset + batch_size]
+                answered = [rng.random() < rate for _ in batch]
+                responses = iter(Response.objects.bulk_create([
+                    Response(template=template, user_id=user_id, guardian_id=guardian_id, student_id=student_id,
+                             answers={field.key: rng.choice(SURVEY_CHOICES)})
+                    for (guardian_id, user_id, student_id), done in zip(batch, answered) if done
+                ]))
+                SurveyDistribution.objects.bulk_create([
+                    SurveyDistribution(
+                        period=period, survey=template, user_id=user_id, student_id=student_id, school=school,
+                        is_completed=done, response=next(responses) if done else None,
+                        completed_at=timezone.now() if done else None,
+                    )
+                    for (_, user_id, student_id), done in zip(batch, answered)
+                ])
+                completed += sum(answered)
+
+            SurveyPeriod.objects.filter(pk=period.pk).update(total_count=len(links), completed_count=completed)
+            rebuild_period_results(period)
+            created += len(links)
+
+        return created
@@ -0,0 +1,52 @@
+# core/management/commands/import_students.py
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+
+from core.importing import ImportFileError, run_import
+from core.models import School, ImportJob
+
+
+class Command(BaseCommand):
+    help = 'Import students and guardians from a CSV/XLSX sheet, or resume an import job'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', nargs='?', help='CSV or XLSX file to import')
+        parser.add_argument('--school', help='School code (required with a file)')
+        parser.add_argument('--dry-run', action='store_true', help='Validate and report without writing')
+        parser.add_argument('--resume', type=int, metavar='JOB_ID', help='Resume a failed import job')
+        parser.add_argument('--batch-size', type=int, help='Rows per transaction (default: STUDENT_IMPORT_BATCH_SIZE)')
+
+    def handle(self, *args, **options):
+        if options['resume']:
+            try:
+                job = ImportJob.objects.select_related('school').get(pk=options['resume'])
+            except ImportJob.DoesNotExist:
+                raise CommandError(f'Unknown import job: {options["resume"]}')
+        else:
+            if not options['file'] or not options['school']:
+                raise CommandError('A file and --school are required unless --resume is given')
+            try:
+                school = School.objects.get(code=options['school'])
+            except School.DoesNotExist:
+                raise CommandError(f'Unknown school code: {options["school"]}')
+
+            with open(options['file'], 'rb') as handle:
+                name = options['file'].rsplit('/', 1)[-1]
+                job = ImportJob.objects.create(
+                    school=school, file=File(handle, name=name), file_name=name, dry_run=options['dry_run']
+                )
+
+        try:
+            run_import(job, batch_size=options['batch_size'])
+        except ImportFileError as e:
+            raise CommandError(str(e))
+        except Exception as e:
+            raise CommandError(f'Import job {job.pk} failed after {job.processed_rows} rows: {e} (resume with --resume {job.pk})')
+
+        for error in job.errors:
+            self.stdout.write(self.style.WARNING(f'  Row {error["row"]}: {error["errors"]}'))
+        prefix = 'Would create' if job.dry_run else 'Created'
+        self.stdout.write(self.style.SUCCESS(
+            f'Job {job.pk}: {job.processed_rows} rows, {prefix} {job.created_students} students and '
+            f'{job.created_guardians} guardians, skipped {job.skipped_rows} rows'
+        ))
@@ -0,0 +1,29 @@
+# core/management/commands/rebuild_school_stats.py
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import School, SchoolStats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild materialized school statistics (SchoolStats) from scratch'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--school', type=int, action='append', dest='schools',
+            help='Only rebuild the given school id (can be repeated)'
+        )
+
+    def handle(self, *args, **options):
+        schools = School.objects.all()
+        if options['schools']:
+            schools = schools.filter(pk__in=options['schools'])
+            missing = set(options['schools']) - set(schools.values_list('pk', flat=True))
+            if missing:
+                raise CommandError(f'Unknown school ids: {sorted(missing)}')
+
+        count = 0
+        for school in schools.iterator():
+            SchoolStats.rebuild(school)
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt statistics for {count} schools'))
@@ -0,0 +1,66 @@
+"""
+Management command to run the student imports queued from the dashboard
+
+Usage:
+    python manage.py run_import_worker             # run forever
+    python manage.py run_import_worker --once      # run queued jobs and exit
+
+Several workers can run at the same time: each job is taken by one worker.
+A job whose worker stopped mid-way is marked failed after
+STUDENT_IMPORT_STALE_SECONDS and can be resumed from the job page.
+"""
+
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from core.importing import claim_import_job, run_import
+
+
+class Command(BaseCommand):
+    help = 'Run queued student/guardian imports'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Exit when no job is queued instead of polling'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=2.0,
+            help='Seconds to wait between polls when no job is queued (default: 2)'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Import worker started'))
+        stop = threading.Event()
+        processed = 0
+        try:
+            while not stop.is_set():
+                close_old_connections()
+                job = claim_import_job()
+                if job is None:
+                    if options['once']:
+                        break
+                    stop.wait(options['poll_interval'])
+                    continue
+
+                started = time.monotonic()
+                try:
+                    run_import(job)
+                except Exception as e:
+                    # run_import marked the job failed; it can be resumed from the dashboard
+                    self.stdout.write(self.style.ERROR(f'  ✗ job {job.pk} ({job.file_name}): {e}'))
+                else:
+                    self.stdout.write(
+                        f'  ✓ job {job.pk} ({job.file_name}): {job.processed_rows} rows '
+                        f'in {time.monotonic() - started:.1f}s'
+                    )
+                processed += 1
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('Stopping...'))
+        finally:
+            connection.close()
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} import jobs'))
@@ -1,7 +1,12 @@
 # core/middleware.py - School context and activity middleware
+from django.conf import settings
 from django.utils import timezone
 from django.utils.deprecation import MiddlewareMixin
 
+from core.models import SchoolStats
+from core.queries import QueryRecorder, check_budget, logger as query_logger
+from core.tenancy import EMPTY_CONTEXT, get_school_context
+
 
 class SchoolContextMiddleware(MiddlewareMixin):
     """
@@ -12,19 +17,46 @@ class SchoolContextMiddleware(MiddlewareMixin):
     def process_request(self, request):
         """Add school context to request"""
         request.school = None
+        request.school_context = EMPTY_CONTEXT
 
         if hasattr(request, 'user') and request.user.is_authenticated:
-            # Get school from user's profile
-            if hasattr(request.user, 'guardian') and request.user.guardian:
-                request.school = request.user.guardian.school
-            elif hasattr(request.user, 'teacher_profile') and request.user.teacher_profile:
-                request.school = request.user.teacher_profile.school
-            elif hasattr(request.user, 'employee_profile') and request.user.employee_profile:
-                request.school = request.user.employee_profile.school
+            # Resolved once per user and cached (see core.tenancy)
+            request.school_context = get_school_context(request.user)
+            request.school = request.school_context.school
 
         return None
 
 
+class QueryInspectionMiddleware:
+    """
+    Development/CI middleware recording the queries of each request (see core.queries)
+    Adds X-Query-Count, X-Query-Time and X-Query-Duplicates headers, logs repeated
+    queries (N+1) with their origin and applies settings.QUERY_INSPECTION_BUDGET
+    to every request when set.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.budget = getattr(settings, 'QUERY_INSPECTION_BUDGET', None)
+
+    def __call__(self, request):
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+            # Templates and DRF responses may still query while rendering
+            if hasattr(response, 'render') and not response.is_rendered:
+                response.render()
+
+        duplicates = recorder.duplicates()
+        response['X-Query-Count'] = str(recorder.count)
+        response['X-Query-Time'] = f'{recorder.duration * 1000:.1f}ms'
+        response['X-Query-Duplicates'] = str(sum(count for _, count, _ in duplicates))
+        if duplicates:
+            query_logger.warning('Repeated queries in %s %s: %s', request.method, request.path, recorder.report())
+
+        check_budget(recorder, self.budget, f'{request.method} {request.path}')
+        return response
+
+
 class UserActivityMiddleware(MiddlewareMixin):
     """
     Middleware to track user activity
@@ -104,13 +136,7 @@ def school_context(request):
             }
 
             # Add basic stats for dashboard
-            if hasattr(school, 'students'):
-                context['school_stats'] = {
-                    'total_students': school.students.filter(is_active=True).count(),
-                    'total_guardians': school.guardians.count(),
-                    'total_classes': school.classes.filter(is_active=True).count(),
-                    'total_grades': school.grades.filter(is_active=True).count(),
-                }
+            context['school_stats'] = SchoolStats.for_school(school).as_dict()
 
     return context
 
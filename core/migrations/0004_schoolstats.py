@@ -0,0 +1,32 @@
+# Generated by Django 5.2.6 on 2026-10-16 19:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_alter_schoolclass_section'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchoolStats',
+            fields=[
+                ('school', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='core.school', verbose_name='المدرسة')),
+                ('students', models.IntegerField(default=0, verbose_name='الطلاب النشطون')),
+                ('guardians', models.IntegerField(default=0, verbose_name='أولياء الأمور')),
+                ('teachers', models.IntegerField(default=0, verbose_name='المعلمون النشطون')),
+                ('classes', models.IntegerField(default=0, verbose_name='الفصول النشطة')),
+                ('grades', models.IntegerField(default=0, verbose_name='الصفوف النشطة')),
+                ('timeline_posts', models.IntegerField(default=0, verbose_name='منشورات السجل')),
+                ('grade_breakdown', models.JSONField(blank=True, default=list, verbose_name='توزيع الطلاب على الصفوف')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='تاريخ التحديث')),
+            ],
+            options={
+                'verbose_name': 'إحصائيات مدرسة',
+                'verbose_name_plural': 'إحصائيات المدارس',
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.6 on 2026-10-16 19:50
+
+import core.models
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_schoolstats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(upload_to=core.models.import_upload_path, verbose_name='الملف')),
+                ('file_name', models.CharField(max_length=255, verbose_name='اسم الملف')),
+                ('dry_run', models.BooleanField(default=True, verbose_name='معاينة فقط؟')),
+                ('status', models.CharField(choices=[('pending', 'في الانتظار'), ('running', 'قيد التنفيذ'), ('completed', 'مكتمل'), ('failed', 'فشل')], default='pending', max_length=20, verbose_name='الحالة')),
+                ('processed_rows', models.PositiveIntegerField(default=0, verbose_name='الصفوف المعالجة')),
+                ('created_students', models.PositiveIntegerField(default=0, verbose_name='الطلاب المضافون')),
+                ('created_guardians', models.PositiveIntegerField(default=0, verbose_name='الأولياء المضافون')),
+                ('skipped_rows', models.PositiveIntegerField(default=0, verbose_name='الصفوف المتجاوزة')),
+                ('report', models.JSONField(blank=True, default=dict, verbose_name='التقرير')),
+                ('errors', models.JSONField(blank=True, default=list, verbose_name='الأخطاء')),
+                ('last_error', models.TextField(blank=True, verbose_name='آخر خطأ')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاريخ الإنشاء')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='تاريخ التعديل')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='تاريخ الانتهاء')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='أنشئ بواسطة')),
+                ('default_class', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.schoolclass', verbose_name='الفصل الافتراضي')),
+                ('default_grade', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.grade', verbose_name='الصف الافتراضي')),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='import_jobs', to='core.school', verbose_name='المدرسة')),
+            ],
+            options={
+                'verbose_name': 'عملية استيراد',
+                'verbose_name_plural': 'عمليات الاستيراد',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-16 19:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_importjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentIdSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField(verbose_name='السنة')),
+                ('last_value', models.PositiveIntegerField(default=0, verbose_name='آخر رقم')),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='student_id_sequences', to='core.school', verbose_name='المدرسة')),
+            ],
+            options={
+                'verbose_name': 'تسلسل أرقام القيد',
+                'verbose_name_plural': 'تسلسلات أرقام القيد',
+                'unique_together': {('school', 'year')},
+            },
+        ),
+    ]
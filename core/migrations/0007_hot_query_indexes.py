@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-16 20:01
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_studentidsequence'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['school', 'full_name'], name='student_active_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studenttimeline',
+            index=models.Index(condition=models.Q(('is_visible_to_guardian', True)), fields=['student', '-is_pinned', '-created_at'], name='timeline_guardian_feed_idx'),
+        ),
+    ]
@@ -5,6 +5,8 @@ from django.db import models
 from django.conf import settings
 from django.utils import timezone
 
+from core.codes import save_with_unique_code, school_code, guardian_code
+
 
 class School(models.Model):
     """
@@ -39,16 +41,14 @@ class School(models.Model):
         return f"{self.name} ({self.code})"
 
     def save(self, *args, **kwargs):
-        if not self.code:
-            self.code = self.generate_unique_code()
-        super().save(*args, **kwargs)
+        if self.code:
+            return super().save(*args, **kwargs)
+        self.code = self.generate_unique_code()
+        save_with_unique_code(self, "code", school_code, lambda: super(School, self).save(*args, **kwargs))
 
     def generate_unique_code(self):
-        """Generate unique school code"""
-        code = str(uuid.uuid4().hex[:8].upper())
-        while School.objects.filter(code=code).exists():
-            code = str(uuid.uuid4().hex[:8].upper())
-        return code
+        """Generate school code (uniqueness is enforced on insert, see core.codes)"""
+        return school_code()
 
 
 class AcademicYear(models.Model):
@@ -199,9 +199,10 @@ class Guardian(models.Model):
         return f"{self.first_name} {self.last_name}".strip()
 
     def save(self, *args, **kwargs):
-        if not self.code:
-            self.code = str(uuid.uuid4().hex[:8].upper())
-        super().save(*args, **kwargs)
+        if self.code:
+            return super().save(*args, **kwargs)
+        self.code = guardian_code()
+        save_with_unique_code(self, "code", guardian_code, lambda: super(Guardian, self).save(*args, **kwargs))
 
 
 # Enhanced Student model with school and class relationships
@@ -261,28 +262,106 @@ class Student(models.Model):
         verbose_name_plural = "الطلبة"
         unique_together = [["school", "student_id"]]
         ordering = ["last_name", "first_name"]
+        indexes = [
+            # Active students of a school by name (api: EmployeeStudentsViewSet)
+            models.Index(fields=["school", "full_name"], condition=models.Q(is_active=True), name="student_active_name_idx"),
+        ]
 
     def save(self, *args, **kwargs):
         # Auto-generate full name
-        parts = [self.first_name, self.second_name, self.third_name, self.fourth_name, self.last_name]
-        self.full_name = " ".join([p for p in parts if p]) or None
+        self.full_name = self.compose_full_name()
 
         # Auto-generate student ID if not provided
         if not self.student_id and self.school_id:
             self.student_id = self.generate_student_id()
+        elif self._state.adding and self.school_id:
+            # Keep the sequence ahead of IDs entered by hand
+            StudentIdSequence.advance_past(self.school, [self.student_id])
 
         super().save(*args, **kwargs)
 
+    def compose_full_name(self):
+        parts = [self.first_name, self.second_name, self.third_name, self.fourth_name, self.last_name]
+        return " ".join([p for p in parts if p]) or None
+
     def generate_student_id(self):
         """Generate unique student ID within school"""
-        year = str(timezone.now().year)[2:]  # Last 2 digits of year
-        count = Student.objects.filter(school=self.school).count() + 1
-        return f"{self.school.code}{year}{count:04d}"
+        return self.reserve_student_ids(self.school, 1)[0]
+
+    @classmethod
+    def reserve_student_ids(cls, school, count):
+        """Reserve a block of count consecutive student IDs, e.g. for bulk inserts"""
+        prefix, numbers = StudentIdSequence.allocate(school, count)
+        return [f"{prefix}{number:04d}" for number in numbers]
 
     def __str__(self):
         return self.full_name or f"{self.first_name} {self.last_name}".strip()
 
 
+class StudentIdSequence(models.Model):
+    """
+    Last student number issued per school and year (IDs are <school code><yy><number:04d>).
+    Numbers are taken by locking this row, so concurrent saves and imports never
+    get the same ID and no COUNT over the students is needed.
+    """
+    school = models.ForeignKey(School, on_delete=models.CASCADE, related_name="student_id_sequences", verbose_name="المدرسة")
+    year = models.PositiveSmallIntegerField(verbose_name="السنة")
+    last_value = models.PositiveIntegerField(default=0, verbose_name="آخر رقم")
+
+    class Meta:
+        verbose_name = "تسلسل أرقام القيد"
+        verbose_name_plural = "تسلسلات أرقام القيد"
+        unique_together = [["school", "year"]]
+
+    def __str__(self):
+        return f"{self.school_id}/{self.year}: {self.last_value}"
+
+    @staticmethod
+    def prefix(school, year):
+        return f"{school.code}{str(year)[2:]}"
+
+    @classmethod
+    def _highest_issued(cls, school, year):
+        """Highest number among existing IDs of the year, to start a new sequence after them"""
+        prefix = cls.prefix(school, year)
+        highest = 0
+        for student_id in Student.objects.filter(school=school, student_id__startswith=prefix).values_list("student_id", flat=True):
+            suffix = student_id[len(prefix):]
+            if suffix.isdigit():
+                highest = max(highest, int(suffix))
+        return highest
+
+    @classmethod
+    def allocate(cls, school, count=1):
+        """Reserve count numbers for the current year. Returns (prefix, range of numbers)."""
+        from django.db import transaction
+
+        year = timezone.now().year
+        with transaction.atomic():
+            sequence, _ = cls.objects.select_for_update().get_or_create(
+                school=school, year=year,
+                # Callable: only evaluated when the row is created
+                defaults={"last_value": lambda: cls._highest_issued(school, year)},
+            )
+            start = sequence.last_value + 1
+            sequence.last_value += count
+            sequence.save(update_fields=["last_value"])
+        return cls.prefix(school, year), range(start, start + count)
+
+    @classmethod
+    def advance_past(cls, school, student_ids):
+        """Move the current year's sequence past explicitly given IDs that use its format"""
+        year = timezone.now().year
+        prefix = cls.prefix(school, year)
+        numbers = [
+            int(student_id[len(prefix):]) for student_id in student_ids
+            if student_id and student_id.startswith(prefix) and student_id[len(prefix):].isdigit()
+        ]
+        if numbers:
+            # A missing row is seeded from the existing IDs when first used
+            cls.objects.filter(school=school, year=year, last_value__lt=max(numbers)).update(last_value=max(numbers))
+
+
 # Enhanced GuardianStudent relationship
 class GuardianStudent(models.Model):
     REL_CHOICES = (
@@ -367,6 +446,9 @@ class StudentTimeline(models.Model):
         indexes = [
             models.Index(fields=["student", "-created_at"]),
             models.Index(fields=["created_by", "-created_at"]),
+            # Guardian feed: visible posts of a student, pinned first (api: MyTimelineViewSet)
+            models.Index(fields=["student", "-is_pinned", "-created_at"], condition=models.Q(is_visible_to_guardian=True),
+                         name="timeline_guardian_feed_idx"),
         ]
 
     def __str__(self):
@@ -396,4 +478,164 @@ class StudentTimelineAttachment(models.Model):
         if self.file:
             self.file_size = self.file.size
 
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+
+
+class SchoolStats(models.Model):
+    """
+    Materialized per-school counters read by dashboards and stats endpoints.
+    Kept up to date incrementally by signals (see core.signals); rebuild with
+    `python manage.py rebuild_school_stats` after bulk operations that bypass signals.
+    """
+    school = models.OneToOneField(
+        School, on_delete=models.CASCADE, primary_key=True, related_name="stats", verbose_name="المدرسة"
+    )
+
+    students = models.IntegerField(default=0, verbose_name="الطلاب النشطون")
+    guardians = models.IntegerField(default=0, verbose_name="أولياء الأمور")
+    teachers = models.IntegerField(default=0, verbose_name="المعلمون النشطون")
+    classes = models.IntegerField(default=0, verbose_name="الفصول النشطة")
+    grades = models.IntegerField(default=0, verbose_name="الصفوف النشطة")
+    timeline_posts = models.IntegerField(default=0, verbose_name="منشورات السجل")
+
+    # [{"grade_id", "name", "grade_type", "student_count"}, ...] for active grades
+    grade_breakdown = models.JSONField(default=list, blank=True, verbose_name="توزيع الطلاب على الصفوف")
+
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="تاريخ التحديث")
+
+    class Meta:
+        verbose_name = "إحصائيات مدرسة"
+        verbose_name_plural = "إحصائيات المدارس"
+
+    def __str__(self):
+        return f"إحصائيات {self.school_id}"
+
+    @staticmethod
+    def compute_grade_breakdown(school_id):
+        """Active students per active grade, in display order"""
+        return [
+            {
+                'grade_id': row['id'],
+                'name': row['name'],
+                'grade_type': row['grade_type'],
+                'student_count': row['student_count'],
+            }
+            for row in (
+                Grade.objects.filter(school_id=school_id, is_active=True)
+                .annotate(
+                    student_count=models.Count(
+                        'classes__students', filter=models.Q(classes__students__is_active=True)
+                    )
+                )
+                .values('id', 'name', 'grade_type', 'student_count')
+                .order_by('grade_type', 'level')
+            )
+        ]
+
+    @classmethod
+    def rebuild(cls, school):
+        """Recompute every counter of a school from scratch"""
+        school_id = getattr(school, 'pk', school)
+        from accounts.models import TeacherProfile
+
+        stats, _ = cls.objects.update_or_create(
+            school_id=school_id,
+            defaults={
+                'students': Student.objects.filter(school_id=school_id, is_active=True).count(),
+                'guardians': Guardian.objects.filter(school_id=school_id).count(),
+                'teachers': TeacherProfile.objects.filter(school_id=school_id, is_active=True).count(),
+                'classes': SchoolClass.objects.filter(school_id=school_id, is_active=True).count(),
+                'grades': Grade.objects.filter(school_id=school_id, is_active=True).count(),
+                'timeline_posts': StudentTimeline.objects.filter(student__school_id=school_id).count(),
+                'grade_breakdown': cls.compute_grade_breakdown(school_id),
+            }
+        )
+        return stats
+
+    @classmethod
+    def for_school(cls, school):
+        """Stats row of a school, built on first access"""
+        try:
+            return cls.objects.get(school_id=school.pk)
+        except cls.DoesNotExist:
+            return cls.rebuild(school)
+
+    @classmethod
+    def increment(cls, school_id, **deltas):
+        """Atomically add deltas to counters, e.g. increment(school_id, students=1)"""
+        deltas = {name: value for name, value in deltas.items() if value}
+        if school_id and deltas:
+            cls.objects.filter(school_id=school_id).update(
+                **{name: models.F(name) + value for name, value in deltas.items()}
+            )
+
+    @classmethod
+    def refresh_grade_breakdown(cls, school_id):
+        if school_id:
+            cls.objects.filter(school_id=school_id).update(grade_breakdown=cls.compute_grade_breakdown(school_id))
+
+    def as_dict(self):
+        return {
+            'total_students': self.students,
+            'total_guardians': self.guardians,
+            'total_teachers': self.teachers,
+            'total_classes': self.classes,
+            'total_grades': self.grades,
+            'total_timeline_posts': self.timeline_posts,
+        }
+
+
+def import_upload_path(instance, filename):
+    return f"schools/{instance.school.code}/imports/{uuid.uuid4().hex}_{filename}"
+
+
+class ImportJob(models.Model):
+    """Bulk student/guardian import from a CSV/XLSX sheet (see core.importing)"""
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_COMPLETED = "completed"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = (
+        (STATUS_PENDING, "في الانتظار"),
+        (STATUS_RUNNING, "قيد التنفيذ"),
+        (STATUS_COMPLETED, "مكتمل"),
+        (STATUS_FAILED, "فشل"),
+    )
+
+    school = models.ForeignKey(School, on_delete=models.CASCADE, related_name="import_jobs", verbose_name="المدرسة")
+    file = models.FileField(upload_to=import_upload_path, verbose_name="الملف")
+    file_name = models.CharField(max_length=255, verbose_name="اسم الملف")
+    dry_run = models.BooleanField(default=True, verbose_name="معاينة فقط؟")
+    default_grade = models.ForeignKey(
+        Grade, on_delete=models.SET_NULL, null=True, blank=True, related_name="+", verbose_name="الصف الافتراضي"
+    )
+    default_class = models.ForeignKey(
+        SchoolClass, on_delete=models.SET_NULL, null=True, blank=True, related_name="+", verbose_name="الفصل الافتراضي"
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING, verbose_name="الحالة")
+
+    # Rows of the sheet already handled; a resumed job continues after them
+    processed_rows = models.PositiveIntegerField(default=0, verbose_name="الصفوف المعالجة")
+    created_students = models.PositiveIntegerField(default=0, verbose_name="الطلاب المضافون")
+    created_guardians = models.PositiveIntegerField(default=0, verbose_name="الأولياء المضافون")
+    skipped_rows = models.PositiveIntegerField(default=0, verbose_name="الصفوف المتجاوزة")
+    # {"new_students": [...], "existing_students": [...], "new_guardians": [...], "matched_guardians": [...]}
+    report = models.JSONField(default=dict, blank=True, verbose_name="التقرير")
+    # [{"row": 12, "errors": {"sex": "..."}}]
+    errors = models.JSONField(default=list, blank=True, verbose_name="الأخطاء")
+    last_error = models.TextField(blank=True, verbose_name="آخر خطأ")
+
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="+", verbose_name="أنشئ بواسطة"
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="تاريخ الإنشاء")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="تاريخ التعديل")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="تاريخ الانتهاء")
+
+    class Meta:
+        verbose_name = "عملية استيراد"
+        verbose_name_plural = "عمليات الاستيراد"
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.file_name} ({self.get_status_display()})"
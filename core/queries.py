@@ -0,0 +1,159 @@
+# core/queries.py - Query recording, N+1 detection and query budgets (dev/CI)
+"""
+QueryRecorder hooks into every database connection (execute_wrapper) and
+keeps, per query: the SQL fingerprint, duration and the project frame that
+issued it. Repeated fingerprints are what an N+1 looks like.
+
+Used by QueryInspectionMiddleware (see core.middleware) for every request
+when settings.QUERY_INSPECTION is on, and by query_budget to cap the queries
+of a block or a function in the tests:
+
+    with query_budget(3):
+        client.get(url)
+
+    @query_budget(6)
+    def test_list(self): ...
+
+Exceeding a budget raises QueryBudgetExceeded when
+settings.QUERY_BUDGET_ENFORCE is true (default: False) and logs a warning
+otherwise.
+"""
+import functools
+import logging
+import re
+import sys
+import time
+from collections import Counter, namedtuple
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+# A query repeated this many times in one request is reported
+DUPLICATE_THRESHOLD = getattr(settings, 'QUERY_INSPECTION_DUPLICATE_THRESHOLD', 3)
+
+Query = namedtuple('Query', ['alias', 'sql', 'fingerprint', 'duration', 'origin'])
+
+_PLACEHOLDER_LISTS = re.compile(r'\((?:%s|\?)(?:,\s*(?:%s|\?))*\)')
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+_SPACES = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(AssertionError):
+    """More queries were run than the declared budget"""
+
+
+def fingerprint(sql):
+    """SQL with literals and IN-lists collapsed, so the same query with other values matches"""
+    sql = _PLACEHOLDER_LISTS.sub('(...)', sql)
+    sql = _LITERALS.sub('?', sql)
+    return _SPACES.sub(' ', sql).strip()
+
+
+def _origin():
+    """file:line function of the innermost frame in project code"""
+    base = str(settings.BASE_DIR)
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(base) and '/site-packages/' not in filename and not filename.endswith('core/queries.py'):
+            return f'{filename[len(base) + 1:]}:{frame.f_lineno} {frame.f_code.co_name}'
+        frame = frame.f_back
+    return None
+
+
+class QueryRecorder:
+    """Records the queries of all connections while active (use as a context manager)"""
+
+    def __init__(self, with_origin=True):
+        self.with_origin = with_origin
+        self.queries = []
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append(Query(
+                context['connection'].alias,
+                sql,
+                fingerprint(sql),
+                time.perf_counter() - started,
+                _origin() if self.with_origin else None,
+            ))
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all(initialized_only=True) or [connections['default']]:
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        return sum(query.duration for query in self.queries)
+
+    def duplicates(self, threshold=DUPLICATE_THRESHOLD):
+        """[(fingerprint, count, origins)] of queries run at least threshold times, most repeated first"""
+        counts = Counter(query.fingerprint for query in self.queries)
+        result = []
+        for sql, count in counts.most_common():
+            if count < threshold:
+                break
+            origins = Counter(query.origin for query in self.queries if query.fingerprint == sql and query.origin)
+            result.append((sql, count, [origin for origin, _ in origins.most_common(3)]))
+        return result
+
+    def report(self):
+        lines = [f'{self.count} queries in {self.duration * 1000:.1f} ms']
+        for sql, count, origins in self.duplicates():
+            lines.append(f'  {count}x {sql[:200]}')
+            lines.extend(f'      at {origin}' for origin in origins)
+        return '\n'.join(lines)
+
+
+def check_budget(recorder, budget, label):
+    if budget is None or recorder.count <= budget:
+        return
+    message = f'{label}: {recorder.count} queries, budget is {budget}\n{recorder.report()}'
+    if getattr(settings, 'QUERY_BUDGET_ENFORCE', False):
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+class query_budget:
+    """Cap the number of queries of a view (decorator) or of a block (context manager)"""
+
+    def __init__(self, budget):
+        self.budget = budget
+        self._recorder = None
+
+    def __enter__(self):
+        self._recorder = QueryRecorder().__enter__()
+        return self._recorder
+
+    def __exit__(self, exc_type, exc, traceback):
+        self._recorder.__exit__(exc_type, exc, traceback)
+        if exc_type is None:
+            check_budget(self._recorder, self.budget, 'query budget')
+
+    def __call__(self, function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with QueryRecorder() as recorder:
+                result = function(*args, **kwargs)
+            check_budget(recorder, self.budget, function.__qualname__)
+            return result
+
+        wrapper.query_budget = self.budget
+        return wrapper
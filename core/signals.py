@@ -1,7 +1,12 @@
-from django.db.models.signals import post_delete
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
-from core.models import GuardianStudent, Guardian
+from accounts.models import TeacherProfile, EmployeeProfile
+from core.models import (
+    GuardianStudent, Guardian, School, Student, SchoolClass, Grade,
+    StudentTimeline, SchoolStats
+)
+from core.tenancy import invalidate_school_context, invalidate_school_users
 
 
 @receiver(post_delete, sender=GuardianStudent)
@@ -9,3 +14,186 @@ def clear_selection_if_link_removed(sender, instance, **kwargs):
     g = instance.guardian
     if g.selected_student_id == instance.student_id:
         Guardian.objects.filter(pk=g.pk).update(selected_student=None)
+
+
+@receiver([post_save, post_delete], sender=Guardian)
+@receiver([post_save, post_delete], sender=TeacherProfile)
+@receiver([post_save, post_delete], sender=EmployeeProfile)
+def invalidate_profile_school_context(sender, instance, **kwargs):
+    invalidate_school_context(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=School)
+def invalidate_school_members_context(sender, instance, created=False, **kwargs):
+    # A brand new school has no members yet
+    if not created:
+        invalidate_school_users(instance.pk)
+
+
+# ==========================================
+# SCHOOL STATS MAINTENANCE
+# ==========================================
+# Counters are adjusted with F() deltas; bulk operations that bypass signals
+# must be followed by `manage.py rebuild_school_stats`.
+
+@receiver(post_save, sender=School)
+def create_school_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        SchoolStats.objects.get_or_create(school=instance)
+
+
+# Fields whose previous value is needed to compute deltas, per model
+STATS_TRACKED_FIELDS = {
+    Student: ('school_id', 'is_active', 'current_class_id'),
+    Guardian: ('school_id',),
+    TeacherProfile: ('school_id', 'is_active'),
+    SchoolClass: ('school_id', 'is_active', 'grade_id'),
+    Grade: ('school_id', 'is_active', 'name', 'grade_type', 'level'),
+}
+
+
+def _active_delta(previous, instance, counter):
+    """Deltas for a counter of active rows, per school"""
+    deltas = {}
+    if previous and previous['is_active']:
+        deltas[previous['school_id']] = deltas.get(previous['school_id'], 0) - 1
+    if instance.is_active:
+        deltas[instance.school_id] = deltas.get(instance.school_id, 0) + 1
+    for school_id, delta in deltas.items():
+        SchoolStats.increment(school_id, **{counter: delta})
+
+
+def _changed(previous, instance, fields):
+    return previous is None or any(previous[field] != getattr(instance, field) for field in fields)
+
+
+def _affected_schools(previous, instance):
+    return {previous['school_id'], instance.school_id} if previous else {instance.school_id}
+
+
+@receiver(pre_save, sender=Student)
+@receiver(pre_save, sender=Guardian)
+@receiver(pre_save, sender=TeacherProfile)
+@receiver(pre_save, sender=SchoolClass)
+@receiver(pre_save, sender=Grade)
+def stash_stats_fields(sender, instance, raw=False, update_fields=None, **kwargs):
+    fields = STATS_TRACKED_FIELDS[sender]
+    instance._stats_previous = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    if update_fields is not None and not {field.removesuffix('_id') for field in fields} & {
+        field.removesuffix('_id') for field in update_fields
+    }:
+        # None of the tracked fields is being written: keep the current value as "previous"
+        instance._stats_previous = {field: getattr(instance, field) for field in fields}
+        return
+    instance._stats_previous = sender.objects.filter(pk=instance.pk).values(*fields).first()
+
+
+@receiver(post_save, sender=Student)
+def update_stats_on_student_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_stats_previous', None)
+    _active_delta(previous, instance, 'students')
+
+    if previous and previous['school_id'] != instance.school_id:
+        # Timeline posts follow the student to the new school
+        posts = instance.timeline.count()
+        SchoolStats.increment(previous['school_id'], timeline_posts=-posts)
+        SchoolStats.increment(instance.school_id, timeline_posts=posts)
+
+    if instance.current_class_id or previous and previous['current_class_id']:
+        if _changed(previous, instance, ('school_id', 'is_active', 'current_class_id')):
+            for school_id in _affected_schools(previous, instance):
+                SchoolStats.refresh_grade_breakdown(school_id)
+
+
+@receiver(post_delete, sender=Student)
+def update_stats_on_student_delete(sender, instance, **kwargs):
+    if instance.is_active:
+        SchoolStats.increment(instance.school_id, students=-1)
+        if instance.current_class_id:
+            SchoolStats.refresh_grade_breakdown(instance.school_id)
+
+
+@receiver(post_save, sender=Guardian)
+def update_stats_on_guardian_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_stats_previous', None)
+    if created:
+        SchoolStats.increment(instance.school_id, guardians=1)
+    elif previous and previous['school_id'] != instance.school_id:
+        SchoolStats.increment(previous['school_id'], guardians=-1)
+        SchoolStats.increment(instance.school_id, guardians=1)
+
+
+@receiver(post_delete, sender=Guardian)
+def update_stats_on_guardian_delete(sender, instance, **kwargs):
+    SchoolStats.increment(instance.school_id, guardians=-1)
+
+
+@receiver(post_save, sender=TeacherProfile)
+def update_stats_on_teacher_save(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        _active_delta(getattr(instance, '_stats_previous', None), instance, 'teachers')
+
+
+@receiver(post_delete, sender=TeacherProfile)
+def update_stats_on_teacher_delete(sender, instance, **kwargs):
+    if instance.is_active:
+        SchoolStats.increment(instance.school_id, teachers=-1)
+
+
+@receiver(post_save, sender=SchoolClass)
+def update_stats_on_class_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_stats_previous', None)
+    _active_delta(previous, instance, 'classes')
+    if not created and _changed(previous, instance, ('school_id', 'grade_id')):
+        for school_id in _affected_schools(previous, instance):
+            SchoolStats.refresh_grade_breakdown(school_id)
+
+
+@receiver(post_delete, sender=SchoolClass)
+def update_stats_on_class_delete(sender, instance, **kwargs):
+    if instance.is_active:
+        SchoolStats.increment(instance.school_id, classes=-1)
+    SchoolStats.refresh_grade_breakdown(instance.school_id)
+
+
+@receiver(post_save, sender=Grade)
+def update_stats_on_grade_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_stats_previous', None)
+    _active_delta(previous, instance, 'grades')
+    if _changed(previous, instance, STATS_TRACKED_FIELDS[Grade]):
+        for school_id in _affected_schools(previous, instance):
+            SchoolStats.refresh_grade_breakdown(school_id)
+
+
+@receiver(post_delete, sender=Grade)
+def update_stats_on_grade_delete(sender, instance, **kwargs):
+    if instance.is_active:
+        SchoolStats.increment(instance.school_id, grades=-1)
+    SchoolStats.refresh_grade_breakdown(instance.school_id)
+
+
+def _timeline_school_id(instance):
+    if 'student' in instance._state.fields_cache:
+        return instance.student.school_id
+    return Student.objects.filter(pk=instance.student_id).values_list('school_id', flat=True).first()
+
+
+@receiver(post_save, sender=StudentTimeline)
+def update_stats_on_timeline_save(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        SchoolStats.increment(_timeline_school_id(instance), timeline_posts=1)
+
+
+@receiver(post_delete, sender=StudentTimeline)
+def update_stats_on_timeline_delete(sender, instance, **kwargs):
+    SchoolStats.increment(_timeline_school_id(instance), timeline_posts=-1)
@@ -0,0 +1,113 @@
+# core/tenancy.py - Tenant (school) resolution for users
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from core import cache as shared_cache
+from core.cache import LocalLRUCache, make_key
+
+
+SchoolContext = namedtuple('SchoolContext', ['role', 'school_id', 'school'])
+
+EMPTY_CONTEXT = SchoolContext(None, None, None)
+
+ROLE_GUARDIAN = 'guardian'
+ROLE_TEACHER = 'teacher'
+ROLE_EMPLOYEE = 'employee'
+
+# Profile relations in resolution priority order (same order the middleware always used)
+PROFILE_RELATIONS = (
+    (ROLE_GUARDIAN, 'guardian'),
+    (ROLE_TEACHER, 'teacher_profile'),
+    (ROLE_EMPLOYEE, 'employee_profile'),
+)
+
+SHARED_CACHE_TIMEOUT = getattr(settings, 'TENANCY_CACHE_TIMEOUT', 300)
+LOCAL_CACHE_SIZE = getattr(settings, 'TENANCY_LOCAL_CACHE_SIZE', 1024)
+# Other workers only see invalidations through the shared cache, so local entries are short-lived
+LOCAL_CACHE_TTL = getattr(settings, 'TENANCY_LOCAL_CACHE_TTL', 30)
+
+_local_cache = LocalLRUCache(LOCAL_CACHE_SIZE, LOCAL_CACHE_TTL)
+
+
+def _cache_key(user_id):
+    # Not school-scoped: the school is what is being resolved
+    return make_key(None, 'tenancy', 'user', user_id)
+
+
+def resolve_school_context(user_id):
+    """
+    Resolve user -> (role, school_id, School) with a single joined query.
+    Bypasses every cache layer.
+    """
+    from accounts.models import User
+
+    user = (
+        User.objects
+        .select_related(*[f'{relation}__school' for _, relation in PROFILE_RELATIONS])
+        .filter(pk=user_id)
+        .first()
+    )
+    if user is None:
+        return EMPTY_CONTEXT
+
+    for role, relation in PROFILE_RELATIONS:
+        profile = getattr(user, relation, None)
+        if profile:
+            return SchoolContext(role, profile.school_id, profile.school)
+
+    return EMPTY_CONTEXT
+
+
+def get_school_context(user):
+    """
+    Get the tenant context for a user.
+    Lookup order: the user instance (per request), the process-local LRU,
+    the shared cache and finally the database.
+    """
+    if user is None or not getattr(user, 'is_authenticated', False):
+        return EMPTY_CONTEXT
+
+    context = getattr(user, '_school_context', None)
+    if context is not None:
+        return context
+
+    key = _cache_key(user.pk)
+    context = _local_cache.get(key)
+    if context is None:
+        # get_or_set: a burst of requests for the same user resolves it once
+        context = shared_cache.get_or_set(key, lambda: resolve_school_context(user.pk), SHARED_CACHE_TIMEOUT)
+        _local_cache.set(key, context)
+
+    user._school_context = context
+    return context
+
+
+def invalidate_school_context(*user_ids):
+    """Drop cached contexts for the given users (after the current transaction commits)"""
+    keys = [_cache_key(user_id) for user_id in user_ids if user_id]
+    if not keys:
+        return
+
+    def _invalidate():
+        for key in keys:
+            _local_cache.delete(key)
+        cache.delete_many(keys)
+
+    transaction.on_commit(_invalidate)
+
+
+def invalidate_school_users(school_id):
+    """Drop cached contexts for every user attached to a school"""
+    from accounts.models import TeacherProfile, EmployeeProfile
+    from core.models import Guardian
+
+    # order_by(): model orderings are not allowed inside a UNION on SQLite
+    user_ids = (
+        Guardian.objects.filter(school_id=school_id, user__isnull=False).order_by().values_list('user_id', flat=True)
+        .union(TeacherProfile.objects.filter(school_id=school_id).order_by().values_list('user_id', flat=True))
+        .union(EmployeeProfile.objects.filter(school_id=school_id).order_by().values_list('user_id', flat=True))
+    )
+    invalidate_school_context(*user_ids)
@@ -1,3 +1,335 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError
+from django.test import TestCase, override_settings, modify_settings
+from django.utils import timezone
+
+from core import cache as shared_cache
+from core import importing
+from core.codes import reserve_codes
+from core.models import School, Student, Guardian, GuardianStudent, ImportJob, StudentIdSequence
+from core.queries import QueryRecorder, QueryBudgetExceeded, query_budget
+from core import tenancy
+from core.tenancy import get_school_context
+
+HEADER = 'رقم القيد,الاسم الأول,اللقب,الجنس,الرقم الوطني,الاسم الأول (الولي),اللقب (الولي),هاتف الولي'
+
+
+class StudentIdSequenceTests(TestCase):
+    """Student IDs come from a per-school, per-year sequence"""
+
+    def setUp(self):
+        self.school = School.objects.create(name='مدرسة الاختبار')
+        self.prefix = StudentIdSequence.prefix(self.school, timezone.now().year)
+
+    def create_student(self, **fields):
+        return Student.objects.create(school=self.school, first_name='طالب', last_name='علي', sex='male', **fields)
+
+    def test_consecutive_ids(self):
+        first = self.create_student()
+        second = self.create_student()
+        self.assertEqual([first.student_id, second.student_id], [f'{self.prefix}0001', f'{self.prefix}0002'])
+
+    def test_allocate_block(self):
+        prefix, numbers = StudentIdSequence.allocate(self.school, 3)
+        self.assertEqual((prefix, list(numbers)), (self.prefix, [1, 2, 3]))
+        self.assertEqual(Student.reserve_student_ids(self.school, 2), [f'{self.prefix}0004', f'{self.prefix}0005'])
+
+    def test_new_sequence_starts_after_existing_ids(self):
+        # Students created before the sequence existed
+        Student.objects.bulk_create([
+            Student(school=self.school, first_name='طالب', last_name='علي', sex='male', student_id=f'{self.prefix}0041'),
+            Student(school=self.school, first_name='طالب', last_name='علي', sex='male', student_id='OTHER'),
+        ])
+        self.assertEqual(self.create_student().student_id, f'{self.prefix}0042')
+
+    def test_ids_entered_by_hand(self):
+        self.create_student()
+        self.create_student(student_id=f'{self.prefix}0010')
+        self.assertEqual(self.create_student().student_id, f'{self.prefix}0011')
+
+    def test_schools_are_independent(self):
+        other = School.objects.create(name='مدرسة أخرى')
+        self.create_student()
+        _, numbers = StudentIdSequence.allocate(other)
+        self.assertEqual(list(numbers), [1])
+
+
+class UniqueCodeTests(TestCase):
+    """save_with_unique_code retries taken codes; reserve_codes skips them"""
+
+    def test_taken_code_is_replaced(self):
+        School.objects.create(name='الأولى', code='AAAA0000')
+        with mock.patch('core.models.school_code', side_effect=['AAAA0000', 'BBBB1111']):
+            school = School.objects.create(name='الثانية')
+        self.assertEqual(school.code, 'BBBB1111')
+        self.assertEqual(School.objects.count(), 2)
+
+    def test_other_integrity_errors_are_raised(self):
+        school = School.objects.create(name='الأولى')
+        with self.assertRaises(IntegrityError):
+            School.objects.create(pk=school.pk, name='الثانية')
+
+    def test_reserve_codes(self):
+        school = School.objects.create(name='الأولى')
+        Guardian.objects.create(school=school, first_name='ولي', last_name='علي', code='G1')
+        codes = iter(['G1', 'G2', 'G2', 'G3'])
+        reserved = reserve_codes(Guardian, 'code', 2, lambda: next(codes))
+        self.assertEqual(sorted(reserved), ['G2', 'G3'])
+
+
+def sheet(*rows):
+    return '\n'.join((HEADER,) + rows).encode('utf-8')
+
+
+class ImportTestCase(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.school = School.objects.create(name='مدرسة الاختبار')
+
+    def create_job(self, content, dry_run=False, name='students.csv'):
+        return ImportJob.objects.create(
+            school=self.school, file=SimpleUploadedFile(name, content), file_name=name, dry_run=dry_run,
+        )
+
+
+class StudentImportTests(ImportTestCase):
+    """core.importing: previews, batched writes, resume and per-file deduplication"""
+
+    ROWS = (
+        'S1,أحمد,علي,ذكر,10000000001,محمد,علي,0911111111',
+        'S2,سارة,علي,أنثى,10000000002,محمد,علي,0911111111',
+        'S3,خالد,سالم,ذكر,,عمر,سالم,0922222222',
+        'S4,ليلى,سالم,أنثى,,,,',
+    )
+
+    def test_dry_run_writes_nothing(self):
+        job = importing.run_import(self.create_job(sheet(*self.ROWS), dry_run=True))
+        self.assertEqual(job.status, ImportJob.STATUS_COMPLETED)
+        self.assertEqual((job.created_students, job.created_guardians), (4, 2))
+        self.assertEqual(len(job.report['matched_guardians']), 1)
+        self.assertFalse(Student.objects.exists())
+        self.assertFalse(Guardian.objects.exists())
+
+    def test_confirm(self):
+        job = importing.run_import(self.create_job(sheet(*self.ROWS), dry_run=True))
+        importing.confirm_import(job)
+        self.assertEqual(job.status, ImportJob.STATUS_COMPLETED)
+        self.assertEqual(Student.objects.filter(school=self.school).count(), 4)
+        self.assertEqual(Guardian.objects.filter(school=self.school).count(), 2)
+        guardian = Guardian.objects.get(phone='0911111111')
+        self.assertEqual(guardian.students.count(), 2)
+        self.assertIsNotNone(guardian.selected_student_id)
+        self.assertTrue(guardian.code)
+
+    def test_resume_after_failed_batch(self):
+        job = self.create_job(sheet(*self.ROWS))
+        process_batch = importing._process_batch
+        calls = []
+
+        def fail_second_batch(*args):
+            calls.append(args)
+            if len(calls) == 2:
+                raise RuntimeError('database went away')
+            return process_batch(*args)
+
+        with mock.patch.object(importing, '_process_batch', fail_second_batch):
+            with self.assertRaises(RuntimeError):
+                importing.run_import(job, batch_size=2)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportJob.STATUS_FAILED)
+        self.assertEqual(job.processed_rows, 2)
+        self.assertEqual(Student.objects.count(), 2)
+
+        importing.run_import(job, batch_size=2)
+        self.assertEqual(job.status, ImportJob.STATUS_COMPLETED)
+        self.assertEqual(job.created_students, 4)
+        self.assertEqual(Student.objects.count(), 4)
+        self.assertEqual(Guardian.objects.count(), 2)
+
+    def test_duplicates_in_file(self):
+        job = self.create_job(sheet(
+            'S1,أحمد,علي,ذكر,10000000001,محمد,علي,0911111111',
+            'S9,أحمد,علي,ذكر,10000000001,محمد,علي,0911111111',
+            'S1,أحمد,علي,ذكر,,,,',
+            'S5,هدى,علي,أنثى,,محمد,علي,0911111111',
+        ))
+        importing.run_import(job, batch_size=1)
+        self.assertEqual(job.created_students, 2)
+        self.assertEqual(job.skipped_rows, 2)
+        self.assertEqual(Student.objects.count(), 2)
+        self.assertEqual(Guardian.objects.count(), 1)
+        self.assertEqual(GuardianStudent.objects.count(), 2)
+
+    def test_existing_students_are_skipped(self):
+        importing.run_import(self.create_job(sheet(*self.ROWS)))
+        job = importing.run_import(self.create_job(sheet(*self.ROWS)))
+        self.assertEqual((job.created_students, job.created_guardians, job.skipped_rows), (0, 0, 4))
+        self.assertEqual(len(job.report['existing_students']), 4)
+
+    def test_row_errors(self):
+        job = importing.run_import(self.create_job(sheet('S1,أحمد,,ذكر,123,,,', 'S2,سارة,علي,أنثى,,,,')))
+        self.assertEqual(job.created_students, 1)
+        self.assertEqual(job.errors[0]['row'], 1)
+        self.assertEqual(set(job.errors[0]['errors']), {'last_name', 'nid'})
+
+    def test_unreadable_file(self):
+        job = self.create_job(b'name,age\n', name='students.csv')
+        with self.assertRaises(importing.ImportFileError):
+            importing.run_import(job)
+
+
+class ImportQueueTests(ImportTestCase):
+    """Jobs are queued by the dashboard and claimed by run_import_worker"""
+
+    def test_claim(self):
+        first = self.create_job(sheet(*StudentImportTests.ROWS))
+        second = self.create_job(sheet(*StudentImportTests.ROWS))
+        self.assertEqual(importing.claim_import_job().pk, first.pk)
+        self.assertEqual(importing.claim_import_job().pk, second.pk)
+        self.assertIsNone(importing.claim_import_job())
+        first.refresh_from_db()
+        self.assertEqual(first.status, ImportJob.STATUS_RUNNING)
+
+    def test_confirm_preview(self):
+        job = importing.run_import(self.create_job(sheet(*StudentImportTests.ROWS), dry_run=True))
+        importing.queue_import(job, confirm=True)
+        self.assertEqual(job.status, ImportJob.STATUS_PENDING)
+        self.assertFalse(job.dry_run)
+        self.assertEqual(job.processed_rows, 0)
+
+        job = importing.claim_import_job()
+        importing.run_import(job)
+        self.assertEqual(Student.objects.count(), 4)
+
+    def test_stale_job(self):
+        job = self.create_job(sheet(*StudentImportTests.ROWS))
+        importing.claim_import_job()
+        ImportJob.objects.filter(pk=job.pk).update(
+            updated_at=timezone.now() - timedelta(seconds=importing.IMPORT_STALE_SECONDS + 1)
+        )
+        self.assertEqual(importing.fail_stale_imports(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportJob.STATUS_FAILED)
+
+        importing.queue_import(job)
+        self.assertEqual(importing.claim_import_job().pk, job.pk)
+
+
+class QueryInspectionTests(TestCase):
+    """QueryRecorder, query_budget and QueryInspectionMiddleware"""
+
+    def test_duplicates(self):
+        school = School.objects.create(name='مدرسة الاختبار')
+        for index in range(4):
+            Student.objects.create(school=school, first_name=f'طالب{index}', last_name='علي', sex='male')
+
+        with QueryRecorder() as recorder:
+            for student in Student.objects.all():
+                School.objects.get(pk=student.school_id)
+        self.assertEqual(recorder.count, 5)
+        (sql, count, origins), = recorder.duplicates()
+        self.assertEqual(count, 4)
+        self.assertIn('core/tests.py', origins[0])
+
+    @override_settings(QUERY_BUDGET_ENFORCE=True)
+    def test_budget_enforced(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            with query_budget(1):
+                School.objects.count()
+                School.objects.count()
+
+    def test_budget_logged_by_default(self):
+        with self.assertLogs('core.queries', level='WARNING'):
+            with query_budget(0):
+                School.objects.count()
+
+    @modify_settings(MIDDLEWARE={'prepend': 'core.middleware.QueryInspectionMiddleware'})
+    def test_middleware_headers(self):
+        response = self.client.get('/api/timeline/')
+        self.assertIn('X-Query-Count', response)
+        self.assertIn('X-Query-Time', response)
+        self.assertEqual(response['X-Query-Duplicates'], '0')
+
+
+class SharedCacheTests(TestCase):
+    """core.cache: school-scoped keys, tags and get_or_set"""
+
+    def setUp(self):
+        cache.clear()
+        tenancy._local_cache.clear()
+
+    def test_invalidate_school(self):
+        key = shared_cache.make_key(1, 'templates')
+        shared_cache.set_value(key, 'first')
+        shared_cache.set_value(shared_cache.make_key(2, 'templates'), 'second')
+
+        shared_cache.invalidate_school(1)
+        self.assertNotEqual(shared_cache.make_key(1, 'templates'), key)
+        self.assertIsNone(shared_cache.get(shared_cache.make_key(1, 'templates')))
+        self.assertEqual(shared_cache.get(shared_cache.make_key(2, 'templates')), 'second')
+
+    def test_invalidate_tags(self):
+        shared_cache.set_value('a', 1, tags=['x'])
+        shared_cache.set_value('b', 2, tags=['y'])
+        shared_cache.invalidate_tags('x')
+        self.assertIsNone(shared_cache.get('a', tags=['x']))
+        self.assertEqual(shared_cache.get('b', tags=['y']), 2)
+
+    def test_get_or_set_computes_once(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'value'
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(shared_cache.get_or_set('slow', compute)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual((len(calls), results), (1, ['value'] * 5))
+
+    def test_file_cache_lock(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.addCleanup(shutil.rmtree, directory + '.locks', ignore_errors=True)
+        caches = {'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory,
+        }}
+        with override_settings(CACHES=caches):
+            with shared_cache.lock('key') as first, shared_cache.lock('key') as second:
+                self.assertEqual((first, second), (True, False))
+                self.assertEqual(len(os.listdir(directory + '.locks')), 1)
+            with shared_cache.lock('key') as third:
+                self.assertTrue(third)
+            self.assertEqual(shared_cache.get_or_set('key', lambda: 'value'), 'value')
+
+    def test_school_context(self):
+        school = School.objects.create(name='مدرسة الاختبار')
+        user = get_user_model().objects.create_user(username='guardian', password='x')
+        Guardian.objects.create(school=school, first_name='ولي', last_name='علي', user=user)
+
+        self.assertEqual(get_school_context(user).school_id, school.pk)
+        # Fresh instance: served from the process and shared caches
+        user = get_user_model().objects.get(pk=user.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_school_context(user).school_id, school.pk)
@@ -20,6 +20,7 @@ urlpatterns = [
     path("guardians/", include(
         [
             path("", views.guardian_list, name="guardian_list"),
+            path("export/", views.guardian_export, name="guardian_export"),
             path("create/", views.guardian_create_form, name="guardian_create"),
             # path("<int:guardian_id>/students/", views.guardian_students, name="guardian_students"),
             path("guardians/<int:guardian_id>/", views.guardian_detail, name="guardian_detail"),
@@ -30,6 +31,9 @@ urlpatterns = [
 
     path("students/", include([
         path("", views.students_list, name="students_list"),
+        path("export/", views.students_export, name="students_export"),
+        path("import/", views.student_import, name="student_import"),
+        path("import/<int:job_id>/", views.student_import_job, name="student_import_job"),
         path("<int:student_id>/", views.student_detail, name="student_detail"),
         path("<int:student_id>/edit/", views.student_form, name="student_form"),
         path("<int:student_id>/add-guardian/", views.guardian_student_form, name="guardian_student_form"),
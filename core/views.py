@@ -11,15 +11,17 @@ from django.urls import reverse
 from django.utils import timezone
 from django_tables2 import RequestConfig
 
+from core.exports import export_response, export_url, EXPORT_CHUNK_SIZE
 from core.forms import (
     GuardianWithStudentForm, StudentForm, StudentTimelineForm,
     StudentSearchForm, GuardianStudentForm, GradeForm, SchoolClassForm,
-    AcademicYearForm, EmployeeForm, TeacherForm
+    AcademicYearForm, EmployeeForm, TeacherForm, BulkStudentUploadForm
 )
+from core.importing import queue_import
 from core.models import (
     School, Guardian, Student, GuardianStudent,
     StudentTimeline, StudentTimelineAttachment,
-    Grade, SchoolClass, AcademicYear
+    Grade, SchoolClass, AcademicYear, SchoolStats, ImportJob
 )
 from core.tables import (
     EmployeeTable, GuardianTable, GuardianStudentTable, StudentTable,
@@ -53,15 +55,14 @@ def dashboard(request):
     recent_activities = []
 
     if school:
-        # School-wide statistics
+        # School-wide statistics (one materialized row, see SchoolStats)
+        school_stats = SchoolStats.for_school(school)
         stats.update({
-            'students': school.students.filter(is_active=True).count(),
-            'guardians': school.guardians.count(),
-            'teachers': school.teachers.filter(is_active=True).count(),
-            'classes': school.classes.filter(is_active=True).count(),
-            'timeline_posts': StudentTimeline.objects.filter(
-                student__school=school
-            ).count(),
+            'students': school_stats.students,
+            'guardians': school_stats.guardians,
+            'teachers': school_stats.teachers,
+            'classes': school_stats.classes,
+            'timeline_posts': school_stats.timeline_posts,
         })
 
         # Recent timeline activities (last 7 days)
@@ -100,16 +101,7 @@ def dashboard(request):
         }
 
     # Grade breakdown for charts
-    grade_breakdown = []
-    if school:
-        grade_breakdown = list(
-            school.grades.filter(is_active=True)
-            .annotate(
-                student_count=Count('classes__students', filter=Q(classes__students__is_active=True))
-            )
-            .values('name', 'grade_type', 'student_count')
-            .order_by('grade_type', 'level')
-        )
+    grade_breakdown = school_stats.grade_breakdown if school else []
 
     context = {
         'stats': stats,
@@ -130,15 +122,8 @@ def dashboard(request):
 # GUARDIAN VIEWS
 # ==========================================
 
-@login_required
-def guardian_list(request):
-    """Enhanced guardian list with school context and search"""
-    school = getattr(request, 'school', None)
-
-    if not school and not request.user.is_superuser:
-        messages.error(request, 'لا يمكن الوصول إلى هذه الصفحة بدون تحديد المدرسة.')
-        return redirect('dashboard:dashboard')
-
+def _guardian_queryset(request, school):
+    """Guardians visible to the user, filtered by ?search= (shared by the list and its export)"""
     # Build queryset
     if request.user.is_superuser:
         queryset = Guardian.objects.all()
@@ -162,6 +147,20 @@ def guardian_list(request):
             Q(students__full_name__icontains=search_query)
         ).distinct()
 
+    return queryset, search_query
+
+
+@login_required
+def guardian_list(request):
+    """Enhanced guardian list with school context and search"""
+    school = getattr(request, 'school', None)
+
+    if not school and not request.user.is_superuser:
+        messages.error(request, 'لا يمكن الوصول إلى هذه الصفحة بدون تحديد المدرسة.')
+        return redirect('dashboard:dashboard')
+
+    queryset, search_query = _guardian_queryset(request, school)
+
     # Pagination
     paginator = Paginator(queryset, 20)
     page_number = request.GET.get('page')
@@ -194,6 +193,7 @@ def guardian_list(request):
                 {
                     'icon': 'bi bi-download',
                     'label': 'تصدير',
+                    'url': export_url('dashboard:guardian_export', request),
                     'color': 'btn-outline-secondary'
                 }
             ],
@@ -203,6 +203,25 @@ def guardian_list(request):
     return render(request, 'components/list.html', context)
 
 
+@login_required
+def guardian_export(request):
+    """Stream the filtered guardian list as CSV (or XLSX with ?format=xlsx)"""
+    school = getattr(request, 'school', None)
+
+    if not school and not request.user.is_superuser:
+        raise PermissionDenied('لا يمكن الوصول إلى هذه الصفحة بدون تحديد المدرسة.')
+
+    queryset, _ = _guardian_queryset(request, school)
+    rows = queryset.values_list(
+        'first_name', 'last_name', 'phone', 'email', 'nid', 'address', 'code',
+        'school__name', 'children_count', 'created_at__date',
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+    header = ['الاسم الأول', 'اللقب', 'الهاتف', 'البريد الإلكتروني', 'الرقم الوطني', 'عنوان السكن',
+              'كود التسجيل', 'المدرسة', 'عدد الأبناء', 'تاريخ الإنشاء']
+    return export_response(request, 'أولياء الأمور', header, rows)
+
+
 @login_required
 def guardian_create_form(request):
     """Enhanced guardian creation with school context"""
@@ -318,10 +337,8 @@ def guardian_detail(request, guardian_id: int):
 # STUDENT VIEWS
 # ==========================================
 
-@login_required
-def students_list(request):
-    """Enhanced students list with advanced filtering and school context"""
-    school = getattr(request, 'school', None)
+def _students_queryset(request, school):
+    """Active students visible to the user, filtered by StudentSearchForm (shared by the list and its export)"""
     user = request.user
 
     # Determine queryset based on user role
@@ -374,6 +391,17 @@ def students_list(request):
         if sex:
             queryset = queryset.filter(sex=sex)
 
+    return queryset, search_form, title
+
+
+@login_required
+def students_list(request):
+    """Enhanced students list with advanced filtering and school context"""
+    school = getattr(request, 'school', None)
+    user = request.user
+
+    queryset, search_form, title = _students_queryset(request, school)
+
     # Pagination
     paginator = Paginator(queryset, 25)
     page_number = request.GET.get('page')
@@ -406,11 +434,13 @@ def students_list(request):
                 {
                     'icon': 'bi bi-upload',
                     'label': 'رفع ملف',
+                    'url': reverse('dashboard:student_import'),
                     'color': 'btn-outline-primary'
-                } if user.is_staff else None,
+                } if user.is_staff and school else None,
                 {
                     'icon': 'bi bi-download',
                     'label': 'تصدير',
+                    'url': export_url('dashboard:students_export', request),
                     'color': 'btn-outline-secondary'
                 }
             ] if user.is_staff else [],
@@ -420,6 +450,92 @@ def students_list(request):
     return render(request, 'components/list.html', context)
 
 
+@login_required
+def students_export(request):
+    """Stream the filtered student list as CSV (or XLSX with ?format=xlsx)"""
+    if not request.user.is_staff:
+        raise PermissionDenied('ليس لديك صلاحية لتصدير الطلاب.')
+
+    queryset, _, _ = _students_queryset(request, getattr(request, 'school', None))
+    rows = queryset.values_list(
+        'student_id', 'full_name', 'sex', 'date_of_birth', 'place_of_birth', 'nid',
+        'current_class__grade__name', 'current_class__name', 'phone', 'email', 'address',
+        'enrollment_date', 'school__name',
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+    sexes = dict(Student._meta.get_field('sex').choices)
+    header = ['رقم القيد', 'الاسم الكامل', 'الجنس', 'تاريخ الميلاد', 'مكان الميلاد', 'الرقم الوطني',
+              'الصف', 'الفصل', 'رقم الهاتف', 'البريد الإلكتروني', 'عنوان السكن', 'تاريخ التسجيل', 'المدرسة']
+    rows = ((row[0], row[1], sexes.get(row[2], row[2])) + row[3:] for row in rows)
+    return export_response(request, 'الطلاب', header, rows)
+
+
+@login_required
+def student_import(request):
+    """Upload a student/guardian sheet; queued as a preview (dry run) unless unchecked"""
+    school = getattr(request, 'school', None)
+    if not school or not request.user.is_staff:
+        raise PermissionDenied('ليس لديك صلاحية لاستيراد الطلاب.')
+
+    form = BulkStudentUploadForm(request.POST or None, request.FILES or None, school=school)
+
+    if request.method == "POST" and form.is_valid():
+        upload = form.cleaned_data['file']
+        school_class = form.cleaned_data.get('school_class')
+        job = ImportJob.objects.create(
+            school=school,
+            file=upload,
+            file_name=upload.name,
+            dry_run=form.cleaned_data['dry_run'],
+            default_grade=form.cleaned_data.get('grade') or (school_class.grade if school_class else None),
+            default_class=school_class,
+            created_by=request.user,
+        )
+        messages.info(request, 'تمت إضافة الملف إلى قائمة الاستيراد، ستتحدث هذه الصفحة تلقائياً.')
+        return redirect('dashboard:student_import_job', job_id=job.id)
+
+    context = {
+        'form': form,
+        'submitButton': 'رفع',
+        'bar': {
+            'title': 'استيراد الطلاب',
+            'subtitle': f'استيراد الطلاب وأولياء الأمور من ملف إلى {school.name}',
+            'back': reverse('dashboard:students_list'),
+        },
+    }
+    return render(request, 'components/crispy.html', context)
+
+
+@login_required
+def student_import_job(request, job_id: int):
+    """Import report (polled while the job is queued or running); POST confirms a preview or resumes a failed import"""
+    school = getattr(request, 'school', None)
+    job = get_object_or_404(ImportJob.objects.select_related('school'), pk=job_id)
+    if not request.user.is_staff or (job.school_id != getattr(school, 'pk', None) and not request.user.is_superuser):
+        raise PermissionDenied('ليس لديك صلاحية لعرض عملية الاستيراد هذه.')
+
+    if request.method == "POST":
+        action = request.POST.get('action')
+        if action == 'confirm' and job.dry_run and job.status == ImportJob.STATUS_COMPLETED:
+            queue_import(job, confirm=True)
+            messages.info(request, 'تمت إضافة الاستيراد إلى قائمة الانتظار.')
+        elif action == 'resume' and job.status == ImportJob.STATUS_FAILED:
+            queue_import(job)
+            messages.info(request, 'تمت إضافة الاستئناف إلى قائمة الانتظار.')
+        return redirect('dashboard:student_import_job', job_id=job.id)
+
+    context = {
+        'job': job,
+        'in_progress': job.status in (ImportJob.STATUS_PENDING, ImportJob.STATUS_RUNNING),
+        'bar': {
+            'title': f'استيراد: {job.file_name}',
+            'subtitle': job.get_status_display(),
+            'back': reverse('dashboard:students_list'),
+        },
+    }
+    return render(request, 'pages/import_job.html', context)
+
+
 @login_required
 def student_detail(request, student_id: int):
     """Enhanced student detail view with comprehensive information and timeline"""
@@ -2143,17 +2259,11 @@ def school_detail(request, school_id):
         ).get(pk=school_id)
 
     # Statistics
-    stats = {
-        'total_students': school.students.filter(is_active=True).count(),
-        'total_teachers': school.teachers.filter(is_active=True).count(),
-        'total_employees': User.objects.filter(
-            Q(teacher_profile__school=school) | Q(employee_profile__school=school),
-            is_staff=True
-        ).count(),
-        'total_guardians': school.guardians.count(),
-        'total_grades': school.grades.filter(is_active=True).count(),
-        'total_classes': school.classes.filter(is_active=True).count(),
-    }
+    stats = SchoolStats.for_school(school).as_dict()
+    stats['total_employees'] = User.objects.filter(
+        Q(teacher_profile__school=school) | Q(employee_profile__school=school),
+        is_staff=True
+    ).count()
 
     # Grades with statistics
     grades = school.grades.filter(is_active=True).annotate(
@@ -101,6 +101,17 @@ MIDDLEWARE = [
     # "core.middleware.SchoolPermissionMiddleware",
 ]
 
+# Query count/N+1 instrumentation (core.queries), for development and CI only:
+# set QUERY_INSPECTION=1 locally; the test suite enables budget enforcement itself
+QUERY_INSPECTION = env.bool("QUERY_INSPECTION", default=False)
+# Maximum queries per request (None: no limit) and whether exceeding a budget raises
+QUERY_INSPECTION_BUDGET = env.int("QUERY_INSPECTION_BUDGET", default=None)
+QUERY_BUDGET_ENFORCE = env.bool("QUERY_BUDGET_ENFORCE", default=False)
+# A query repeated this many times in one request is reported as a possible N+1
+QUERY_INSPECTION_DUPLICATE_THRESHOLD = env.int("QUERY_INSPECTION_DUPLICATE_THRESHOLD", default=3)
+if QUERY_INSPECTION:
+    MIDDLEWARE.insert(0, "core.middleware.QueryInspectionMiddleware")
+
 ROOT_URLCONF = "rifid.urls"
 
 TEMPLATES = [
@@ -145,6 +156,74 @@ else:
     }
 
 
+# Cache
+# CACHE_BACKEND selects the shared cache used by every worker:
+#   "file"   - filesystem cache under CACHE_LOCATION (default, no external service)
+#   "redis"  - any local Redis-compatible server at CACHE_URL (requires the redis package)
+#   "locmem" - per-process memory, only for single-process development
+
+CACHE_BACKEND = env.str("CACHE_BACKEND", default="file")
+CACHE_KEY_PREFIX = env.str("CACHE_KEY_PREFIX", default="rifid")
+CACHE_TIMEOUT = env.int("CACHE_TIMEOUT", default=300)
+
+if CACHE_BACKEND == "redis":
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": env.str("CACHE_URL", default="redis://127.0.0.1:6379/1"),
+            "KEY_PREFIX": CACHE_KEY_PREFIX,
+            "TIMEOUT": CACHE_TIMEOUT,
+        }
+    }
+elif CACHE_BACKEND == "locmem":
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": CACHE_KEY_PREFIX,
+            "KEY_PREFIX": CACHE_KEY_PREFIX,
+            "TIMEOUT": CACHE_TIMEOUT,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": env.str("CACHE_LOCATION", default=str(BASE_DIR / ".cache")),
+            "KEY_PREFIX": CACHE_KEY_PREFIX,
+            "TIMEOUT": CACHE_TIMEOUT,
+            "OPTIONS": {
+                "MAX_ENTRIES": env.int("CACHE_MAX_ENTRIES", default=20000),
+            },
+        }
+    }
+
+
+# Push notifications
+# NOTIFICATION_TRANSPORT is the dotted path of the transport class; use
+# "survey.notifications.FakeTransport" to load-test without Firebase.
+
+NOTIFICATION_TRANSPORT = env.str("NOTIFICATION_TRANSPORT", default="survey.notifications.FCMTransport")
+NOTIFICATION_MAX_WORKERS = env.int("NOTIFICATION_MAX_WORKERS", default=8)
+NOTIFICATION_MAX_RETRIES = env.int("NOTIFICATION_MAX_RETRIES", default=3)
+NOTIFICATION_RETRY_BACKOFF = env.float("NOTIFICATION_RETRY_BACKOFF", default=0.5)
+
+
+# Survey answers storage: "eav" (AdditionalField rows), "document" (Response.answers) or "dual"
+SURVEY_RESPONSE_STORAGE = env.str("SURVEY_RESPONSE_STORAGE", default="eav")
+
+# Bucket width of the NUMBER field histograms in survey results
+SURVEY_HISTOGRAM_BUCKET = env.float("SURVEY_HISTOGRAM_BUCKET", default=1)
+
+# Rows written per transaction by the bulk student import (core.importing)
+STUDENT_IMPORT_BATCH_SIZE = env.int("STUDENT_IMPORT_BATCH_SIZE", default=500)
+# Seconds after which a running import that stopped saving progress is marked failed (run_import_worker)
+STUDENT_IMPORT_STALE_SECONDS = env.int("STUDENT_IMPORT_STALE_SECONDS", default=600)
+
+# Seconds the ETag/Last-Modified validators of polled API endpoints are cached (api.conditional, 0: not cached);
+# a change can be answered with 304 for that long
+API_VALIDATOR_CACHE_SECONDS = env.int("API_VALIDATOR_CACHE_SECONDS", default=5)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from survey.models import Template, TemplateField, AdditionalField
+from survey.models import Template, TemplateField, AdditionalField, NotificationOutbox, RecurringSchedule
 
 
 @admin.register(Template)
@@ -21,3 +21,16 @@ class TemplateFieldAdmin(admin.ModelAdmin):
 @admin.register(AdditionalField)
 class AdditionalFieldAdmin(admin.ModelAdmin):
     list_display = [x.name for x in AdditionalField._meta.fields]
+
+
+@admin.register(NotificationOutbox)
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    list_display = ['id', 'period', 'status', 'attempts', 'available_at', 'leased_until', 'lease_owner']
+    list_filter = ['status']
+    readonly_fields = ['distribution_ids', 'metrics', 'last_error']
+
+
+@admin.register(RecurringSchedule)
+class RecurringScheduleAdmin(admin.ModelAdmin):
+    list_display = ['template', 'school', 'frequency', 'next_due_date', 'last_period_end', 'last_run_at']
+    list_filter = ['frequency']
@@ -0,0 +1,205 @@
+# survey/analytics.py - Pre-aggregated survey results per period
+"""
+Results of a period are kept as counters instead of being recomputed from
+the stored answers on every view:
+    PeriodChoiceCount  - one row per (period, field, choice) of SELECT/RADIO/CHECKBOX fields
+    PeriodNumberStats  - count/sum/min/max and a histogram per (period, field) of NUMBER fields
+
+record_answers() is called in the same transaction as the response, so the
+counters stay exact. `manage.py rebuild_survey_results` recomputes them from
+the stored answers (after a backfill, or if they are ever suspected wrong).
+"""
+import math
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+
+# Width of the NUMBER histogram buckets
+HISTOGRAM_BUCKET = getattr(settings, 'SURVEY_HISTOGRAM_BUCKET', 1)
+
+
+def _choice_fields():
+    from survey.models import TemplateField
+    return (TemplateField.SELECT, TemplateField.RADIO, TemplateField.CHECKBOX)
+
+
+def _bucket(value):
+    return str(math.floor(value / HISTOGRAM_BUCKET) * HISTOGRAM_BUCKET)
+
+
+def _number(value):
+    if value in (None, ''):
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+
+def _choices(value):
+    if value in (None, '', []):
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(item) for item in value]
+    return [str(value)]
+
+
+class _Tally:
+    """Counters of a set of answers, written to the database with merge()"""
+
+    def __init__(self):
+        self.choices = defaultdict(int)  # (field_id, choice) -> count
+        self.numbers = {}  # field_id -> [count, total, minimum, maximum, histogram]
+
+    def add(self, fields, values):
+        from survey.models import TemplateField
+
+        for field in fields:
+            value = values.get(field.key)
+            if field.type in _choice_fields():
+                for choice in _choices(value):
+                    self.choices[(field.pk, choice)] += 1
+            elif field.type == TemplateField.NUMBER:
+                value = _number(value)
+                if value is None:
+                    continue
+                stats = self.numbers.setdefault(field.pk, [0, 0.0, value, value, defaultdict(int)])
+                stats[0] += 1
+                stats[1] += value
+                stats[2] = min(stats[2], value)
+                stats[3] = max(stats[3], value)
+                stats[4][_bucket(value)] += 1
+
+    def merge(self, period_id):
+        """Add the counters to the period's rows (run inside a transaction)"""
+        from survey.models import PeriodChoiceCount, PeriodNumberStats
+
+        if self.choices:
+            PeriodChoiceCount.objects.bulk_create(
+                [PeriodChoiceCount(period_id=period_id, field_id=field_id, choice=choice) for field_id, choice in self.choices],
+                ignore_conflicts=True,
+            )
+            for (field_id, choice), count in self.choices.items():
+                PeriodChoiceCount.objects.filter(period_id=period_id, field_id=field_id, choice=choice).update(
+                    count=F('count') + count
+                )
+
+        if self.numbers:
+            PeriodNumberStats.objects.bulk_create(
+                [PeriodNumberStats(period_id=period_id, field_id=field_id) for field_id in self.numbers],
+                ignore_conflicts=True,
+            )
+            # min/max/histogram can't be expressed as F() updates: lock the rows instead
+            rows = PeriodNumberStats.objects.select_for_update().filter(period_id=period_id, field_id__in=self.numbers)
+            for row in rows:
+                count, total, minimum, maximum, histogram = self.numbers[row.field_id]
+                row.count += count
+                row.total += total
+                row.minimum = minimum if row.minimum is None else min(row.minimum, minimum)
+                row.maximum = maximum if row.maximum is None else max(row.maximum, maximum)
+                for bucket, bucket_count in histogram.items():
+                    row.histogram[bucket] = row.histogram.get(bucket, 0) + bucket_count
+                row.save(update_fields=['count', 'total', 'minimum', 'maximum', 'histogram'])
+
+
+def record_answers(period_id, fields, cleaned_data):
+    """Count one response's answers in the results of its period"""
+    tally = _Tally()
+    tally.add(fields, cleaned_data)
+    with transaction.atomic():
+        tally.merge(period_id)
+
+
+def rebuild_period_results(period):
+    """Recompute the counters of a period from its stored answers. Returns the number of responses read."""
+    from survey.models import (
+        SurveyDistribution, Response, AdditionalField, PeriodChoiceCount, PeriodNumberStats,
+    )
+    from survey.schema import get_compiled_schema
+
+    fields = get_compiled_schema(period.survey).fields
+    response_ids = (
+        SurveyDistribution.objects.filter(period=period, response__isnull=False).values_list('response_id', flat=True)
+    )
+
+    tally = _Tally()
+    documents = Response.objects.filter(pk__in=response_ids, answers__isnull=False).values_list('answers', flat=True)
+    responses = 0
+    for answers in documents.iterator(chunk_size=2000):
+        tally.add(fields, answers)
+        responses += 1
+
+    # Responses still stored as AdditionalField rows
+    by_response = defaultdict(dict)
+    rows = (
+        AdditionalField.objects
+        .filter(response_id__in=response_ids, response__answers__isnull=True, parent__isnull=True, field__isnull=False)
+        .values_list('response_id', 'field__key', 'value')
+    )
+    for response_id, key, value in rows.iterator(chunk_size=2000):
+        by_response[response_id][key] = value
+    for answers in by_response.values():
+        tally.add(fields, answers)
+    responses += len(by_response)
+
+    with transaction.atomic():
+        PeriodChoiceCount.objects.filter(period=period).delete()
+        PeriodNumberStats.objects.filter(period=period).delete()
+        tally.merge(period.pk)
+    return responses
+
+
+def period_results(period):
+    """
+    Results of a period for display, one dict per reportable field in field order:
+        {key, name, type, choices: [{choice, count, percent}]}            (choice fields)
+        {key, name, type, count, average, minimum, maximum, histogram}    (NUMBER fields)
+    Choice percents are relative to the number of completed distributions (period.completed_count).
+    """
+    from survey.models import TemplateField
+    from survey.schema import get_compiled_schema
+
+    completed = period.completed_count
+    choice_counts = defaultdict(dict)
+    for field_id, choice, count in period.choice_counts.values_list('field_id', 'choice', 'count'):
+        choice_counts[field_id][choice] = count
+    number_stats = {row.field_id: row for row in period.number_stats.all()}
+
+    results = []
+    for field in get_compiled_schema(period.survey).fields:
+        if field.type in _choice_fields():
+            counts = choice_counts.get(field.pk, {})
+            # Declared choices first, then values of choices removed since
+            choices = [str(choice) for choice in (field.value or ())]
+            choices += sorted(choice for choice in counts if choice not in choices)
+            results.append({
+                'key': field.key,
+                'name': field.name,
+                'type': field.type,
+                'choices': [
+                    {
+                        'choice': choice,
+                        'count': counts.get(choice, 0),
+                        'percent': round(counts.get(choice, 0) * 100 / completed, 1) if completed else 0,
+                    }
+                    for choice in choices
+                ],
+            })
+        elif field.type == TemplateField.NUMBER:
+            stats = number_stats.get(field.pk)
+            histogram = sorted(((float(bucket), count) for bucket, count in stats.histogram.items())) if stats else []
+            results.append({
+                'key': field.key,
+                'name': field.name,
+                'type': field.type,
+                'count': stats.count if stats else 0,
+                'average': stats.average if stats else None,
+                'minimum': stats.minimum if stats else None,
+                'maximum': stats.maximum if stats else None,
+                'histogram': [{'bucket': bucket, 'count': count} for bucket, count in histogram],
+            })
+    return results
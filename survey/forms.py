@@ -172,3 +172,27 @@ class TemplateFieldForm(forms.ModelForm):
             ),
 
         )
+
+
+class PeriodFilterForm(forms.Form):
+    """Date range filter of the survey periods page (by start date)"""
+
+    date_from = forms.DateField(
+        label="من تاريخ",
+        required=False,
+        widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'})
+    )
+    date_to = forms.DateField(
+        label="إلى تاريخ",
+        required=False,
+        widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'})
+    )
+
+    def filter(self, queryset):
+        if not self.is_valid():
+            return queryset
+        if self.cleaned_data.get('date_from'):
+            queryset = queryset.filter(start_date__gte=self.cleaned_data['date_from'])
+        if self.cleaned_data.get('date_to'):
+            queryset = queryset.filter(start_date__lte=self.cleaned_data['date_to'])
+        return queryset
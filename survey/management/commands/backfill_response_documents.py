@@ -0,0 +1,82 @@
+"""
+Management command to copy survey answers from AdditionalField rows into Response.answers
+
+Usage:
+    python manage.py backfill_response_documents
+    python manage.py backfill_response_documents --batch-size 500 --prune
+
+Only responses without a document are processed, so the command can be
+interrupted and run again. --prune deletes the top-level AdditionalField
+rows of each converted response (use once SURVEY_RESPONSE_STORAGE is
+"document").
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from survey.models import Response, AdditionalField, TemplateField
+
+
+class Command(BaseCommand):
+    help = 'Backfill Response.answers documents from AdditionalField rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Responses converted per transaction (default: 1000)'
+        )
+        parser.add_argument(
+            '--prune', action='store_true',
+            help='Delete the AdditionalField rows of converted responses'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Count the responses that would be converted'
+        )
+
+    def handle(self, *args, **options):
+        pending = Response.objects.filter(answers__isnull=True)
+
+        if options['dry_run']:
+            self.stdout.write(f'{pending.count()} responses would be converted')
+            return
+
+        batch_size = options['batch_size']
+        converted = 0
+        pruned = 0
+        last_id = 0
+
+        while True:
+            ids = list(
+                pending.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            last_id = ids[-1]
+
+            documents = {pk: {} for pk in ids}
+            rows = (
+                AdditionalField.objects
+                .filter(response_id__in=ids, parent__isnull=True)
+                .exclude(type=TemplateField.FORM)
+                .values_list('response_id', 'field__key', 'name', 'value')
+                .order_by('response_id', 'row', 'id')
+            )
+            for response_id, key, name, value in rows:
+                # Answers of deleted fields are kept under their label
+                documents[response_id][key or name] = value
+
+            responses = [Response(pk=pk, answers=document) for pk, document in documents.items()]
+            with transaction.atomic():
+                Response.objects.bulk_update(responses, ['answers'])
+                if options['prune']:
+                    pruned += AdditionalField.objects.filter(
+                        response_id__in=ids, parent__isnull=True
+                    ).exclude(type=TemplateField.FORM).delete()[0]
+
+            converted += len(ids)
+            self.stdout.write(f'  {converted} responses converted')
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Converted {converted} responses' + (f', pruned {pruned} rows' if options['prune'] else ''))
+        )
@@ -0,0 +1,114 @@
+"""
+Management command comparing survey submission validators
+
+Usage:
+    python manage.py benchmark_survey_validation
+    python manage.py benchmark_survey_validation --fields 50 --iterations 5000
+
+Builds an in-memory template (nothing is written to the database) and
+validates the same payloads with Template.build_django_form and with the
+compiled validator of survey.validation, checking that both return the
+same errors.
+"""
+
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from survey.models import Template, TemplateField, Response
+from survey.validation import SubmissionValidator
+
+
+FIELD_TYPES = [
+    TemplateField.TEXT, TemplateField.TEXTAREA, TemplateField.NUMBER, TemplateField.SELECT,
+    TemplateField.CHECKBOX, TemplateField.RADIO, TemplateField.DATE,
+]
+CHOICES = ['ممتاز', 'جيد', 'مقبول', 'ضعيف']
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the compiled survey validator against build_django_form'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fields', type=int, default=50, help='Number of template fields (default: 50)')
+        parser.add_argument('--iterations', type=int, default=2000, help='Validations per payload (default: 2000)')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed (default: 1)')
+
+    def build_template(self, count, rng):
+        template = Template(name='benchmark', type=Template.FOOD)
+        fields = []
+        for index in range(count):
+            field_type = FIELD_TYPES[index % len(FIELD_TYPES)]
+            fields.append(TemplateField(
+                key=f'f{index:011d}',
+                template=template,
+                name=f'حقل {index}',
+                type=field_type,
+                order=index + 1,
+                is_public=True,
+                is_required=rng.random() < 0.5,
+                value=CHOICES if field_type in (TemplateField.SELECT, TemplateField.CHECKBOX, TemplateField.RADIO) else None,
+            ))
+        return template, fields
+
+    def valid_value(self, field, rng):
+        if field.type == TemplateField.NUMBER:
+            return rng.randint(0, 100)
+        if field.type in (TemplateField.SELECT, TemplateField.RADIO):
+            return rng.choice(CHOICES)
+        if field.type == TemplateField.CHECKBOX:
+            return rng.sample(CHOICES, 2)
+        if field.type == TemplateField.DATE:
+            return '2025-01-15'
+        return 'نص تجريبي'
+
+    def invalid_value(self, field, rng):
+        if field.type == TemplateField.NUMBER:
+            return 'abc'
+        if field.type in (TemplateField.SELECT, TemplateField.RADIO, TemplateField.CHECKBOX):
+            return 'غير موجود' if field.type != TemplateField.CHECKBOX else ['غير موجود']
+        if field.type == TemplateField.DATE:
+            return '15/15/2025'
+        return ''
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        template, fields = self.build_template(options['fields'], rng)
+        ticket = Response(template=template)
+
+        valid = {field.key: self.valid_value(field, rng) for field in fields}
+        invalid = {field.key: self.invalid_value(field, rng) for field in fields}
+        mixed = {key: (valid if rng.random() < 0.8 else invalid)[key] for key in valid}
+        payloads = {'valid': valid, 'invalid': invalid, 'mixed': mixed}
+
+        validator = SubmissionValidator(template, fields, is_public=True)
+
+        def django_validate(data):
+            form = template.build_django_form(ticket=ticket, data=data, is_public=True, fields=fields)
+            form.is_valid()
+            return form.cleaned_data, {key: list(errors) for key, errors in form.errors.items()}
+
+        # Same behaviour first
+        for name, data in payloads.items():
+            django_cleaned, django_errors = django_validate(data)
+            cleaned, errors = validator.validate(data)
+            if django_errors != errors or (not errors and django_cleaned != cleaned):
+                raise CommandError(f'Validators disagree on the "{name}" payload:\n{django_errors}\n{errors}')
+
+        self.stdout.write(
+            f'{len(fields)} fields, {options["iterations"]} iterations per payload (results identical)'
+        )
+        self.stdout.write(f'{"payload":<10}{"django form (µs)":>20}{"compiled (µs)":>18}{"speedup":>10}')
+
+        for name, data in payloads.items():
+            timings = []
+            for validate in (django_validate, validator.validate):
+                started = time.perf_counter()
+                for _ in range(options['iterations']):
+                    validate(data)
+                timings.append((time.perf_counter() - started) / options['iterations'] * 1e6)
+
+            self.stdout.write(
+                f'{name:<10}{timings[0]:>20.1f}{timings[1]:>18.1f}{timings[0] / timings[1]:>9.1f}x'
+            )
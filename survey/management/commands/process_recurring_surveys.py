@@ -4,17 +4,39 @@ Run daily via cron to create new survey periods for recurring surveys
 
 Usage:
     python manage.py process_recurring_surveys
+    python manage.py process_recurring_surveys --workers 8
+    python manage.py process_recurring_surveys --since 2025-01-01   # one period per missed cycle since then
 
 Add to crontab:
     0 1 * * * cd /path/to/project && /path/to/venv/bin/python manage.py process_recurring_surveys
+
+Overlapping runs are safe: on PostgreSQL a second run exits immediately
+(advisory lock), and on every database each schedule is advanced with a
+compare-and-set in the same transaction as its new period.
 """
 
-from django.core.management.base import BaseCommand
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connection, connections
 from django.utils import timezone
-from datetime import datetime, timedelta
-from survey.models import Template, SurveyPeriod
-from survey.services import create_survey_distribution, send_survey_notifications
-from core.models import School
+
+from survey.models import RecurringSchedule
+from survey.scheduling import due_schedules, run_school_schedules, sync_schedules
+
+
+# Arbitrary application-wide key for pg_try_advisory_lock
+ADVISORY_LOCK_KEY = 724_310_001
+
+
+def _init_worker():
+    # Needed when the platform spawns instead of forking
+    import django
+    django.setup()
 
 
 class Command(BaseCommand):
@@ -26,134 +48,113 @@ class Command(BaseCommand):
             action='store_true',
             help='Show what would be done without actually creating periods',
         )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Number of worker processes; schools are spread across them (default: 1)',
+        )
+        parser.add_argument(
+            '--since', type=date.fromisoformat,
+            help='Catch-up mode: also create periods for cycles that started on or after this date (YYYY-MM-DD)',
+        )
+
+    @contextmanager
+    def run_lock(self):
+        """Prevent overlapping runs (PostgreSQL only; other databases rely on the per-schedule CAS)"""
+        if connection.vendor != 'postgresql':
+            yield True
+            return
+
+        # The lock is held by a session of its own: run_due closes the shared
+        # connections before forking, which would release it mid-run
+        lock_connection = connections.create_connection(DEFAULT_DB_ALIAS)
+        try:
+            with lock_connection.cursor() as cursor:
+                cursor.execute('SELECT pg_try_advisory_lock(%s)', [ADVISORY_LOCK_KEY])
+                acquired = cursor.fetchone()[0]
+            yield acquired
+        finally:
+            # Ending the session releases the lock
+            lock_connection.close()
 
     def handle(self, *args, **options):
         dry_run = options['dry_run']
+        since = options['since']
         today = timezone.now().date()
+        if since and since > today:
+            raise CommandError('--since cannot be in the future')
 
         self.stdout.write(self.style.SUCCESS(f'Processing recurring surveys for {today}'))
 
-        # Get all active recurring surveys (not "once")
-        recurring_surveys = Template.objects.exclude(
-            send_frequency=Template.FREQ_ONCE
-        ).filter(
-            type=Template.FOOD
-        )
+        with self.run_lock() as acquired:
+            if not acquired:
+                self.stdout.write(self.style.WARNING('Another run is in progress, exiting.'))
+                return
 
-        total_processed = 0
-        total_created = 0
-        total_distributions = 0
+            if dry_run:
+                self.show_due(today)
+                self.stdout.write(self.style.WARNING('  (DRY RUN - No changes made)'))
+                return
 
-        for survey in recurring_surveys:
-            total_processed += 1
+            created, deleted, updated = sync_schedules(today)
+            self.stdout.write(f'  Schedules: {created} created, {deleted} removed, {updated} updated')
 
-            # Check if this survey needs a new period
-            should_create, reason = self.should_create_new_period(survey, today)
+            results = self.run_due(today, since, options['workers'])
 
-            if should_create:
-                self.stdout.write(
-                    self.style.WARNING(f'  → {survey.name} needs new period: {reason}')
-                )
+        self.print_summary(results)
 
-                if not dry_run:
-                    # Determine schools to send to
-                    if survey.is_builtin:
-                        # Send to all schools
-                        schools = School.objects.filter(is_active=True)
-                    else:
-                        # Send to specific school
-                        schools = [survey.school] if survey.school else []
-
-                    for school in schools:
-                        try:
-                            period, distributions = create_survey_distribution(
-                                survey=survey,
-                                school=school,
-                                sent_by=survey.created_by,  # System-generated
-                                start_date=today
-                            )
-
-                            dist_count = len(distributions)
-                            total_distributions += dist_count
-
-                            self.stdout.write(
-                                self.style.SUCCESS(
-                                    f'    ✓ Created period for {school.name if school else "Global"}: '
-                                    f'{dist_count} distributions'
-                                )
-                            )
-
-                            # Send notifications
-                            send_survey_notifications(distributions)
-
-                            total_created += 1
-
-                        except Exception as e:
-                            self.stdout.write(
-                                self.style.ERROR(f'    ✗ Error creating period for {school.name}: {e}')
-                            )
-                else:
-                    self.stdout.write(
-                        self.style.NOTICE(f'    (Dry run - skipping)')
-                    )
-            else:
-                self.stdout.write(
-                    f'  • {survey.name}: {reason}'
+    def show_due(self, today):
+        # Dry runs don't sync, so only existing schedules are listed
+        schedules = (
+            RecurringSchedule.objects.filter(next_due_date__lte=today)
+            .select_related('template', 'school')
+            .order_by('school_id', 'pk')
+        )
+        for schedule in schedules:
+            self.stdout.write(
+                self.style.WARNING(
+                    f'  → {schedule.template.name} / {schedule.school.name}: due {schedule.next_due_date}'
                 )
+            )
+
+    def run_due(self, today, since, workers):
+        by_school = defaultdict(list)
+        for schedule_id, school_id in due_schedules(today):
+            by_school[school_id].append(schedule_id)
+
+        self.stdout.write(f'  Due: {sum(len(ids) for ids in by_school.values())} schedules in {len(by_school)} schools')
+
+        if workers <= 1 or len(by_school) <= 1:
+            results = []
+            for schedule_ids in by_school.values():
+                results.extend(run_school_schedules(schedule_ids, today, since))
+            return results
+
+        # Forked workers must not share the parent's database connections
+        connections.close_all()
+        context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else None)
+        results = []
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker) as executor:
+            futures = [
+                executor.submit(run_school_schedules, schedule_ids, today, since)
+                for schedule_ids in by_school.values()
+            ]
+            for future in futures:
+                results.extend(future.result())
+        return results
+
+    def print_summary(self, results):
+        counts = defaultdict(int)
+        for result in results:
+            counts[result['status']] += 1
+            if result['status'] == 'error':
+                self.stdout.write(self.style.ERROR(f'    ✗ Schedule {result["schedule"]}: {result["error"]}'))
 
-        # Summary
         self.stdout.write('')
         self.stdout.write(self.style.SUCCESS('=' * 60))
-        self.stdout.write(self.style.SUCCESS(f'Summary:'))
-        self.stdout.write(f'  Surveys processed: {total_processed}')
-        self.stdout.write(f'  New periods created: {total_created}')
-        self.stdout.write(f'  Total distributions: {total_distributions}')
-        if dry_run:
-            self.stdout.write(self.style.WARNING('  (DRY RUN - No changes made)'))
+        self.stdout.write(self.style.SUCCESS('Summary:'))
+        self.stdout.write(f'  New periods created: {sum(result["periods"] for result in results)}')
+        self.stdout.write(f'  Rescheduled (missed cycles): {counts["rescheduled"]}')
+        self.stdout.write(f'  Skipped (already processed): {counts["skipped"]}')
+        self.stdout.write(f'  Errors: {counts["error"]}')
+        self.stdout.write(f'  Total distributions: {sum(result["distributions"] for result in results)}')
         self.stdout.write(self.style.SUCCESS('=' * 60))
-
-    def should_create_new_period(self, survey, today):
-        """
-        Determine if a new period should be created for this survey
-
-        Returns:
-            tuple: (bool, str) - (should_create, reason)
-        """
-        # Get latest period for this survey
-        latest_period = survey.periods.order_by('-start_date').first()
-
-        if not latest_period:
-            return True, "No existing period found"
-
-        # Check if current period is expired
-        if not latest_period.is_expired:
-            days_remaining = (latest_period.end_date - today).days
-            return False, f"Current period still active ({days_remaining} days remaining)"
-
-        # Period is expired, check if we should create new one based on frequency
-        if survey.send_frequency == Template.FREQ_WEEKLY:
-            # Create new period on Monday
-            if today.weekday() == 0:  # Monday
-                return True, "New week started (Monday)"
-            return False, f"Waiting for Monday (today is {today.strftime('%A')})"
-
-        elif survey.send_frequency == Template.FREQ_MONTHLY:
-            # Create new period on 1st of month
-            if today.day == 1:
-                return True, "New month started"
-            return False, f"Waiting for 1st of month (today is day {today.day})"
-
-        elif survey.send_frequency == Template.FREQ_QUARTERLY:
-            # Create new period on 1st of quarter (Jan, Apr, Jul, Oct)
-            if today.day == 1 and today.month in [1, 4, 7, 10]:
-                return True, f"New quarter started ({today.strftime('%B')})"
-            return False, "Waiting for start of quarter"
-
-        elif survey.send_frequency == Template.FREQ_YEARLY:
-            # Create new period on academic year start
-            # Assuming September 1st - can be configured per school
-            if today.day == 1 and today.month == 9:
-                return True, "New academic year started"
-            return False, "Waiting for academic year start (Sep 1)"
-
-        return False, "Unknown frequency"
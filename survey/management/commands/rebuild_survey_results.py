@@ -0,0 +1,38 @@
+"""
+Management command to recompute the pre-aggregated results of survey periods
+
+Usage:
+    python manage.py rebuild_survey_results
+    python manage.py rebuild_survey_results --period 12 --period 13
+
+Counters are normally updated with each response (see survey.analytics);
+rebuild after importing or backfilling answers, or to repair them.
+"""
+
+from django.core.management.base import BaseCommand
+
+from survey.analytics import rebuild_period_results
+from survey.models import SurveyPeriod
+
+
+class Command(BaseCommand):
+    help = 'Recompute per-choice counts and number statistics of survey periods'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--period', type=int, action='append', dest='periods',
+            help='Period id to rebuild (repeatable; default: all periods)'
+        )
+
+    def handle(self, *args, **options):
+        periods = SurveyPeriod.objects.select_related('survey').order_by('pk')
+        if options['periods']:
+            periods = periods.filter(pk__in=options['periods'])
+
+        total = 0
+        for period in periods.iterator():
+            responses = rebuild_period_results(period)
+            total += 1
+            self.stdout.write(f'  Period {period.pk}: {responses} responses')
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt results of {total} periods'))
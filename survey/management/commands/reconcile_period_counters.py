@@ -0,0 +1,38 @@
+"""
+Management command to repair the distribution counters of survey periods
+
+Usage:
+    python manage.py reconcile_period_counters
+    python manage.py reconcile_period_counters --period 12 --period 13
+
+Counters are updated when distributions are written and answered (see
+SurveyPeriod.increment); distributions deleted with a student or user are
+not subtracted, so run this periodically (or after bulk deletes).
+"""
+
+from django.core.management.base import BaseCommand
+
+from survey.models import SurveyPeriod
+
+
+class Command(BaseCommand):
+    help = 'Recount total/completed distributions of survey periods and fix drifted counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--period', type=int, action='append', dest='periods',
+            help='Period id to reconcile (repeatable; default: all periods)'
+        )
+
+    def handle(self, *args, **options):
+        periods = SurveyPeriod.objects.all()
+        if options['periods']:
+            periods = periods.filter(pk__in=options['periods'])
+
+        fixed = SurveyPeriod.reconcile(periods)
+        for period in fixed:
+            self.stdout.write(
+                f'  Period {period.pk}: total={period.total_count} completed={period.completed_count}'
+            )
+
+        self.stdout.write(self.style.SUCCESS(f'Reconciled {len(fixed)} periods'))
@@ -0,0 +1,106 @@
+"""
+Management command to drain the survey notification outbox
+
+Usage:
+    python manage.py run_notification_worker             # run forever
+    python manage.py run_notification_worker --once      # drain and exit
+    python manage.py run_notification_worker --threads 4
+
+Several workers (processes or hosts) can run at the same time: each outbox
+row is leased by one worker, and rows whose lease expired (crashed worker)
+are picked up again.
+"""
+
+import os
+import socket
+import threading
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from survey.notifications import NotificationDispatcher
+from survey.outbox import LEASE_SECONDS, claim_entries, process_entry
+
+
+class Command(BaseCommand):
+    help = 'Send queued survey notifications from the notification outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads', type=int, default=1,
+            help='Number of outbox rows processed concurrently by this worker (default: 1)'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Exit when the outbox is empty instead of polling'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=2.0,
+            help='Seconds to wait between polls when the outbox is empty (default: 2)'
+        )
+        parser.add_argument(
+            '--lease-seconds', type=int, default=LEASE_SECONDS,
+            help=f'Visibility timeout of a leased row (default: {LEASE_SECONDS})'
+        )
+
+    def handle(self, *args, **options):
+        worker_id = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.stdout.write(self.style.SUCCESS(f'Notification worker {worker_id} started'))
+
+        self.stop = threading.Event()
+        self.totals = {'processed': 0, 'failed': 0}
+        self.lock = threading.Lock()
+
+        threads = [
+            threading.Thread(
+                target=self.run_loop,
+                args=(f'{worker_id}/{index}', options),
+                daemon=True,
+            )
+            for index in range(max(1, options['threads']))
+        ]
+        for thread in threads:
+            thread.start()
+
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(timeout=1)
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('Stopping after current entries...'))
+            self.stop.set()
+            for thread in threads:
+                thread.join()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Processed {self.totals["processed"]} outbox entries ({self.totals["failed"]} failed)'
+            )
+        )
+
+    def run_loop(self, owner, options):
+        dispatcher = NotificationDispatcher()
+        try:
+            while not self.stop.is_set():
+                close_old_connections()
+                entries = claim_entries(owner, limit=1, lease_seconds=options['lease_seconds'])
+                if not entries:
+                    if options['once']:
+                        return
+                    self.stop.wait(options['poll_interval'])
+                    continue
+
+                for entry in entries:
+                    started = time.monotonic()
+                    ok = process_entry(entry, owner, dispatcher=dispatcher)
+                    with self.lock:
+                        self.totals['processed'] += 1
+                        self.totals['failed'] += 0 if ok else 1
+                    self.stdout.write(
+                        f'  {"✓" if ok else "✗"} entry {entry.pk}: '
+                        f'{len(entry.distribution_ids)} distributions in {time.monotonic() - started:.2f}s'
+                    )
+        finally:
+            connection.close()
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.6 on 2026-10-16 19:38
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey', '0005_surveyperiod_surveydistribution_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('distribution_ids', models.JSONField(default=list, verbose_name='معرفات التوزيعات')),
+                ('status', models.CharField(choices=[('pending', 'في الانتظار'), ('processing', 'قيد الإرسال'), ('sent', 'تم الإرسال'), ('failed', 'فشل')], default='pending', max_length=16, verbose_name='الحالة')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='عدد المحاولات')),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='متاح للإرسال من')),
+                ('leased_until', models.DateTimeField(blank=True, null=True, verbose_name='محجوز حتى')),
+                ('lease_owner', models.CharField(blank=True, default='', max_length=64, verbose_name='العامل الحاجز')),
+                ('last_error', models.TextField(blank=True, default='', verbose_name='آخر خطأ')),
+                ('metrics', models.JSONField(blank=True, null=True, verbose_name='إحصائيات الإرسال')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاريخ الإنشاء')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='تاريخ التعديل')),
+                ('period', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notification_outbox', to='survey.surveyperiod', verbose_name='الفترة')),
+            ],
+            options={
+                'verbose_name': 'إشعار في قائمة الانتظار',
+                'verbose_name_plural': 'قائمة انتظار الإشعارات',
+                'ordering': ['available_at', 'id'],
+                'indexes': [models.Index(fields=['status', 'available_at'], name='survey_noti_status_d3bac6_idx'), models.Index(fields=['status', 'leased_until'], name='survey_noti_status_72b277_idx')],
+            },
+        ),
+    ]
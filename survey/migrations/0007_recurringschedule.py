@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-16 19:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_schoolstats'),
+        ('survey', '0006_notificationoutbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurringSchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('frequency', models.CharField(choices=[('once', 'مرة واحدة (يدوي)'), ('weekly', 'أسبوعي'), ('monthly', 'شهري'), ('quarterly', 'كل 3 أشهر'), ('yearly', 'سنوي')], max_length=20, verbose_name='تكرار الإرسال')),
+                ('next_due_date', models.DateField(verbose_name='تاريخ الاستحقاق القادم')),
+                ('last_period_end', models.DateField(blank=True, null=True, verbose_name='نهاية آخر فترة')),
+                ('last_run_at', models.DateTimeField(blank=True, null=True, verbose_name='آخر تشغيل')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاريخ الإنشاء')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='تاريخ التعديل')),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='survey_schedules', to='core.school', verbose_name='المدرسة')),
+                ('template', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='schedules', to='survey.template', verbose_name='الاستطلاع')),
+            ],
+            options={
+                'verbose_name': 'جدولة استطلاع متكرر',
+                'verbose_name_plural': 'جدولة الاستطلاعات المتكررة',
+                'indexes': [models.Index(fields=['next_due_date'], name='survey_recu_next_du_8f0f62_idx')],
+                'unique_together': {('template', 'school')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-16 19:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey', '0007_recurringschedule'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='response',
+            name='answers',
+            field=models.JSONField(blank=True, default=None, null=True, verbose_name='الإجابات'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.6 on 2026-10-16 19:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey', '0008_response_answers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PeriodChoiceCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('choice', models.CharField(max_length=255, verbose_name='الخيار')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='العدد')),
+                ('field', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='choice_counts', to='survey.templatefield', verbose_name='الحقل')),
+                ('period', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='choice_counts', to='survey.surveyperiod', verbose_name='الفترة')),
+            ],
+            options={
+                'verbose_name': 'عدد اختيارات',
+                'verbose_name_plural': 'أعداد الاختيارات',
+                'unique_together': {('period', 'field', 'choice')},
+            },
+        ),
+        migrations.CreateModel(
+            name='PeriodNumberStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='عدد الإجابات')),
+                ('total', models.FloatField(default=0, verbose_name='المجموع')),
+                ('minimum', models.FloatField(blank=True, null=True, verbose_name='أصغر قيمة')),
+                ('maximum', models.FloatField(blank=True, null=True, verbose_name='أكبر قيمة')),
+                ('histogram', models.JSONField(blank=True, default=dict, verbose_name='التوزيع')),
+                ('field', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='number_stats', to='survey.templatefield', verbose_name='الحقل')),
+                ('period', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='number_stats', to='survey.surveyperiod', verbose_name='الفترة')),
+            ],
+            options={
+                'verbose_name': 'إحصائيات حقل رقمي',
+                'verbose_name_plural': 'إحصائيات الحقول الرقمية',
+                'unique_together': {('period', 'field')},
+            },
+        ),
+    ]
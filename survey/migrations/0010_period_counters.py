@@ -0,0 +1,45 @@
+# Generated by Django 5.2.6 on 2026-10-16 19:59
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def fill_period_counters(apps, schema_editor):
+    """Initial counter values, counted in one grouped query"""
+    SurveyPeriod = apps.get_model('survey', 'SurveyPeriod')
+
+    periods = SurveyPeriod.objects.annotate(
+        actual_total=Count('distributions'),
+        actual_completed=Count('distributions', filter=Q(distributions__is_completed=True)),
+    ).filter(actual_total__gt=0).only('pk').order_by()
+
+    batch = []
+    for period in periods.iterator(chunk_size=500):
+        period.total_count = period.actual_total
+        period.completed_count = period.actual_completed
+        batch.append(period)
+        if len(batch) >= 500:
+            SurveyPeriod.objects.bulk_update(batch, ['total_count', 'completed_count'])
+            batch = []
+    SurveyPeriod.objects.bulk_update(batch, ['total_count', 'completed_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('survey', '0009_period_results'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='surveyperiod',
+            name='completed_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='عدد المكتملة'),
+        ),
+        migrations.AddField(
+            model_name='surveyperiod',
+            name='total_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='عدد التوزيعات'),
+        ),
+        migrations.RunPython(fill_period_counters, migrations.RunPython.noop),
+    ]
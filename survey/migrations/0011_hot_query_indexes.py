@@ -0,0 +1,24 @@
+# Generated by Django 5.2.6 on 2026-10-16 20:01
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_hot_query_indexes'),
+        ('survey', '0010_period_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='response',
+            index=models.Index(fields=['guardian', 'student', 'template', '-created_at'], name='response_guardian_latest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='surveydistribution',
+            index=models.Index(condition=models.Q(('is_completed', False)), fields=['user', '-sent_at'], name='surveydist_user_pending_idx'),
+        ),
+    ]
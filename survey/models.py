@@ -1,12 +1,14 @@
 import datetime
 import json
 import re
-import uuid
 
 from django import forms
 from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db import models, transaction
+from django.utils import timezone
+
+from core.codes import save_with_unique_code, field_key
 
 
 class Template(models.Model):
@@ -182,9 +184,9 @@ class Template(models.Model):
                         self.add_error(f.key, "القيمة يجب أن تكون قائمة")
                         continue
 
-                    fields = f.sub_form.fields.all()
+                    sub_form = f.sub_form
                     for item in field_value:
-                        form = f.sub_form.build_django_form(ticket=self.ticket, data=item, user=self.user, is_public=True, fields=fields)
+                        form = sub_form.build_django_form(ticket=self.ticket, data=item, user=self.user, is_public=True)
                         if not form.is_valid():
                             keys = form.errors.keys()
 
@@ -196,8 +198,13 @@ class Template(models.Model):
 
             return cleaned_data
 
-    def build_django_form(self, ticket=None, data=None, user=None, is_public=False, fields=None):
-        fields = fields or self.fields.all()
+    def build_django_form(self, ticket=None, data=None, user=None, is_public=False, fields=None, public_only=False):
+        if fields is None:
+            # Hot path: compiled schema, no query on the fields table once cached
+            from survey.schema import get_compiled_schema
+
+            schema = get_compiled_schema(self, public_only=public_only, is_public=is_public)
+            return schema.form_class(data=data, template=self, ticket=ticket, fields=schema.fields, user=user)
 
         form = self.CustomForm(data=data, template=self, ticket=ticket, fields=fields, user=user)
 
@@ -219,7 +226,7 @@ class Template(models.Model):
 
         form.helper.layout = Layout()
 
-        for field in self.fields.all():
+        for field in form.o_fields:
             column = "col-md-12" if field.type == field.__class__.TEXTAREA else f"col-md-{12 // columns}"
             form.helper.layout.append(
                 Column(
@@ -274,15 +281,14 @@ class TemplateField(models.Model):
                                    related_name='updated_template_fields', verbose_name='محدث الحقل')
 
     def generate_key(self):
-        key = "f" + str(uuid.uuid4().hex).lower()[:11]
-        if self.__class__.objects.filter(key=key).exists():
-            return self.generate_key()
-        return key
+        # Uniqueness is enforced on insert (see core.codes)
+        return field_key()
 
     @transaction.atomic
     def save(self, *args, **kwargs):
         created = not self.pk
-        if not self.key:
+        generated = not self.key
+        if generated:
             self.key = self.generate_key()
 
         if not self.order and self.template:
@@ -291,12 +297,28 @@ class TemplateField(models.Model):
         if self.type in (self.FORM, ):
             self.is_multiple = True
 
-        super().save(*args, **kwargs)
+        if generated:
+            save_with_unique_code(self, 'key', field_key, lambda: super(TemplateField, self).save(*args, **kwargs))
+        else:
+            super().save(*args, **kwargs)
+        self.touch_template()
 
         if created and self.type == self.FORM:
             # if not hasattr(self, 'sub_form'):
             Template.objects.create(name=f"{self.name} - {self.template.name}", type=Template.FOOD, parent=self, created_by=self.created_by, updated_by=self.updated_by)
 
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        self.touch_template()
+        return result
+
+    def touch_template(self):
+        """Bump the template's updated_at so its compiled form schema is rebuilt"""
+        now = timezone.now()
+        Template.objects.filter(pk=self.template_id).update(updated_at=now)
+        if 'template' in self._state.fields_cache:
+            self.template.updated_at = now
+
     class Meta:
         verbose_name_plural = 'حقول نماذج البلاغات'
         verbose_name = 'حقل نموذج البلاغ'
@@ -376,6 +398,10 @@ class SurveyPeriod(models.Model):
     school = models.ForeignKey('core.School', on_delete=models.CASCADE, null=True, blank=True, related_name='survey_periods', verbose_name='المدرسة')
     sent_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='sent_survey_periods', verbose_name='أرسل بواسطة')
 
+    # Denormalized distribution counters, kept with F() updates (see SurveyPeriod.increment)
+    total_count = models.PositiveIntegerField(default=0, verbose_name='عدد التوزيعات')
+    completed_count = models.PositiveIntegerField(default=0, verbose_name='عدد المكتملة')
+
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='تاريخ الإنشاء')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='تاريخ التعديل')
 
@@ -393,9 +419,11 @@ class SurveyPeriod(models.Model):
         return f"{self.survey.name} - {self.start_date} إلى {self.end_date}"
 
     def save(self, *args, **kwargs):
-        # Ensure only one active period per survey
+        # Ensure only one active period per survey in each school
         if self.is_active:
-            SurveyPeriod.objects.filter(survey=self.survey, is_active=True).exclude(pk=self.pk).update(is_active=False)
+            SurveyPeriod.objects.filter(
+                survey=self.survey, school=self.school, is_active=True
+            ).exclude(pk=self.pk).update(is_active=False)
         super().save(*args, **kwargs)
 
     @property
@@ -404,14 +432,47 @@ class SurveyPeriod(models.Model):
         from django.utils import timezone
         return timezone.now().date() > self.end_date
 
+    @property
+    def pending_count(self):
+        return self.total_count - self.completed_count
+
     @property
     def completion_rate(self):
         """Calculate completion rate for this period"""
-        total = self.distributions.count()
-        if total == 0:
+        if self.total_count == 0:
             return 0
-        completed = self.distributions.filter(is_completed=True).count()
-        return round((completed / total) * 100, 2)
+        return round((self.completed_count / self.total_count) * 100, 2)
+
+    @classmethod
+    def increment(cls, period_id, **deltas):
+        """Atomically add deltas to the counters, e.g. increment(period_id, completed_count=1)"""
+        deltas = {name: value for name, value in deltas.items() if value}
+        if period_id and deltas:
+            cls.objects.filter(pk=period_id).update(
+                **{name: models.F(name) + value for name, value in deltas.items()}
+            )
+
+    @classmethod
+    def reconcile(cls, periods=None):
+        """
+        Recount the distributions of periods (default: all) in one grouped query and fix
+        the counters that drifted (e.g. distributions removed with a deleted student).
+        Returns the periods that were corrected.
+        """
+        periods = cls.objects.all() if periods is None else periods
+        counted = periods.annotate(
+            actual_total=models.Count('distributions'),
+            actual_completed=models.Count('distributions', filter=models.Q(distributions__is_completed=True)),
+        ).order_by()
+
+        fixed = []
+        for period in counted.only('pk', 'total_count', 'completed_count').iterator():
+            if (period.total_count, period.completed_count) != (period.actual_total, period.actual_completed):
+                period.total_count = period.actual_total
+                period.completed_count = period.actual_completed
+                fixed.append(period)
+        cls.objects.bulk_update(fixed, ['total_count', 'completed_count'], batch_size=500)
+        return fixed
 
 
 class SurveyDistribution(models.Model):
@@ -444,6 +505,9 @@ class SurveyDistribution(models.Model):
             models.Index(fields=['period', 'user']),
             models.Index(fields=['school', 'user']),
             models.Index(fields=['school', 'is_completed']),
+            # Pending list of a user (api: distributions/pending), newest first
+            models.Index(fields=['user', '-sent_at'], condition=models.Q(is_completed=False),
+                         name='surveydist_user_pending_idx'),
         ]
 
     def __str__(self):
@@ -462,6 +526,121 @@ class SurveyDistribution(models.Model):
         return not self.is_completed and not self.is_expired
 
 
+class RecurringSchedule(models.Model):
+    """
+    Next due date of a recurring survey in one school.
+    Maintained by `manage.py process_recurring_surveys`, which selects all due
+    rows with one query instead of inspecting every survey period.
+    """
+    template = models.ForeignKey(Template, on_delete=models.CASCADE, related_name='schedules', verbose_name='الاستطلاع')
+    school = models.ForeignKey('core.School', on_delete=models.CASCADE, related_name='survey_schedules', verbose_name='المدرسة')
+    frequency = models.CharField(max_length=20, choices=Template.FREQ_CHOICES, verbose_name='تكرار الإرسال')
+
+    next_due_date = models.DateField(verbose_name='تاريخ الاستحقاق القادم')
+    last_period_end = models.DateField(null=True, blank=True, verbose_name='نهاية آخر فترة')
+    last_run_at = models.DateTimeField(null=True, blank=True, verbose_name='آخر تشغيل')
+
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='تاريخ الإنشاء')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='تاريخ التعديل')
+
+    class Meta:
+        verbose_name = 'جدولة استطلاع متكرر'
+        verbose_name_plural = 'جدولة الاستطلاعات المتكررة'
+        unique_together = [['template', 'school']]
+        indexes = [
+            models.Index(fields=['next_due_date']),
+        ]
+
+    def __str__(self):
+        return f"{self.template} - {self.school_id} ({self.next_due_date})"
+
+
+class NotificationOutbox(models.Model):
+    """
+    Pending push notifications for a batch of survey distributions.
+    Rows are written in the same transaction as the distributions and drained
+    by `manage.py run_notification_worker`; a worker leases a row until
+    leased_until, after which another worker may pick it up again.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_PROCESSING = 'processing'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+
+    STATUS_CHOICES = (
+        (STATUS_PENDING, 'في الانتظار'),
+        (STATUS_PROCESSING, 'قيد الإرسال'),
+        (STATUS_SENT, 'تم الإرسال'),
+        (STATUS_FAILED, 'فشل'),
+    )
+
+    period = models.ForeignKey(SurveyPeriod, on_delete=models.CASCADE, related_name='notification_outbox', verbose_name='الفترة')
+    distribution_ids = models.JSONField(default=list, verbose_name='معرفات التوزيعات')
+
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING, verbose_name='الحالة')
+    attempts = models.PositiveIntegerField(default=0, verbose_name='عدد المحاولات')
+    available_at = models.DateTimeField(default=timezone.now, verbose_name='متاح للإرسال من')
+    leased_until = models.DateTimeField(null=True, blank=True, verbose_name='محجوز حتى')
+    lease_owner = models.CharField(max_length=64, blank=True, default='', verbose_name='العامل الحاجز')
+    last_error = models.TextField(blank=True, default='', verbose_name='آخر خطأ')
+    metrics = models.JSONField(null=True, blank=True, verbose_name='إحصائيات الإرسال')
+
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='تاريخ الإنشاء')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='تاريخ التعديل')
+
+    class Meta:
+        verbose_name = 'إشعار في قائمة الانتظار'
+        verbose_name_plural = 'قائمة انتظار الإشعارات'
+        ordering = ['available_at', 'id']
+        indexes = [
+            models.Index(fields=['status', 'available_at']),
+            models.Index(fields=['status', 'leased_until']),
+        ]
+
+    def __str__(self):
+        return f"{self.period} - {len(self.distribution_ids)} ({self.get_status_display()})"
+
+
+class PeriodChoiceCount(models.Model):
+    """Number of answers choosing a value of a SELECT/RADIO/CHECKBOX field in a period (see survey.analytics)"""
+    period = models.ForeignKey(SurveyPeriod, on_delete=models.CASCADE, related_name='choice_counts', verbose_name='الفترة')
+    field = models.ForeignKey(TemplateField, on_delete=models.CASCADE, related_name='choice_counts', verbose_name='الحقل')
+    choice = models.CharField(max_length=255, verbose_name='الخيار')
+    count = models.PositiveIntegerField(default=0, verbose_name='العدد')
+
+    class Meta:
+        verbose_name = 'عدد اختيارات'
+        verbose_name_plural = 'أعداد الاختيارات'
+        unique_together = [['period', 'field', 'choice']]
+
+    def __str__(self):
+        return f"{self.field_id} - {self.choice}: {self.count}"
+
+
+class PeriodNumberStats(models.Model):
+    """Running count/sum/min/max and histogram of a NUMBER field in a period (see survey.analytics)"""
+    period = models.ForeignKey(SurveyPeriod, on_delete=models.CASCADE, related_name='number_stats', verbose_name='الفترة')
+    field = models.ForeignKey(TemplateField, on_delete=models.CASCADE, related_name='number_stats', verbose_name='الحقل')
+    count = models.PositiveIntegerField(default=0, verbose_name='عدد الإجابات')
+    total = models.FloatField(default=0, verbose_name='المجموع')
+    minimum = models.FloatField(null=True, blank=True, verbose_name='أصغر قيمة')
+    maximum = models.FloatField(null=True, blank=True, verbose_name='أكبر قيمة')
+    # {bucket lower bound: count}
+    histogram = models.JSONField(default=dict, blank=True, verbose_name='التوزيع')
+
+    class Meta:
+        verbose_name = 'إحصائيات حقل رقمي'
+        verbose_name_plural = 'إحصائيات الحقول الرقمية'
+        unique_together = [['period', 'field']]
+
+    def __str__(self):
+        return f"{self.field_id}: {self.count}"
+
+    @property
+    def average(self):
+        return round(self.total / self.count, 2) if self.count else None
+
+
 class Response(models.Model):
     template = models.ForeignKey(Template, on_delete=models.CASCADE, related_name='responses', verbose_name='النموذج')
     # Temporarily nullable to allow migration from guardian to user
@@ -469,6 +648,8 @@ class Response(models.Model):
     # Keep guardian temporarily for migration
     guardian = models.ForeignKey('core.Guardian', on_delete=models.CASCADE, related_name='old_responses', verbose_name='الولي (قديم)', null=True, blank=True)
     student = models.ForeignKey('core.Student', on_delete=models.CASCADE, related_name='responses', verbose_name='الطالب', null=True, blank=True, help_text='الطالب المعني (فقط لاستطلاعات أولياء الأمور)')
+    # Answers keyed by TemplateField.key (document storage, see survey.storage); None when stored as AdditionalField rows
+    answers = models.JSONField(null=True, blank=True, default=None, verbose_name='الإجابات')
 
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='تاريخ الإنشاء')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='تاريخ التعديل')
@@ -481,6 +662,8 @@ class Response(models.Model):
         indexes = [
             models.Index(fields=["template", "user", "-created_at"]),
             models.Index(fields=["template", "student", "-created_at"]),
+            # Last response per template of a guardian/student (api: TemplateViewSet.list)
+            models.Index(fields=["guardian", "student", "template", "-created_at"], name="response_guardian_latest_idx"),
         ]
 
 
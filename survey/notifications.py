@@ -0,0 +1,292 @@
+# survey/notifications.py - Push notification dispatch (batching, worker pool, retries, pruning)
+import logging
+import random
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+logger = logging.getLogger(__name__)
+
+# FCM accepts at most 500 tokens per multicast request
+MULTICAST_LIMIT = 500
+
+# Outcome of one token in a multicast send
+RESULT_OK = 'ok'
+RESULT_INVALID_TOKEN = 'invalid_token'   # never retried, token gets pruned
+RESULT_TRANSIENT = 'transient'           # retried with backoff
+RESULT_FAILED = 'failed'                 # permanent, not retried
+
+Notification = namedtuple('Notification', ['title', 'body', 'data', 'badge'])
+
+
+class NotificationTransport:
+    """
+    Delivers one notification to a list of device tokens.
+    send_multicast() returns one RESULT_* value per token, in order.
+    """
+
+    def is_available(self):
+        return True
+
+    def send_multicast(self, notification, tokens):
+        raise NotImplementedError
+
+
+class FCMTransport(NotificationTransport):
+    """Firebase Cloud Messaging (firebase_admin is an optional dependency)"""
+
+    def __init__(self):
+        try:
+            import firebase_admin
+            from firebase_admin import messaging
+        except ImportError:
+            firebase_admin = messaging = None
+        self._firebase_admin = firebase_admin
+        self._messaging = messaging
+
+    def is_available(self):
+        if self._firebase_admin is None:
+            logger.warning("Firebase Admin SDK not installed. Skipping FCM notifications.")
+            return False
+        try:
+            self._firebase_admin.get_app()
+        except ValueError:
+            logger.warning("Firebase not initialized. Skipping FCM notifications.")
+            return False
+        return True
+
+    def _build_message(self, notification, tokens):
+        messaging = self._messaging
+        return messaging.MulticastMessage(
+            notification=messaging.Notification(
+                title=notification.title,
+                body=notification.body,
+            ),
+            data=notification.data,
+            tokens=tokens,
+            android=messaging.AndroidConfig(
+                priority='high',
+                notification=messaging.AndroidNotification(
+                    icon='ic_notification',
+                    color='#FF6B35',
+                    sound='default',
+                )
+            ),
+            apns=messaging.APNSConfig(
+                payload=messaging.APNSPayload(
+                    aps=messaging.Aps(
+                        sound='default',
+                        badge=notification.badge,
+                    )
+                )
+            )
+        )
+
+    def _classify(self, exception):
+        messaging = self._messaging
+        if isinstance(exception, (messaging.UnregisteredError, messaging.SenderIdMismatchError)):
+            return RESULT_INVALID_TOKEN
+        if isinstance(exception, messaging.QuotaExceededError):
+            return RESULT_TRANSIENT
+        code = getattr(exception, 'code', None)
+        if code == 'INVALID_ARGUMENT':
+            return RESULT_INVALID_TOKEN
+        if code in ('UNAVAILABLE', 'INTERNAL', 'DEADLINE_EXCEEDED', 'RESOURCE_EXHAUSTED'):
+            return RESULT_TRANSIENT
+        return RESULT_FAILED
+
+    def send_multicast(self, notification, tokens):
+        # send_multicast is the name in firebase_admin < 6.2
+        send = getattr(self._messaging, 'send_each_for_multicast', None) or self._messaging.send_multicast
+        try:
+            batch = send(self._build_message(notification, tokens))
+        except Exception as e:
+            # The whole request failed (network, auth, server): every token is retryable
+            logger.warning(f"FCM multicast request failed: {e}")
+            return [RESULT_TRANSIENT] * len(tokens)
+
+        return [
+            RESULT_OK if response.success else self._classify(response.exception)
+            for response in batch.responses
+        ]
+
+
+class FakeTransport(NotificationTransport):
+    """
+    In-memory transport for tests and offline load testing.
+    Tokens starting with invalid_prefix are rejected as unregistered; other
+    sends fail transiently with probability transient_error_rate.
+    """
+
+    def __init__(self, latency=0.0, transient_error_rate=0.0, invalid_prefix='invalid', seed=None):
+        self.latency = latency
+        self.transient_error_rate = transient_error_rate
+        self.invalid_prefix = invalid_prefix
+        self.sent = []
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def send_multicast(self, notification, tokens):
+        if self.latency:
+            time.sleep(self.latency)
+
+        results = []
+        with self._lock:
+            self.requests += 1
+            for token in tokens:
+                if token.startswith(self.invalid_prefix):
+                    results.append(RESULT_INVALID_TOKEN)
+                elif self._random.random() < self.transient_error_rate:
+                    results.append(RESULT_TRANSIENT)
+                else:
+                    self.sent.append((token, notification))
+                    results.append(RESULT_OK)
+        return results
+
+
+def get_transport():
+    """Transport configured by settings.NOTIFICATION_TRANSPORT (a dotted class path)"""
+    path = getattr(settings, 'NOTIFICATION_TRANSPORT', 'survey.notifications.FCMTransport')
+    return import_string(path)()
+
+
+class DispatchMetrics:
+    """Counters collected while dispatching; safe to update from worker threads"""
+
+    FIELDS = ('requests', 'sent', 'failed', 'invalid_tokens', 'retries', 'pruned')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        for field in self.FIELDS:
+            setattr(self, field, 0)
+        self.latencies = []
+        # False when the transport could not send at all (nothing was attempted)
+        self.available = True
+        self.started_at = time.monotonic()
+        self.duration = 0.0
+
+    def add(self, **counts):
+        with self._lock:
+            for field, value in counts.items():
+                setattr(self, field, getattr(self, field) + value)
+
+    def record_latency(self, seconds):
+        with self._lock:
+            self.latencies.append(seconds)
+
+    def finish(self):
+        self.duration = time.monotonic() - self.started_at
+        return self
+
+    def as_dict(self):
+        data = {field: getattr(self, field) for field in self.FIELDS}
+        data['duration'] = round(self.duration, 3)
+        if self.latencies:
+            latencies = sorted(self.latencies)
+            data['latency_p50'] = round(latencies[len(latencies) // 2], 3)
+            data['latency_max'] = round(latencies[-1], 3)
+        return data
+
+
+class NotificationDispatcher:
+    """
+    Sends notifications to many device tokens.
+
+    Tokens sharing a notification are grouped into multicast batches of up to
+    batch_size, batches run on a bounded thread pool, transient failures are
+    retried with exponential backoff and unregistered tokens are cleared from
+    User.fcm_token in bulk at the end.
+    """
+
+    def __init__(self, transport=None, batch_size=MULTICAST_LIMIT, max_workers=None, max_retries=None,
+                 backoff=None):
+        self.transport = transport or get_transport()
+        self.batch_size = min(batch_size, MULTICAST_LIMIT)
+        self.max_workers = max_workers or getattr(settings, 'NOTIFICATION_MAX_WORKERS', 8)
+        self.max_retries = getattr(settings, 'NOTIFICATION_MAX_RETRIES', 3) if max_retries is None else max_retries
+        self.backoff = getattr(settings, 'NOTIFICATION_RETRY_BACKOFF', 0.5) if backoff is None else backoff
+
+    def _batches(self, groups):
+        for notification, tokens in groups:
+            for start in range(0, len(tokens), self.batch_size):
+                yield notification, tokens[start:start + self.batch_size]
+
+    def _send_batch(self, notification, tokens, metrics):
+        """Send one batch, retrying transient failures. Returns the invalid tokens."""
+        invalid = []
+        pending = tokens
+        attempt = 0
+
+        while pending:
+            started = time.monotonic()
+            results = self.transport.send_multicast(notification, pending)
+            metrics.record_latency(time.monotonic() - started)
+            metrics.add(requests=1)
+
+            retry = []
+            for token, result in zip(pending, results):
+                if result == RESULT_OK:
+                    metrics.add(sent=1)
+                elif result == RESULT_INVALID_TOKEN:
+                    invalid.append(token)
+                elif result == RESULT_TRANSIENT and attempt < self.max_retries:
+                    retry.append(token)
+                else:
+                    metrics.add(failed=1)
+
+            if retry:
+                attempt += 1
+                metrics.add(retries=len(retry))
+                # Exponential backoff with jitter so workers don't retry in lockstep
+                time.sleep(self.backoff * (2 ** (attempt - 1)) * (0.5 + random.random()))
+            pending = retry
+
+        metrics.add(invalid_tokens=len(invalid))
+        return invalid
+
+    def dispatch(self, groups):
+        """
+        Send each (Notification, tokens) group.
+        Returns a DispatchMetrics instance.
+        """
+        metrics = DispatchMetrics()
+        if not self.transport.is_available():
+            metrics.available = False
+            return metrics.finish()
+
+        invalid_tokens = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [
+                (executor.submit(self._send_batch, notification, tokens, metrics), tokens)
+                for notification, tokens in self._batches(groups)
+            ]
+            for future, tokens in futures:
+                try:
+                    invalid_tokens.extend(future.result())
+                except Exception as e:
+                    logger.error(f"Notification batch failed: {e}")
+                    metrics.add(failed=len(tokens))
+
+        if invalid_tokens:
+            metrics.add(pruned=prune_invalid_tokens(invalid_tokens))
+
+        metrics.finish()
+        logger.info(f"Notifications dispatched: {metrics.as_dict()}")
+        return metrics
+
+
+def prune_invalid_tokens(tokens, chunk_size=1000):
+    """Clear FCM tokens the provider reported as unregistered. Returns the number of users updated."""
+    from accounts.models import User
+
+    tokens = list(set(tokens))
+    updated = 0
+    for start in range(0, len(tokens), chunk_size):
+        updated += User.objects.filter(fcm_token__in=tokens[start:start + chunk_size]).update(fcm_token=None)
+    return updated
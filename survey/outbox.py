@@ -0,0 +1,149 @@
+# survey/outbox.py - Persistent queue of survey notifications, drained by run_notification_worker
+import logging
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from survey.models import NotificationOutbox
+
+
+logger = logging.getLogger(__name__)
+
+# Distributions per outbox row: the unit of work a worker leases
+OUTBOX_CHUNK_SIZE = getattr(settings, 'NOTIFICATION_OUTBOX_CHUNK_SIZE', 5000)
+LEASE_SECONDS = getattr(settings, 'NOTIFICATION_LEASE_SECONDS', 300)
+MAX_ATTEMPTS = getattr(settings, 'NOTIFICATION_MAX_ATTEMPTS', 5)
+RETRY_DELAY_SECONDS = getattr(settings, 'NOTIFICATION_RETRY_DELAY', 30)
+
+
+def enqueue_survey_notifications(period, distribution_ids, chunk_size=OUTBOX_CHUNK_SIZE):
+    """
+    Queue notifications for the given distributions.
+    Call inside the transaction that creates the distributions, so the queue
+    never references rows that were rolled back.
+    """
+    distribution_ids = list(distribution_ids)
+    entries = [
+        NotificationOutbox(period=period, distribution_ids=distribution_ids[start:start + chunk_size])
+        for start in range(0, len(distribution_ids), chunk_size)
+    ]
+    return NotificationOutbox.objects.bulk_create(entries)
+
+
+def _claimable(now):
+    return (
+        Q(status=NotificationOutbox.STATUS_PENDING, available_at__lte=now)
+        | Q(status=NotificationOutbox.STATUS_PROCESSING, leased_until__lt=now, attempts__lt=MAX_ATTEMPTS)
+    )
+
+
+def fail_exhausted_leases(now=None):
+    """
+    Mark FAILED the rows whose lease expired after the last allowed attempt
+    (a worker that keeps crashing on them). Returns the number of rows.
+    """
+    now = now or timezone.now()
+    return NotificationOutbox.objects.filter(
+        status=NotificationOutbox.STATUS_PROCESSING, leased_until__lt=now, attempts__gte=MAX_ATTEMPTS,
+    ).update(
+        status=NotificationOutbox.STATUS_FAILED,
+        last_error=f'Lease expired after {MAX_ATTEMPTS} attempts',
+        leased_until=None,
+    )
+
+
+def claim_entries(owner, limit=1, lease_seconds=LEASE_SECONDS):
+    """
+    Lease up to limit entries for owner.
+    Each row is taken with a conditional UPDATE, so concurrent workers never
+    lease the same row; rows whose lease expired are claimable again until
+    they ran out of attempts.
+    """
+    now = timezone.now()
+    fail_exhausted_leases(now)
+    candidates = list(
+        NotificationOutbox.objects.filter(_claimable(now)).order_by('available_at', 'id')
+        .values_list('pk', flat=True)[:limit * 4]
+    )
+
+    claimed = []
+    for pk in candidates:
+        taken = NotificationOutbox.objects.filter(_claimable(now), pk=pk).update(
+            status=NotificationOutbox.STATUS_PROCESSING,
+            lease_owner=owner,
+            leased_until=now + timedelta(seconds=lease_seconds),
+            attempts=F('attempts') + 1,
+        )
+        if taken:
+            claimed.append(pk)
+            if len(claimed) == limit:
+                break
+
+    return list(NotificationOutbox.objects.filter(pk__in=claimed, lease_owner=owner))
+
+
+def _release(entry, owner, **fields):
+    """Update an entry only if owner still holds its lease"""
+    return NotificationOutbox.objects.filter(
+        pk=entry.pk, lease_owner=owner, status=NotificationOutbox.STATUS_PROCESSING
+    ).update(**fields)
+
+
+def _retry_or_fail(entry, owner, error, metrics=None):
+    """Put a failed entry back with backoff, or mark it FAILED after MAX_ATTEMPTS"""
+    metrics = metrics.as_dict() if metrics is not None else None
+    if entry.attempts >= MAX_ATTEMPTS:
+        _release(
+            entry, owner,
+            status=NotificationOutbox.STATUS_FAILED, metrics=metrics, last_error=error, leased_until=None,
+        )
+    else:
+        delay = RETRY_DELAY_SECONDS * (2 ** (entry.attempts - 1)) * (0.5 + random.random())
+        _release(
+            entry, owner,
+            status=NotificationOutbox.STATUS_PENDING,
+            available_at=timezone.now() + timedelta(seconds=delay),
+            metrics=metrics,
+            last_error=error,
+            leased_until=None,
+        )
+
+
+def process_entry(entry, owner, dispatcher=None):
+    """
+    Send the notifications of a leased entry and record the outcome.
+    An unavailable transport or a send where every token failed counts as a
+    failure and is retried; partial failures are not (they would resend to
+    the tokens that succeeded).
+    """
+    from survey.services import send_survey_notifications
+
+    try:
+        metrics = send_survey_notifications(entry.distribution_ids, dispatcher=dispatcher)
+    except Exception as e:
+        logger.exception(f"Notification outbox entry {entry.pk} failed")
+        _retry_or_fail(entry, owner, str(e))
+        return False
+
+    if not metrics.available:
+        error = 'Notification transport unavailable'
+    elif metrics.failed and not metrics.sent:
+        error = f'All {metrics.failed} notifications failed'
+    else:
+        error = None
+    if error:
+        logger.warning(f"Notification outbox entry {entry.pk}: {error}")
+        _retry_or_fail(entry, owner, error, metrics)
+        return False
+
+    _release(
+        entry, owner,
+        status=NotificationOutbox.STATUS_SENT,
+        metrics=metrics.as_dict(),
+        last_error='',
+        leased_until=None,
+    )
+    return True
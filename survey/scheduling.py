@@ -0,0 +1,220 @@
+# survey/scheduling.py - Due dates and execution of recurring survey periods
+import calendar
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from survey.models import Template, SurveyPeriod, RecurringSchedule
+from survey.services import calculate_end_date, create_survey_distribution
+
+
+QUARTER_MONTHS = (1, 4, 7, 10)
+# Academic year start; can be configured per school later
+YEAR_START = (9, 1)
+
+
+def current_cycle_start(frequency, day):
+    """Start of the cycle containing day (Monday, 1st of month, quarter or academic year)"""
+    if frequency == Template.FREQ_WEEKLY:
+        return day - timedelta(days=day.weekday())
+    if frequency == Template.FREQ_MONTHLY:
+        return day.replace(day=1)
+    if frequency == Template.FREQ_QUARTERLY:
+        return day.replace(month=QUARTER_MONTHS[(day.month - 1) // 3], day=1)
+    if frequency == Template.FREQ_YEARLY:
+        year_start = date(day.year, *YEAR_START)
+        return year_start if day >= year_start else date(day.year - 1, *YEAR_START)
+    return day
+
+
+def next_cycle_start(frequency, after):
+    """First cycle start strictly after the given date"""
+    if frequency == Template.FREQ_WEEKLY:
+        return after + timedelta(days=7 - after.weekday())
+    if frequency == Template.FREQ_MONTHLY:
+        return after.replace(day=1) + timedelta(days=calendar.monthrange(after.year, after.month)[1])
+    if frequency == Template.FREQ_QUARTERLY:
+        start = current_cycle_start(frequency, after)
+        month = start.month + 3
+        return date(start.year + (month > 12), (month - 1) % 12 + 1, 1)
+    if frequency == Template.FREQ_YEARLY:
+        return date(current_cycle_start(frequency, after).year + 1, *YEAR_START)
+    return after + timedelta(days=1)
+
+
+def next_due_date(frequency, last_period_end, today):
+    """A new period is due on the first cycle start after the last period expired"""
+    if last_period_end is None:
+        return today
+    return next_cycle_start(frequency, last_period_end)
+
+
+def sync_schedules(today=None):
+    """
+    Make RecurringSchedule rows match the recurring surveys and active schools:
+    create missing (template, school) pairs, drop pairs that no longer apply
+    and recompute due dates of surveys whose frequency changed or that got a
+    later period outside the runner (a manual send).
+    Returns (created, deleted, updated).
+    """
+    from core.models import School
+
+    today = today or timezone.now().date()
+
+    templates = list(
+        Template.objects.exclude(send_frequency=Template.FREQ_ONCE)
+        .filter(type=Template.FOOD)
+        .values_list('pk', 'school_id', 'send_frequency')
+    )
+    active_school_ids = list(School.objects.filter(is_active=True).values_list('pk', flat=True))
+    active = set(active_school_ids)
+
+    wanted = {}
+    for template_id, school_id, frequency in templates:
+        if school_id is None:
+            # Built-in surveys go to every active school
+            for active_school_id in active_school_ids:
+                wanted[(template_id, active_school_id)] = frequency
+        elif school_id in active:
+            wanted[(template_id, school_id)] = frequency
+
+    last_ends = {
+        (row['survey_id'], row['school_id']): row['last_end']
+        for row in (
+            SurveyPeriod.objects.filter(survey_id__in=[template[0] for template in templates])
+            .values('survey_id', 'school_id').annotate(last_end=Max('end_date')).order_by()
+        )
+    }
+
+    existing = {
+        (template_id, school_id): (pk, frequency, last_end)
+        for pk, template_id, school_id, frequency, last_end in RecurringSchedule.objects.values_list(
+            'pk', 'template_id', 'school_id', 'frequency', 'last_period_end'
+        )
+    }
+
+    stale = [pk for pair, (pk, _, _) in existing.items() if pair not in wanted]
+    if stale:
+        RecurringSchedule.objects.filter(pk__in=stale).delete()
+
+    missing = [
+        RecurringSchedule(
+            template_id=template_id,
+            school_id=school_id,
+            frequency=frequency,
+            last_period_end=last_ends.get((template_id, school_id)),
+            next_due_date=next_due_date(frequency, last_ends.get((template_id, school_id)), today),
+        )
+        for (template_id, school_id), frequency in wanted.items()
+        if (template_id, school_id) not in existing
+    ]
+    RecurringSchedule.objects.bulk_create(missing, batch_size=1000)
+
+    updated = 0
+    for pair, (pk, frequency, last_end) in existing.items():
+        if pair not in wanted:
+            continue
+        latest_end = last_ends.get(pair)
+        newer_period = latest_end is not None and (last_end is None or latest_end > last_end)
+        if wanted[pair] != frequency or newer_period:
+            last_end = latest_end if newer_period else last_end
+            updated += RecurringSchedule.objects.filter(pk=pk).update(
+                frequency=wanted[pair],
+                last_period_end=last_end,
+                next_due_date=next_due_date(wanted[pair], last_end, today),
+            )
+
+    return len(missing), len(stale), updated
+
+
+def due_schedules(today):
+    """(schedule id, school id) of every schedule due on or before today, in one query"""
+    return list(
+        RecurringSchedule.objects.filter(next_due_date__lte=today)
+        .order_by('school_id', 'pk')
+        .values_list('pk', 'school_id')
+    )
+
+
+def run_schedule(schedule_id, today, since=None):
+    """
+    Create the periods of a due schedule.
+
+    A period is created for each due cycle that started on or after since
+    (today when not given) and by today: one per run normally, several in
+    catch-up mode. A missed cycle outside that window is skipped and the
+    schedule moves to the next cycle start.
+    Each period is created in the same transaction as a compare-and-set
+    advance of the schedule row, so two overlapping runs cannot both create it.
+
+    Returns a dict: {'schedule', 'status', 'periods', 'distributions', 'start_date'}
+    (start_date of the last period created).
+    """
+    schedule = RecurringSchedule.objects.select_related('template', 'school').get(pk=schedule_id)
+    due = schedule.next_due_date
+    result = {'schedule': schedule_id, 'status': 'skipped', 'periods': 0, 'distributions': 0, 'start_date': None}
+    if due > today:
+        return result
+
+    frequency = schedule.frequency
+    if schedule.last_period_end is None:
+        start_date = today
+    else:
+        window_start = max(due, since or today)
+        start_date = current_cycle_start(frequency, window_start)
+        if start_date < window_start:
+            start_date = next_cycle_start(frequency, start_date)
+
+    if start_date > today:
+        # Missed cycle outside the catch-up window: wait for the next one
+        RecurringSchedule.objects.filter(pk=schedule_id, next_due_date=due).update(
+            next_due_date=next_cycle_start(frequency, today), last_run_at=timezone.now()
+        )
+        result['status'] = 'rescheduled'
+        return result
+
+    while start_date <= today:
+        end_date = calculate_end_date(start_date, frequency)
+        next_due = next_cycle_start(frequency, end_date)
+        with transaction.atomic():
+            claimed = RecurringSchedule.objects.filter(pk=schedule_id, next_due_date=due).update(
+                next_due_date=next_due,
+                last_period_end=end_date,
+                last_run_at=timezone.now(),
+            )
+            if not claimed:
+                # Another run advanced this schedule first
+                break
+
+            period, distribution_ids = create_survey_distribution(
+                survey=schedule.template,
+                school=schedule.school,
+                sent_by=schedule.template.created_by,  # System-generated
+                start_date=start_date,
+            )
+
+        result['periods'] += 1
+        result['distributions'] += len(distribution_ids)
+        result.update(status='created', start_date=start_date)
+        # The next period is due on the first cycle start after this one ends
+        due = start_date = next_due
+
+    return result
+
+
+def run_school_schedules(schedule_ids, today, since=None):
+    """Run several schedules of one school (the unit of work of a pool worker)"""
+    from django.db import close_old_connections
+
+    results = []
+    for schedule_id in schedule_ids:
+        try:
+            results.append(run_schedule(schedule_id, today, since))
+        except Exception as e:
+            results.append({
+                'schedule': schedule_id, 'status': 'error', 'error': str(e), 'periods': 0, 'distributions': 0,
+            })
+    close_old_connections()
+    return results
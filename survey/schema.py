@@ -0,0 +1,61 @@
+# survey/schema.py - Compiled survey form schemas (field specs + reusable form classes)
+from collections import namedtuple
+
+from django.conf import settings
+
+from core import cache as shared_cache
+from core.cache import LocalLRUCache
+
+
+SCHEMA_CACHE_TIMEOUT = getattr(settings, 'SURVEY_SCHEMA_CACHE_TIMEOUT', 60 * 60)
+# Entries are keyed on Template.updated_at, so a long local TTL never serves a stale schema
+_local_schemas = LocalLRUCache(
+    getattr(settings, 'SURVEY_SCHEMA_LOCAL_CACHE_SIZE', 256),
+    getattr(settings, 'SURVEY_SCHEMA_LOCAL_CACHE_TTL', 60 * 60),
+)
+
+# fields: tuple of TemplateField (detached, picklable); form_class: Template.CustomForm subclass
+CompiledSchema = namedtuple('CompiledSchema', ['template_id', 'version', 'fields', 'form_class'])
+
+
+def schema_version(template):
+    return template.updated_at.isoformat() if template.updated_at else '0'
+
+
+def _load_fields(template, public_only):
+    """Field rows of a template, through the shared cache"""
+    key = shared_cache.make_key(None, 'survey', 'schema', template.pk, schema_version(template), int(public_only))
+    fields = shared_cache.get(key)
+    if fields is None:
+        queryset = template.fields.all()
+        if public_only:
+            queryset = queryset.filter(is_public=True)
+        fields = tuple(queryset.order_by('order', 'id'))
+        shared_cache.set_value(key, fields, SCHEMA_CACHE_TIMEOUT)
+    return fields
+
+
+def _build_form_class(template, fields, is_public):
+    attrs = {}
+    for field in fields:
+        form_field = field.get_corresponding_django_form_field()
+        if field.is_required is True and field.is_public is False and is_public is True:
+            form_field.required = False
+        attrs[field.key] = form_field
+    return type(f'Template{template.pk}Form', (template.CustomForm,), attrs)
+
+
+def get_compiled_schema(template, public_only=False, is_public=False):
+    """
+    Compiled schema of a template, keyed on (template id, updated_at).
+    Saving a Template or TemplateField bumps updated_at, so edits are picked
+    up by every worker without explicit invalidation.
+    """
+    version = schema_version(template)
+    key = (template.pk, version, public_only, is_public)
+    schema = _local_schemas.get(key)
+    if schema is None:
+        fields = _load_fields(template, public_only)
+        schema = CompiledSchema(template.pk, version, fields, _build_form_class(template, fields, is_public))
+        _local_schemas.set(key, schema)
+    return schema
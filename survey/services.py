@@ -1,7 +1,49 @@
+from array import array
 from datetime import datetime, timedelta
+from itertools import islice
+
+from django.conf import settings
 from django.db import transaction
+from django.db.models import IntegerField, Q, Value
 from django.utils import timezone
+
+from core import cache as shared_cache
 from survey.models import Template, SurveyPeriod, SurveyDistribution
+from survey.notifications import Notification, NotificationDispatcher
+from survey.outbox import enqueue_survey_notifications
+
+
+DISTRIBUTION_BATCH_SIZE = getattr(settings, 'SURVEY_DISTRIBUTION_BATCH_SIZE', 2000)
+TEMPLATE_LIST_CACHE_TIMEOUT = getattr(settings, 'SURVEY_TEMPLATE_LIST_CACHE_TIMEOUT', 300)
+# Tag of every cached template list: built-in templates (school=None) appear in all of them
+TEMPLATES_TAG = 'survey:templates'
+
+
+def school_templates(school_id):
+    """
+    Templates offered to a school (its own and the built-in ones), ordered by name.
+    Cached per school; see invalidate_template_list().
+    """
+    def load():
+        return list(
+            Template.objects
+            .filter(Q(school_id=school_id) | Q(school__isnull=True))
+            .order_by('name', 'id')
+        )
+
+    key = shared_cache.make_key(school_id, 'survey', 'templates')
+    return shared_cache.get_or_set(key, load, TEMPLATE_LIST_CACHE_TIMEOUT, tags=[TEMPLATES_TAG])
+
+
+def invalidate_template_list(*school_ids):
+    """Drop cached template lists of the given schools (None: a built-in template, every school)"""
+    def _invalidate():
+        if None in school_ids:
+            shared_cache.invalidate_tags(TEMPLATES_TAG)
+        for school_id in set(school_ids) - {None}:
+            shared_cache.invalidate_school(school_id)
+
+    transaction.on_commit(_invalidate)
 
 
 def convert_form_template_to_json(*, template: Template) -> list:
@@ -38,79 +80,110 @@ def calculate_end_date(start_date, frequency):
         return start_date + timedelta(days=30)  # Default
 
 
-def get_survey_recipients(survey, school=None):
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def recipient_querysets(survey, school):
     """
-    Get list of recipients for a survey based on target_audience and grades
-    Returns list of tuples: (user, student) where student can be None
+    Querysets resolving the recipients of a survey in a school.
+    Each queryset yields (user_id, student_id) rows straight from a single JOIN;
+    student_id is None for non-guardian audiences.
     """
-    from accounts.models import User, TeacherProfile, EmployeeProfile
-    from core.models import Guardian, Student
+    from accounts.models import TeacherProfile, EmployeeProfile
+    from core.models import GuardianStudent
+
+    if school is None:
+        # Distributions always belong to a school
+        return []
 
-    recipients = []
+    school_id = getattr(school, 'pk', school)
+    no_student = Value(None, output_field=IntegerField())
+
+    teachers = (
+        TeacherProfile.objects.filter(school_id=school_id)
+        .annotate(no_student=no_student).values_list('user_id', 'no_student').order_by()
+    )
+    employees = (
+        EmployeeProfile.objects.filter(school_id=school_id)
+        .annotate(no_student=no_student).values_list('user_id', 'no_student').order_by()
+    )
+    guardian_links = GuardianStudent.objects.filter(
+        guardian__user__isnull=False,
+        student__school_id=school_id,
+        student__is_active=True,
+    ).order_by()
 
     if survey.target_audience == Template.TARGET_GUARDIANS:
-        # Get students based on grades
-        if survey.grades.exists():
-            # Specific grades selected
-            students = Student.objects.filter(
-                school_class__grade__in=survey.grades.all(),
-                school_class__grade__school=school
-            ).distinct()
-        else:
-            # All grades
-            students = Student.objects.filter(
-                school_class__grade__school=school
-            ).distinct()
-
-        # For each student, get all guardians and create (user, student) tuple
-        for student in students:
-            guardians = student.guardians.all()
-            for guardian in guardians:
-                if guardian.user:  # Ensure guardian has a user account
-                    recipients.append((guardian.user, student))
-
-    elif survey.target_audience == Template.TARGET_TEACHERS:
-        # Get all teachers in the school
-        if school:
-            teacher_profiles = TeacherProfile.objects.filter(school=school)
-            for profile in teacher_profiles:
-                recipients.append((profile.user, None))
-
-    elif survey.target_audience == Template.TARGET_EMPLOYEES:
-        # Get all employees in the school
-        if school:
-            employee_profiles = EmployeeProfile.objects.filter(school=school)
-            for profile in employee_profiles:
-                recipients.append((profile.user, None))
-
-    elif survey.target_audience == Template.TARGET_ALL:
-        # Get all users in the school (guardians, teachers, employees)
-        if school:
-            # Teachers
-            teacher_profiles = TeacherProfile.objects.filter(school=school)
-            for profile in teacher_profiles:
-                recipients.append((profile.user, None))
-
-            # Employees
-            employee_profiles = EmployeeProfile.objects.filter(school=school)
-            for profile in employee_profiles:
-                recipients.append((profile.user, None))
-
-            # Guardians - get unique guardians
-            students = Student.objects.filter(school_class__grade__school=school).distinct()
-            seen_guardians = set()
-            for student in students:
-                guardians = student.guardians.all()
-                for guardian in guardians:
-                    if guardian.user and guardian.id not in seen_guardians:
-                        recipients.append((guardian.user, None))
-                        seen_guardians.add(guardian.id)
-
-    return recipients
+        grade_ids = list(survey.grades.values_list('pk', flat=True))
+        if grade_ids:
+            guardian_links = guardian_links.filter(student__current_class__grade_id__in=grade_ids)
+        return [guardian_links.values_list('guardian__user_id', 'student_id')]
+
+    if survey.target_audience == Template.TARGET_TEACHERS:
+        return [teachers]
+
+    if survey.target_audience == Template.TARGET_EMPLOYEES:
+        return [employees]
+
+    if survey.target_audience == Template.TARGET_ALL:
+        # One row per user: UNION (not UNION ALL) drops users holding several roles
+        guardians = guardian_links.annotate(no_student=no_student).values_list('guardian__user_id', 'no_student')
+        return [teachers.union(employees, guardians)]
+
+    return []
+
+
+def get_survey_recipients(survey, school=None, chunk_size=2000):
+    """
+    Stream the recipients of a survey based on target_audience and grades
+    Yields tuples: (user_id, student_id) where student_id can be None
+    """
+    for queryset in recipient_querysets(survey, school):
+        yield from queryset.iterator(chunk_size=chunk_size)
+
+
+def count_survey_recipients(survey, school=None):
+    """Number of recipients get_survey_recipients would yield, counted in SQL"""
+    return sum(queryset.count() for queryset in recipient_querysets(survey, school))
+
+
+def write_distributions(period, recipients, batch_size=DISTRIBUTION_BATCH_SIZE, progress=None):
+    """
+    Write one SurveyDistribution per (user_id, student_id) pair, batch_size rows at a time.
+    Only the current batch is held in memory; progress(written) is called after each batch.
+    Returns an array of the created distribution ids.
+    """
+    distribution_ids = array('q')
+
+    for batch in _batched(recipients, batch_size):
+        created = SurveyDistribution.objects.bulk_create(
+            [
+                SurveyDistribution(
+                    period=period,
+                    survey_id=period.survey_id,
+                    user_id=user_id,
+                    student_id=student_id,
+                    school_id=period.school_id,
+                )
+                for user_id, student_id in batch
+            ],
+            batch_size=batch_size,
+        )
+        distribution_ids.extend(dist.pk for dist in created)
+        SurveyPeriod.increment(period.pk, total_count=len(created))
+
+        if progress is not None:
+            progress(len(distribution_ids))
+
+    return distribution_ids
 
 
 @transaction.atomic
-def create_survey_distribution(survey, school, sent_by, start_date=None):
+def create_survey_distribution(survey, school, sent_by, start_date=None, batch_size=DISTRIBUTION_BATCH_SIZE,
+                               progress=None, notify=True):
     """
     Create a new survey period and distributions for all eligible recipients
 
@@ -119,9 +192,12 @@ def create_survey_distribution(survey, school, sent_by, start_date=None):
         school: School instance (None for built-in surveys sent globally)
         sent_by: User who is sending this survey
         start_date: Optional start date (defaults to today)
+        batch_size: Number of distributions written per INSERT
+        progress: Optional callable receiving the number of distributions written so far
+        notify: Queue push notifications in the notification outbox (same transaction)
 
     Returns:
-        tuple: (SurveyPeriod, list of created SurveyDistribution)
+        tuple: (SurveyPeriod, array of created SurveyDistribution ids)
     """
     if start_date is None:
         start_date = timezone.now().date()
@@ -139,113 +215,74 @@ def create_survey_distribution(survey, school, sent_by, start_date=None):
         sent_by=sent_by
     )
 
-    # Get recipients
-    recipients = get_survey_recipients(survey, school)
-
-    # Create distributions
-    distributions = []
-    for user, student in recipients:
-        dist = SurveyDistribution(
-            period=period,
-            survey=survey,
-            user=user,
-            student=student,
-            school=school
-        )
-        distributions.append(dist)
+    # Recipients are unique per (user, student) and the period is new, so no conflicts are possible
+    distribution_ids = write_distributions(
+        period,
+        get_survey_recipients(survey, school, chunk_size=batch_size),
+        batch_size=batch_size,
+        progress=progress,
+    )
 
-    # Bulk create for performance
-    SurveyDistribution.objects.bulk_create(distributions, ignore_conflicts=True)
+    if notify and distribution_ids:
+        enqueue_survey_notifications(period, distribution_ids)
 
-    return period, distributions
+    return period, distribution_ids
 
 
-def send_survey_notifications(distributions):
+def build_survey_notifications(distribution_ids):
     """
-    Send FCM notifications for survey distributions
-    Uses Firebase Cloud Messaging to notify users about new surveys
+    Group the distributions of each user into one notification and group
+    users receiving the same notification, ready for multicast.
+    Returns a list of (Notification, tokens).
     """
-    import logging
-    logger = logging.getLogger(__name__)
-
-    # Try to import FCM library
-    try:
-        from firebase_admin import messaging
-        import firebase_admin
-    except ImportError:
-        logger.warning("Firebase Admin SDK not installed. Skipping FCM notifications.")
-        return
-
-    # Check if Firebase is initialized
-    try:
-        firebase_admin.get_app()
-    except ValueError:
-        logger.warning("Firebase not initialized. Skipping FCM notifications.")
-        return
-
-    # Group distributions by user to batch notifications
     user_distributions = {}
-    for dist in distributions:
-        if dist.user.fcm_token:
-            if dist.user.id not in user_distributions:
-                user_distributions[dist.user.id] = []
-            user_distributions[dist.user.id].append(dist)
-
-    sent_count = 0
-    failed_count = 0
+    for ids in _batched(distribution_ids, DISTRIBUTION_BATCH_SIZE):
+        rows = (
+            SurveyDistribution.objects
+            .filter(pk__in=ids, user__fcm_token__isnull=False)
+            .exclude(user__fcm_token='')
+            .values_list('user__fcm_token', 'survey_id', 'survey__name', 'student__first_name')
+            .order_by()
+        )
+        for token, survey_id, survey_name, student_name in rows:
+            user_distributions.setdefault(token, []).append((survey_id, survey_name, student_name))
 
-    for user_id, user_dists in user_distributions.items():
-        user = user_dists[0].user
-        survey = user_dists[0].survey
+    groups = {}
+    for token, user_dists in user_distributions.items():
+        survey_id, survey_name, student_name = user_dists[0]
 
         # Determine notification body based on count
         if len(user_dists) == 1:
-            dist = user_dists[0]
-            if dist.student:
-                body = f"استطلاع جديد عن الطالب {dist.student.first_name}"
+            if student_name:
+                body = f"استطلاع جديد عن الطالب {student_name}"
             else:
-                body = f"استطلاع جديد: {survey.name}"
+                body = f"استطلاع جديد: {survey_name}"
         else:
             body = f"لديك {len(user_dists)} استطلاع جديد"
 
-        # Create notification
-        message = messaging.Message(
-            notification=messaging.Notification(
-                title="استطلاع جديد",
-                body=body,
-            ),
-            data={
-                'type': 'survey',
-                'survey_id': str(survey.id),
-                'distribution_count': str(len(user_dists)),
-                'click_action': 'FLUTTER_NOTIFICATION_CLICK',
-            },
-            token=user.fcm_token,
-            android=messaging.AndroidConfig(
-                priority='high',
-                notification=messaging.AndroidNotification(
-                    icon='ic_notification',
-                    color='#FF6B35',
-                    sound='default',
-                )
+        notification = Notification(
+            title="استطلاع جديد",
+            body=body,
+            data=(
+                ('type', 'survey'),
+                ('survey_id', str(survey_id)),
+                ('distribution_count', str(len(user_dists))),
+                ('click_action', 'FLUTTER_NOTIFICATION_CLICK'),
             ),
-            apns=messaging.APNSConfig(
-                payload=messaging.APNSPayload(
-                    aps=messaging.Aps(
-                        sound='default',
-                        badge=len(user_dists),
-                    )
-                )
-            )
+            badge=len(user_dists),
         )
+        groups.setdefault(notification, []).append(token)
 
-        try:
-            response = messaging.send(message)
-            sent_count += 1
-            logger.info(f"FCM notification sent to user {user.id}: {response}")
-        except Exception as e:
-            failed_count += 1
-            logger.error(f"Failed to send FCM notification to user {user.id}: {e}")
+    return [
+        (notification._replace(data=dict(notification.data)), tokens)
+        for notification, tokens in groups.items()
+    ]
 
-    logger.info(f"FCM notifications sent: {sent_count} succeeded, {failed_count} failed")
 
+def send_survey_notifications(distribution_ids, dispatcher=None):
+    """
+    Send push notifications for survey distributions (given by id)
+    Returns the DispatchMetrics of the send.
+    """
+    dispatcher = dispatcher or NotificationDispatcher()
+    return dispatcher.dispatch(build_survey_notifications(distribution_ids))
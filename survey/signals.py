@@ -0,0 +1,22 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from survey.models import Template
+from survey.services import invalidate_template_list
+
+
+@receiver(pre_save, sender=Template)
+def remember_template_school(sender, instance, raw=False, **kwargs):
+    # A template moved to another school must also leave the old school's list
+    if instance.pk and not raw:
+        instance._previous_school_id = (
+            Template.objects.filter(pk=instance.pk).values_list('school_id', flat=True).first()
+        )
+
+
+@receiver([post_save, post_delete], sender=Template)
+def invalidate_template_lists(sender, instance, **kwargs):
+    school_ids = {instance.school_id}
+    if hasattr(instance, '_previous_school_id'):
+        school_ids.add(instance._previous_school_id)
+    invalidate_template_list(*school_ids)
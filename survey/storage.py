@@ -0,0 +1,90 @@
+# survey/storage.py - Where survey answers live: AdditionalField rows (EAV), a document on Response, or both
+"""
+settings.SURVEY_RESPONSE_STORAGE selects how new answers are written:
+    "eav"      - one AdditionalField row per answered field (historical layout)
+    "document" - one JSON document on Response.answers, keyed by TemplateField.key
+    "dual"     - both, for migrating between the two
+
+Reads always accept both layouts: a response with a document is read from
+it, otherwise from its AdditionalField rows. Existing responses are moved
+with `manage.py backfill_response_documents`.
+"""
+from django.conf import settings
+
+
+STORAGE_EAV = 'eav'
+STORAGE_DOCUMENT = 'document'
+STORAGE_DUAL = 'dual'
+
+RESPONSE_STORAGE = getattr(settings, 'SURVEY_RESPONSE_STORAGE', STORAGE_EAV)
+
+
+def build_document(fields, values):
+    """Answers document of a response: {field key: value}; FORM fields hold no value"""
+    from survey.models import TemplateField
+
+    return {field.key: values.get(field.key) for field in fields if field.type != TemplateField.FORM}
+
+
+def store_answers(response, fields, cleaned_data, user=None, parent=None, storage=None):
+    """Write the answers of a response with the configured storage. Returns the EAV rows created."""
+    from survey.models import AdditionalField, TemplateField
+
+    storage = storage or RESPONSE_STORAGE
+
+    if storage in (STORAGE_DOCUMENT, STORAGE_DUAL) and parent is None:
+        response.answers = build_document(fields, cleaned_data)
+        response.save(update_fields=['answers'])
+
+    rows = []
+    if storage in (STORAGE_EAV, STORAGE_DUAL) or parent is not None:
+        for field in fields:
+            rows.append(AdditionalField(
+                response=response,
+                field=field,
+                type=field.type,
+                name=field.name,
+                value=cleaned_data.get(field.key) if field.type != TemplateField.FORM else None,
+                parent=parent,
+                created_by=user,
+            ))
+        AdditionalField.objects.bulk_create(rows)
+    return rows
+
+
+def _answer(key, name, field_type, value):
+    from survey.models import TemplateField
+
+    return {
+        'name': name,
+        'type': field_type,
+        'type_display': dict(TemplateField.TYPE_CHOICES).get(field_type, field_type),
+        'value': value,
+        'key': key,
+    }
+
+
+def read_answers(response):
+    """
+    Answers of a response as a list of {name, type, type_display, value, key},
+    in field order, whichever layout they are stored in.
+    """
+    if response.answers is not None:
+        from survey.schema import get_compiled_schema
+
+        fields = {field.key: field for field in get_compiled_schema(response.template).fields}
+        answers = []
+        for key, value in response.answers.items():
+            field = fields.get(key)
+            if field is None:
+                # The field was deleted after the response was written
+                answers.append(_answer(key, key, None, value))
+            else:
+                answers.append(_answer(key, field.name, field.type, value))
+        order = {key: index for index, key in enumerate(fields)}
+        return sorted(answers, key=lambda answer: order.get(answer['key'], len(order)))
+
+    return [
+        _answer(row.field.key if row.field else None, row.name, row.type, row.value)
+        for row in response.fields.select_related('field').order_by('row', 'id')
+    ]
@@ -1,3 +1,366 @@
+from datetime import date, timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase
+from django.utils import timezone
+
+from core.models import School, Student, Guardian, GuardianStudent
+from survey import outbox
+from survey.analytics import record_answers, rebuild_period_results, period_results
+from survey.models import (
+    Template, TemplateField, NotificationOutbox, RecurringSchedule, SurveyPeriod, SurveyDistribution, Response,
+)
+from survey.notifications import NotificationDispatcher, NotificationTransport, FakeTransport
+from survey.scheduling import sync_schedules, run_schedule, next_cycle_start
+from survey.services import create_survey_distribution, school_templates
+from survey.validation import get_validator
+
+User = get_user_model()
+
+
+class UnavailableTransport(NotificationTransport):
+    def is_available(self):
+        return False
+
+
+def dispatcher(transport):
+    return NotificationDispatcher(transport=transport, max_workers=1, max_retries=0, backoff=0)
+
+
+class NotificationOutboxTests(TestCase):
+    """Outbox rows are retried with backoff until MAX_ATTEMPTS, then FAILED"""
+
+    def setUp(self):
+        school = School.objects.create(name='مدرسة الاختبار')
+        sender = User.objects.create_user(username='employee', password='x', user_type=User.EMPLOYEE)
+        for index in range(3):
+            student = Student.objects.create(school=school, first_name=f'طالب{index}', last_name='علي', sex='male')
+            user = User.objects.create_user(
+                username=f'guardian{index}', password='x', user_type=User.GUARDIAN, fcm_token=f'token-{index}',
+            )
+            guardian = Guardian.objects.create(
+                school=school, first_name='ولي', last_name=str(index), user=user, selected_student=student,
+            )
+            GuardianStudent.objects.create(guardian=guardian, student=student, relationship='father', is_primary=True)
+        template = Template.objects.create(
+            name='استطلاع', type=Template.FOOD, school=school, target_audience=Template.TARGET_GUARDIANS,
+        )
+        create_survey_distribution(template, school, sender)
+        self.entry = NotificationOutbox.objects.get()
+
+    def process(self, transport):
+        entries = outbox.claim_entries('worker-1')
+        self.assertEqual(len(entries), 1)
+        result = outbox.process_entry(entries[0], 'worker-1', dispatcher=dispatcher(transport))
+        self.entry.refresh_from_db()
+        return result
+
+    def make_available(self):
+        NotificationOutbox.objects.filter(pk=self.entry.pk).update(available_at=timezone.now())
+
+    def test_sent(self):
+        transport = FakeTransport()
+        self.assertTrue(self.process(transport))
+        self.assertEqual(self.entry.status, NotificationOutbox.STATUS_SENT)
+        self.assertEqual(self.entry.metrics['sent'], 3)
+        self.assertEqual(len(transport.sent), 3)
+
+    def test_unavailable_transport_is_retried(self):
+        before = timezone.now()
+        self.assertFalse(self.process(UnavailableTransport()))
+        self.assertEqual(self.entry.status, NotificationOutbox.STATUS_PENDING)
+        self.assertEqual(self.entry.attempts, 1)
+        self.assertEqual(self.entry.last_error, 'Notification transport unavailable')
+        self.assertGreater(self.entry.available_at, before)
+        # Backing off: not claimable yet
+        self.assertEqual(outbox.claim_entries('worker-1'), [])
+
+    def test_all_failed_is_retried(self):
+        self.assertFalse(self.process(FakeTransport(transient_error_rate=1.0)))
+        self.assertEqual(self.entry.status, NotificationOutbox.STATUS_PENDING)
+        self.assertEqual(self.entry.last_error, 'All 3 notifications failed')
+
+    def test_failed_after_max_attempts(self):
+        for _ in range(outbox.MAX_ATTEMPTS):
+            self.make_available()
+            self.process(UnavailableTransport())
+        self.assertEqual(self.entry.attempts, outbox.MAX_ATTEMPTS)
+        self.assertEqual(self.entry.status, NotificationOutbox.STATUS_FAILED)
+        self.make_available()
+        self.assertEqual(outbox.claim_entries('worker-1'), [])
+
+    def test_expired_lease(self):
+        outbox.claim_entries('crashed')
+        expired = timezone.now() - timedelta(seconds=1)
+        NotificationOutbox.objects.filter(pk=self.entry.pk).update(leased_until=expired)
+
+        # Reclaimed by another worker while attempts remain
+        self.assertEqual([entry.pk for entry in outbox.claim_entries('worker-1')], [self.entry.pk])
+
+        NotificationOutbox.objects.filter(pk=self.entry.pk).update(
+            leased_until=expired, attempts=outbox.MAX_ATTEMPTS,
+        )
+        self.assertEqual(outbox.claim_entries('worker-2'), [])
+        self.entry.refresh_from_db()
+        self.assertEqual(self.entry.status, NotificationOutbox.STATUS_FAILED)
+        self.assertIn('Lease expired', self.entry.last_error)
+
+    def test_stale_owner_cannot_release(self):
+        entry = outbox.claim_entries('worker-1')[0]
+        NotificationOutbox.objects.filter(pk=entry.pk).update(lease_owner='worker-2')
+        outbox.process_entry(entry, 'worker-1', dispatcher=dispatcher(FakeTransport()))
+        self.entry.refresh_from_db()
+        self.assertEqual(self.entry.status, NotificationOutbox.STATUS_PROCESSING)
+
+
+class RecurringScheduleTests(TestCase):
+    """sync_schedules/run_schedule: one period per cycle, advanced with a compare-and-set"""
+
+    TODAY = date(2025, 3, 10)
+
+    def setUp(self):
+        self.school = School.objects.create(name='مدرسة الاختبار')
+        self.template = Template.objects.create(
+            name='استطلاع شهري', type=Template.FOOD, school=self.school, send_frequency=Template.FREQ_MONTHLY,
+        )
+
+    def test_sync(self):
+        Template.objects.create(
+            name='مرة واحدة', type=Template.FOOD, school=self.school, send_frequency=Template.FREQ_ONCE,
+        )
+        self.assertEqual(sync_schedules(self.TODAY), (1, 0, 0))
+        schedule = RecurringSchedule.objects.get()
+        self.assertEqual((schedule.template, schedule.school), (self.template, self.school))
+        self.assertEqual(schedule.next_due_date, self.TODAY)
+
+        self.template.send_frequency = Template.FREQ_ONCE
+        self.template.save()
+        self.assertEqual(sync_schedules(self.TODAY), (0, 1, 0))
+
+    def test_run_creates_one_period(self):
+        sync_schedules(self.TODAY)
+        schedule = RecurringSchedule.objects.get()
+        result = run_schedule(schedule.pk, self.TODAY)
+        self.assertEqual((result['status'], result['start_date']), ('created', self.TODAY))
+
+        schedule.refresh_from_db()
+        period = SurveyPeriod.objects.get()
+        self.assertEqual(schedule.last_period_end, period.end_date)
+        self.assertEqual(schedule.next_due_date, next_cycle_start(Template.FREQ_MONTHLY, period.end_date))
+
+        self.assertEqual(run_schedule(schedule.pk, self.TODAY)['status'], 'skipped')
+        self.assertEqual(SurveyPeriod.objects.count(), 1)
+
+    def test_overlapping_runs(self):
+        sync_schedules(self.TODAY)
+        schedule = RecurringSchedule.objects.get()
+        stale = RecurringSchedule.objects.select_related('template', 'school').get(pk=schedule.pk)
+        run_schedule(schedule.pk, self.TODAY)
+
+        # A second run that read the schedule before the first one advanced it
+        with mock.patch.object(RecurringSchedule.objects, 'select_related', return_value=mock.Mock(get=lambda pk: stale)):
+            result = run_schedule(schedule.pk, self.TODAY)
+        self.assertEqual(result['status'], 'skipped')
+        self.assertEqual(SurveyPeriod.objects.count(), 1)
+
+    def test_missed_cycle_is_rescheduled(self):
+        sync_schedules(self.TODAY)
+        run_schedule(RecurringSchedule.objects.get().pk, self.TODAY)
+        schedule = RecurringSchedule.objects.get()
+
+        # The runner did not run on the due date: that cycle is skipped
+        late = schedule.next_due_date + timedelta(days=3)
+        self.assertEqual(run_schedule(schedule.pk, late)['status'], 'rescheduled')
+        schedule.refresh_from_db()
+        self.assertEqual(schedule.next_due_date, next_cycle_start(Template.FREQ_MONTHLY, late))
+        self.assertEqual(SurveyPeriod.objects.count(), 1)
+
+    def test_catch_up(self):
+        sync_schedules(self.TODAY)
+        schedule = RecurringSchedule.objects.get()
+        run_schedule(schedule.pk, self.TODAY)
+
+        # Cycles due since June 1st: June, then August (the June period runs until July 1st)
+        today = date(2025, 8, 15)
+        result = run_schedule(schedule.pk, today, since=date(2025, 6, 1))
+        self.assertEqual((result['status'], result['periods'], result['start_date']), ('created', 2, date(2025, 8, 1)))
+        self.assertEqual(
+            list(SurveyPeriod.objects.order_by('start_date').values_list('start_date', flat=True)),
+            [self.TODAY, date(2025, 6, 1), date(2025, 8, 1)],
+        )
+        schedule.refresh_from_db()
+        self.assertEqual(schedule.next_due_date, date(2025, 9, 1))
+        self.assertEqual(run_schedule(schedule.pk, today, since=date(2025, 6, 1))['status'], 'skipped')
+
+    def test_manual_send_moves_due_date(self):
+        sync_schedules(self.TODAY)
+        run_schedule(RecurringSchedule.objects.get().pk, self.TODAY)
+        manual = SurveyPeriod.objects.create(
+            survey=self.template, school=self.school, start_date=date(2025, 4, 20), end_date=date(2025, 5, 20),
+        )
+        self.assertEqual(sync_schedules(self.TODAY), (0, 0, 1))
+        schedule = RecurringSchedule.objects.get()
+        self.assertEqual(schedule.last_period_end, manual.end_date)
+        self.assertEqual(schedule.next_due_date, date(2025, 6, 1))
+
+
+class SubmissionValidatorTests(TestCase):
+    """get_validator() reports the same errors as the template's Django form"""
+
+    def setUp(self):
+        self.template = Template.objects.create(name='نموذج', type=Template.FOOD)
+        fields = [
+            ('الاسم', TemplateField.TEXT, None, True, True),
+            ('العمر', TemplateField.NUMBER, None, True, True),
+            ('الصف', TemplateField.SELECT, ['الأول', 'الثاني'], True, True),
+            ('الهوايات', TemplateField.CHECKBOX, ['قراءة', 'رياضة'], False, True),
+            ('الجنس', TemplateField.RADIO, ['ذكر', 'أنثى'], False, True),
+            ('تاريخ الميلاد', TemplateField.DATE, None, False, True),
+            ('ملاحظات', TemplateField.TEXTAREA, None, False, True),
+            ('داخلي', TemplateField.TEXT, None, True, False),
+        ]
+        self.keys = {}
+        for order, (name, type, value, required, public) in enumerate(fields):
+            field = TemplateField.objects.create(
+                template=self.template, name=name, type=type, value=value,
+                is_required=required, is_public=public, order=order,
+            )
+            self.keys[name] = field.key
+
+    def payload(self, changes=None):
+        data = {
+            'الاسم': 'أحمد', 'العمر': '12', 'الصف': 'الأول', 'الهوايات': ['قراءة'],
+            'الجنس': 'ذكر', 'تاريخ الميلاد': '2014-05-01', 'ملاحظات': '',
+        }
+        data.update(changes or {})
+        return {self.keys[name]: value for name, value in data.items() if value is not None}
+
+    def assertParity(self, data, public_only=True, is_public=True):
+        form = self.template.build_django_form(data=data, is_public=is_public, public_only=public_only, ticket=object())
+        form.is_valid()
+        _, errors = get_validator(self.template, public_only=public_only, is_public=is_public).validate(data)
+        self.assertEqual(errors, {key: list(messages) for key, messages in form.errors.items()})
+        return errors
+
+    def test_valid(self):
+        self.assertEqual(self.assertParity(self.payload()), {})
+
+    def test_invalid_number(self):
+        self.assertIn(self.keys['العمر'], self.assertParity(self.payload({'العمر': 'اثنا عشر'})))
+
+    def test_invalid_choice(self):
+        self.assertIn(self.keys['الصف'], self.assertParity(self.payload({'الصف': 'العاشر'})))
+        self.assertIn(self.keys['الهوايات'], self.assertParity(self.payload({'الهوايات': ['سباحة']})))
+
+    def test_missing_required(self):
+        errors = self.assertParity(self.payload({'الاسم': None, 'العمر': ''}))
+        self.assertEqual(set(errors), {self.keys['الاسم'], self.keys['العمر']})
+
+    def test_invalid_date(self):
+        self.assertIn(self.keys['تاريخ الميلاد'], self.assertParity(self.payload({'تاريخ الميلاد': '2014-13-40'})))
+
+    def test_empty(self):
+        self.assertTrue(self.assertParity({}))
+
+    def test_private_fields(self):
+        # A non-public required field is only required outside the public form
+        self.assertParity(self.payload(), public_only=False, is_public=True)
+        errors = self.assertParity(self.payload(), public_only=False, is_public=False)
+        self.assertIn(self.keys['داخلي'], errors)
+
+
+class PeriodResultsTests(TestCase):
+    """Choice counts and number statistics of a period, incremental and rebuilt"""
+
+    def setUp(self):
+        school = School.objects.create(name='مدرسة الاختبار')
+        self.template = Template.objects.create(name='استطلاع', type=Template.FOOD, school=school)
+        self.choice = TemplateField.objects.create(
+            template=self.template, name='التقييم', type=TemplateField.SELECT, value=['جيد', 'ضعيف'], order=0,
+        )
+        self.number = TemplateField.objects.create(template=self.template, name='العدد', type=TemplateField.NUMBER, order=1)
+        self.period = SurveyPeriod.objects.create(
+            survey=self.template, school=school, start_date=date(2025, 3, 1), end_date=date(2025, 3, 31),
+        )
+        self.user = User.objects.create_user(username='guardian', password='x', user_type=User.GUARDIAN)
+        self.answers = [
+            {self.choice.key: 'جيد', self.number.key: '2'},
+            {self.choice.key: 'جيد', self.number.key: '4'},
+            {self.choice.key: 'ضعيف', self.number.key: ''},
+            {self.choice.key: 'ملغى'},
+        ]
+
+    def submit(self, answers):
+        response = Response.objects.create(template=self.template, user=self.user, answers=answers)
+        SurveyDistribution.objects.create(
+            period=self.period, survey=self.template, user=self.user, school=self.period.school,
+            response=response, is_completed=True,
+        )
+        SurveyPeriod.increment(self.period.pk, total_count=1, completed_count=1)
+        record_answers(self.period.pk, [self.choice, self.number], answers)
+
+    def assertResults(self, results):
+        choices, numbers = results
+        self.assertEqual(
+            [(row['choice'], row['count'], row['percent']) for row in choices['choices']],
+            [('جيد', 2, 50.0), ('ضعيف', 1, 25.0), ('ملغى', 1, 25.0)],
+        )
+        self.assertEqual((numbers['count'], numbers['average'], numbers['minimum'], numbers['maximum']), (2, 3.0, 2, 4))
+        self.assertEqual(numbers['histogram'], [{'bucket': 2.0, 'count': 1}, {'bucket': 4.0, 'count': 1}])
+
+    def test_incremental(self):
+        for answers in self.answers:
+            self.submit(answers)
+        self.period.refresh_from_db()
+        self.assertResults(period_results(self.period))
+
+    def test_rebuild(self):
+        for answers in self.answers:
+            self.submit(answers)
+        self.period.choice_counts.update(count=0)
+        self.period.number_stats.all().delete()
+
+        self.assertEqual(rebuild_period_results(self.period), 4)
+        self.period.refresh_from_db()
+        self.assertResults(period_results(self.period))
+
+
+class TemplateListCacheTests(TestCase):
+    """school_templates is cached per school and dropped when a template changes"""
+
+    def setUp(self):
+        cache.clear()
+        self.school = School.objects.create(name='مدرسة الاختبار')
+        self.other = School.objects.create(name='مدرسة أخرى')
+
+    def create_template(self, name, school):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Template.objects.create(name=name, school=school)
+
+    def names(self, school):
+        return [template.name for template in school_templates(school.pk)]
+
+    def test_cached(self):
+        self.create_template('خاص', self.school)
+        self.assertEqual(self.names(self.school), ['خاص'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names(self.school), ['خاص'])
+
+    def test_invalidated(self):
+        template = self.create_template('خاص', self.school)
+        self.assertEqual((self.names(self.school), self.names(self.other)), (['خاص'], []))
+
+        # A built-in template is added to every school's list
+        self.create_template('عام', None)
+        self.assertEqual((self.names(self.school), self.names(self.other)), (['خاص', 'عام'], ['عام']))
+
+        template.school = self.other
+        with self.captureOnCommitCallbacks(execute=True):
+            template.save()
+        self.assertEqual((self.names(self.school), self.names(self.other)), (['عام'], ['خاص', 'عام']))
 
-# Create your tests here.
+        with self.captureOnCommitCallbacks(execute=True):
+            template.delete()
+        self.assertEqual(self.names(self.other), ['عام'])
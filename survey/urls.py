@@ -14,6 +14,9 @@ urlpatterns = [
     path('<int:template_id>/send/', views.template_send, name='template_send'),
     path('<int:template_id>/periods/', views.template_periods, name='template_periods'),
     path('period/<int:period_id>/', views.period_detail, name='period_detail'),
+    path('period/<int:period_id>/results/', views.period_results, name='period_results'),
+    path('period/<int:period_id>/results/json/', views.period_results_json, name='period_results_json'),
+    path('period/<int:period_id>/export/', views.period_export, name='period_export'),
     path('edit/<int:template_id>/', views.template_form, name='template_edit'),
     path('<int:template_id>/swap/', views.template_field_swap, name='template_field_swap'),
     path('<int:template_id>/field/<str:field_key>/edit/', views.template_field_form, name='template_field_edit'),
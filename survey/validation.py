@@ -0,0 +1,214 @@
+# survey/validation.py - Single-pass validation of JSON survey submissions (API path)
+"""
+A flat alternative to Template.CustomForm for JSON payloads.
+
+Each template is compiled once into a tuple of (key, field, coerce, check)
+rows; validating a submission is one loop over that table. Coercion rules,
+cleaned values, error keys and error messages mirror the Django form fields
+built by TemplateField.get_corresponding_django_form_field, so API clients
+see the same responses as before.
+"""
+import datetime
+import json
+import math
+from collections import namedtuple
+
+from django import forms
+from django.conf import settings
+from django.core.validators import ProhibitNullCharactersValidator
+from django.utils import formats
+
+from core.cache import LocalLRUCache
+
+
+EMPTY_VALUES = (None, '', [], (), {})
+
+_local_validators = LocalLRUCache(
+    getattr(settings, 'SURVEY_SCHEMA_LOCAL_CACHE_SIZE', 256),
+    getattr(settings, 'SURVEY_SCHEMA_LOCAL_CACHE_TTL', 60 * 60),
+)
+
+# One row of the validator table
+Rule = namedtuple('Rule', ['key', 'field', 'required', 'coerce', 'choices'])
+
+
+class Invalid(Exception):
+    def __init__(self, message, params=None):
+        self.message = message
+        self.params = params
+
+
+def _message(field_class, code):
+    return field_class.default_error_messages[code]
+
+
+# ==========================================
+# COERCION (same rules as the Django form fields)
+# ==========================================
+
+def _coerce_text(value):
+    if value not in EMPTY_VALUES:
+        value = str(value).strip()
+    if value in EMPTY_VALUES:
+        return ''
+    if '\x00' in value:
+        raise Invalid(ProhibitNullCharactersValidator.message)
+    return value
+
+
+def _coerce_number(value):
+    if value in EMPTY_VALUES:
+        return None
+    try:
+        value = float(value)
+    except (ValueError, TypeError):
+        raise Invalid(_message(forms.FloatField, 'invalid'))
+    if not math.isfinite(value):
+        raise Invalid(_message(forms.FloatField, 'invalid'))
+    return value
+
+
+def _coerce_choice(value):
+    if value in EMPTY_VALUES:
+        return ''
+    return str(value)
+
+
+def _coerce_multiple_choice(value):
+    if not value:
+        return []
+    if not isinstance(value, (list, tuple)):
+        raise Invalid(_message(forms.MultipleChoiceField, 'invalid_list'))
+    return [str(item) for item in value]
+
+
+def _coerce_date(value):
+    if value in EMPTY_VALUES:
+        return None
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    value = str(value).strip()
+    for input_format in formats.get_format('DATE_INPUT_FORMATS'):
+        try:
+            return datetime.datetime.strptime(value, input_format).date()
+        except (ValueError, TypeError):
+            continue
+    raise Invalid(_message(forms.DateField, 'invalid'))
+
+
+def _coerce_json(value):
+    if value in EMPTY_VALUES:
+        return None
+    if isinstance(value, (list, dict, int, float)):
+        return value
+    try:
+        return json.loads(value)
+    except (json.JSONDecodeError, TypeError):
+        raise Invalid(_message(forms.JSONField, 'invalid'), {'value': value})
+
+
+# ==========================================
+# COMPILED VALIDATOR
+# ==========================================
+
+class SubmissionValidator:
+    """Validator table for one template; build with get_validator()"""
+
+    def __init__(self, template, fields, is_public=False):
+        from survey.models import TemplateField
+
+        coercers = {
+            TemplateField.NUMBER: _coerce_number,
+            TemplateField.SELECT: _coerce_choice,
+            TemplateField.RADIO: _coerce_choice,
+            TemplateField.CHECKBOX: _coerce_multiple_choice,
+            TemplateField.DATE: _coerce_date,
+            TemplateField.FORM: _coerce_json,
+        }
+
+        self.template = template
+        self.fields = tuple(fields)
+        rows = []
+        for field in self.fields:
+            required = field.is_required
+            if field.is_required is True and field.is_public is False and is_public is True:
+                required = False
+            choices = None
+            if field.type in (TemplateField.SELECT, TemplateField.RADIO, TemplateField.CHECKBOX):
+                choices = frozenset(str(choice) for choice in (field.value or ()))
+            rows.append(Rule(field.key, field, required, coercers.get(field.type, _coerce_text), choices))
+        self.rules = tuple(rows)
+
+    def validate(self, data):
+        """
+        Validate a submission dict.
+        Returns (cleaned_data, errors); errors maps field keys to lists of messages.
+        """
+        from survey.models import TemplateField
+
+        cleaned = {}
+        errors = {}
+
+        # Field validation (Form._clean_fields)
+        for key, field, required, coerce, choices in self.rules:
+            try:
+                value = coerce(data.get(key))
+                if required and value in EMPTY_VALUES:
+                    raise Invalid(_message(forms.Field, 'required'))
+                if choices is not None and value:
+                    for item in (value if isinstance(value, list) else (value,)):
+                        if item not in choices:
+                            raise Invalid(_message(forms.ChoiceField, 'invalid_choice'), {'value': item})
+            except Invalid as e:
+                errors[key] = [e.message % e.params if e.params else str(e.message)]
+                continue
+            cleaned[key] = value
+
+        # Cross-field rules (Template.CustomForm.clean)
+        for key, field, required, coerce, choices in self.rules:
+            value = cleaned.get(key)
+
+            if not value and field.is_required is False:
+                continue
+
+            if field.type == TemplateField.DATE and isinstance(value, datetime.date):
+                cleaned[key] = value.strftime("%Y-%m-%d")
+
+            if field.type == TemplateField.FORM:
+                if not isinstance(value, list):
+                    errors.setdefault(key, []).append("القيمة يجب أن تكون قائمة")
+                    continue
+
+                sub_validator = get_validator(field.sub_form, is_public=True)
+                for item in value:
+                    _, item_errors = sub_validator.validate(item if isinstance(item, dict) else {})
+                    if item_errors:
+                        # CustomForm.clean raises the first invalid item's errors for the whole form
+                        for error_key, messages in item_errors.items():
+                            errors.setdefault(error_key, []).extend(messages)
+                        return cleaned, errors
+
+        return cleaned, errors
+
+    def save(self, response, cleaned_data, user=None, parent=None):
+        """Store cleaned values with the configured response storage (see survey.storage)"""
+        from survey.storage import store_answers
+
+        if self.template.type != self.template.FOOD:
+            return []
+        return store_answers(response, self.fields, cleaned_data, user=user, parent=parent)
+
+
+def get_validator(template, public_only=False, is_public=False):
+    """Compiled validator of a template, cached like its compiled form schema"""
+    from survey.schema import get_compiled_schema
+
+    schema = get_compiled_schema(template, public_only=public_only, is_public=is_public)
+    key = (schema.template_id, schema.version, public_only, is_public)
+    validator = _local_validators.get(key)
+    if validator is None:
+        validator = SubmissionValidator(template, schema.fields, is_public=is_public)
+        _local_validators.set(key, validator)
+    return validator
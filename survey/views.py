@@ -2,11 +2,13 @@ from crispy_forms.utils import render_crispy_form
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, permission_required
 from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
 from django.db import transaction, models
 from django.http import HttpResponse
 from django.middleware.csrf import get_token
 from django.shortcuts import render, get_object_or_404, redirect
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.authentication import SessionAuthentication, BasicAuthentication
 from rest_framework.decorators import api_view, authentication_classes, permission_classes, throttle_classes, \
@@ -16,10 +18,15 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.throttling import UserRateThrottle
 
-from survey.forms import TemplateForm, TemplateFieldForm
-from survey.models import Template, TemplateField, SurveyPeriod, SurveyDistribution
+from core.exports import export_response, EXPORT_CHUNK_SIZE
+from survey.forms import TemplateForm, TemplateFieldForm, PeriodFilterForm
+from survey.models import Template, TemplateField, SurveyPeriod, SurveyDistribution, AdditionalField
 from survey.tables import TemplateTable
-from survey.services import create_survey_distribution, get_survey_recipients, send_survey_notifications
+from survey.services import create_survey_distribution, count_survey_recipients
+from survey.analytics import period_results as period_results_data
+from survey.schema import get_compiled_schema
+
+PERIODS_PER_PAGE = 25
 
 
 @login_required
@@ -364,24 +371,20 @@ def template_send(request, template_id, view=Template.FOOD):
         return redirect('dashboard:template_list')
 
     # Calculate recipient count for preview
-    recipients = get_survey_recipients(template, school)
-    recipient_count = len(recipients)
+    recipient_count = count_survey_recipients(template, school)
 
     if request.method == "POST":
         try:
-            # Create period and distributions
-            period, distributions = create_survey_distribution(
+            # Create period and distributions; notifications are queued and sent by the worker
+            period, distribution_ids = create_survey_distribution(
                 survey=template,
                 school=school,
                 sent_by=request.user
             )
 
-            # Send notifications
-            send_survey_notifications(distributions)
-
             messages.success(
                 request,
-                f'تم إرسال الاستطلاع بنجاح إلى {len(distributions)} مستخدم'
+                f'تم إنشاء الاستطلاع لـ {len(distribution_ids)} مستخدم، والإشعارات في قائمة الانتظار للإرسال'
             )
             return redirect('dashboard:template_periods', template_id=template.id)
 
@@ -421,21 +424,36 @@ def template_periods(request, template_id, view=Template.FOOD):
     else:
         periods = template.periods.none()
 
-    # Add statistics to each period
-    period_stats = []
-    for period in periods:
-        stats = {
+    filter_form = PeriodFilterForm(request.GET)
+    periods = filter_form.filter(periods).order_by('-start_date', '-id')
+
+    # Totals of the selected range in one aggregate over the period counters
+    totals = periods.aggregate(
+        periods=models.Count('id'),
+        total=models.Sum('total_count', default=0),
+        completed=models.Sum('completed_count', default=0),
+    )
+    totals['pending'] = totals['total'] - totals['completed']
+
+    # Statistics come from the period counters: one query per page, however many periods
+    page = Paginator(periods, PERIODS_PER_PAGE).get_page(request.GET.get('page'))
+    period_stats = [
+        {
             'period': period,
-            'total': period.distributions.count(),
-            'completed': period.distributions.filter(is_completed=True).count(),
-            'pending': period.distributions.filter(is_completed=False).count(),
+            'total': period.total_count,
+            'completed': period.completed_count,
+            'pending': period.pending_count,
             'completion_rate': period.completion_rate,
         }
-        period_stats.append(stats)
+        for period in page
+    ]
 
     context = {
         "template": template,
         "period_stats": period_stats,
+        "page": page,
+        "filter_form": filter_form,
+        "totals": totals,
         "bar": {
             "title": f"فترات استطلاع: {template.name}",
             "back": reverse('dashboard:template_list'),
@@ -470,15 +488,127 @@ def period_detail(request, period_id):
         "completed_distributions": completed_distributions,
         "pending_distributions": pending_distributions,
         "stats": {
-            'total': distributions.count(),
-            'completed': completed_distributions.count(),
-            'pending': pending_distributions.count(),
+            'total': period.total_count,
+            'completed': period.completed_count,
+            'pending': period.pending_count,
             'completion_rate': period.completion_rate,
         },
         "bar": {
             "title": f"تفاصيل فترة: {period.survey.name}",
             "back": reverse('dashboard:template_periods', kwargs={'template_id': period.survey.id}),
+            "buttons": [
+                {
+                    "label": "النتائج",
+                    "icon": "bi bi-bar-chart",
+                    "url": reverse('dashboard:period_results', kwargs={'period_id': period.id}),
+                },
+                {
+                    "label": "تصدير",
+                    "icon": "bi bi-download",
+                    "url": reverse('dashboard:period_export', kwargs={'period_id': period.id}),
+                    "color": "btn-outline-secondary",
+                },
+            ]
         }
     }
 
-    return render(request, 'survey/period_detail.html', context)
\ No newline at end of file
+    return render(request, 'survey/period_detail.html', context)
+
+
+def _get_period(request, period_id):
+    period = get_object_or_404(SurveyPeriod.objects.select_related('survey'), pk=period_id)
+    school = getattr(request, 'school', None)
+    if period.school_id and period.school_id != getattr(school, 'pk', None) and not request.user.is_superuser:
+        raise PermissionDenied('ليس لديك صلاحية لعرض هذه الفترة.')
+    return period
+
+
+@login_required
+def period_results(request, period_id):
+    """
+    Aggregated answers of a period, read from the pre-computed counters (see survey.analytics)
+    """
+    period = _get_period(request, period_id)
+
+    context = {
+        "period": period,
+        "results": period_results_data(period),
+        "bar": {
+            "title": f"نتائج: {period.survey.name}",
+            "back": reverse('dashboard:period_detail', kwargs={'period_id': period.id}),
+        }
+    }
+
+    return render(request, 'survey/period_results.html', context)
+
+
+def _period_export_rows(period, fields):
+    """
+    One row per response of the period, in response order.
+    Document answers come with the distribution rows; answers still stored as
+    AdditionalField rows are pivoted from a second cursor ordered the same way
+    (a merge join), so only one response is held in memory at a time.
+    """
+    keys = [field.key for field in fields]
+    distributions = (
+        SurveyDistribution.objects.filter(period=period, response__isnull=False)
+        .order_by('response_id')
+        .values_list(
+            'response_id', 'user__username', 'user__first_name', 'user__last_name',
+            'student__student_id', 'student__full_name', 'completed_at', 'response__answers',
+        )
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    eav_rows = (
+        AdditionalField.objects
+        .filter(
+            response__distribution__period=period,
+            response__answers__isnull=True,
+            parent__isnull=True,
+            field__isnull=False,
+        )
+        .order_by('response_id')
+        .values_list('response_id', 'field__key', 'value')
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    pending = next(eav_rows, None)
+
+    for response_id, username, first_name, last_name, student_id, student_name, completed_at, answers in distributions:
+        if answers is None:
+            answers = {}
+            # Skip rows of responses without a distribution in this period, then collect this one's
+            while pending is not None and pending[0] < response_id:
+                pending = next(eav_rows, None)
+            while pending is not None and pending[0] == response_id:
+                answers[pending[1]] = pending[2]
+                pending = next(eav_rows, None)
+
+        user = f'{first_name} {last_name}'.strip() or username
+        completed = timezone.localtime(completed_at).strftime('%Y-%m-%d %H:%M') if completed_at else ''
+        yield [user, student_id, student_name, completed] + [answers.get(key) for key in keys]
+
+
+@login_required
+def period_export(request, period_id):
+    """Stream the responses of a period as CSV (or XLSX with ?format=xlsx), one line per response"""
+    period = _get_period(request, period_id)
+    fields = [field for field in get_compiled_schema(period.survey).fields if field.type != TemplateField.FORM]
+
+    header = ['المستخدم', 'رقم القيد', 'الطالب', 'تاريخ الإكمال'] + [field.name for field in fields]
+    filename = f'{period.survey.name} - {period.start_date:%Y-%m-%d}'
+    return export_response(request, filename, header, _period_export_rows(period, fields))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@authentication_classes([SessionAuthentication])
+@throttle_classes([UserRateThrottle])
+def period_results_json(request, period_id):
+    period = _get_period(request, period_id)
+    return Response({
+        "period": period.id,
+        "survey": period.survey.name,
+        "start_date": period.start_date,
+        "end_date": period.end_date,
+        "results": period_results_data(period),
+    })
\ No newline at end of file